@@ -0,0 +1,596 @@
+# Author: Alexandre
+## Benchmark suite of fb_library on synthetic stand-in scenes
+####################################
+#
+# usage (outside MotionBuilder):
+#	python fb_benchmark.py                                  # 1k and 10k objects, compared to bench_baseline.json
+#	python fb_benchmark.py --sizes 1000 10000 100000        # include the 100k objects scene
+#	python fb_benchmark.py --save-baseline                  # store the timings as the new baseline
+#	python fb_benchmark.py --only takes story               # run benchmarks whose name starts with the given prefixes
+#	python fb_benchmark.py --ci                             # a missing baseline (file or entry) fails the run
+#
+# Each benchmark returns the callable to time (setup is not timed), the best of a few runs is kept.
+# A benchmark slower than its baseline by more than the tolerance fails the run (exit code 1).
+
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+
+import fb_standin
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+DEFAULT_SIZES = [1000, 10000]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+
+# registered benchmarks: (name, setup function, repeat, mutates scene)
+_BENCHMARKS = []
+
+def benchmark(name, repeat = 3, mutates = False):
+	''' Register a benchmark, the decorated function gets the library and returns the callable to time '''
+
+	def register(func):
+		_BENCHMARKS.append((name, func, repeat, mutates))
+		return func
+	return register
+
+@contextlib.contextmanager
+def _silenced():
+	# library log prints are not part of the measure
+	stdout = sys.stdout
+	sys.stdout = open(os.devnull, 'w')
+	try:
+		yield
+	finally:
+		sys.stdout.close()
+		sys.stdout = stdout
+
+def _load_library():
+	fb_standin.install()
+	import fb_library
+	return fb_library
+
+########## SCENE SCANS ##########
+
+@benchmark('scene_scan.get_all_scene_components')
+def bench_all_components(lib):
+	return lib.get_all_scene_components
+
+@benchmark('scene_scan.get_component_by_namespace')
+def bench_component_by_namespace(lib):
+	return lambda: lib.get_component_by_namespace('NS01')
+
+@benchmark('scene_scan.search_components_from_string')
+def bench_search(lib):
+	return lambda: lib.search_components_from_string('prop_0001', select = True)
+
+@benchmark('scene_scan.unselect_all_components')
+def bench_unselect(lib):
+	return lib.unselect_all_components
+
+########## SEARCH ##########
+
+@benchmark('search.search_components.cold')
+def bench_search_cold(lib):
+	def run():
+		lib.invalidate_name_table()
+		lib.search_components('actor*_left* -hand')
+	return run
+
+@benchmark('search.search_components.typing')
+def bench_search_typing(lib):
+	query = 'prop_0001'
+	def run():
+		lib.invalidate_name_table()
+		for idx in range(1, len(query) + 1):
+			lib.search_components(query[:idx])
+	return run
+
+@benchmark('search.search_components.select')
+def bench_search_select(lib):
+	return lambda: lib.search_components('prop_00', select = True)
+
+########## TAKES ##########
+
+@benchmark('takes.get_take_list')
+def bench_take_list(lib):
+	return lib.get_take_list
+
+@benchmark('takes.go_to_next_take')
+def bench_next_take(lib):
+	def run():
+		for _ in range(len(lib.lSys.Scene.Takes)):
+			lib.go_to_next_take()
+	return run
+
+@benchmark('takes.set_current_take')
+def bench_set_current_take(lib):
+	names = lib.get_take_list()
+	def run():
+		for name in names:
+			lib.set_current_take(name)
+	return run
+
+@benchmark('takes.get_take_spans')
+def bench_take_spans(lib):
+	return lambda: lib.get_take_spans()
+
+@benchmark('takes.get_take_spans.key_extent')
+def bench_take_spans_key_extent(lib):
+	def run():
+		lib.invalidate_take_cache()
+		lib.get_take_spans(key_extent = True)
+	return run
+
+@benchmark('takes.get_take_spans.key_extent.cached')
+def bench_take_spans_key_extent_cached(lib):
+	# extents reused after the take stamps are checked
+	lib.get_take_spans(key_extent = True)
+	return lambda: lib.get_take_spans(key_extent = True)
+
+@benchmark('takes.take_lengths_by_switching')
+def bench_take_lengths_switching(lib):
+	names = lib.get_take_list()
+	def run():
+		for name in names:
+			lib.set_current_take(name)
+			lib.get_take_length()
+	return run
+
+########## STORY ##########
+
+@benchmark('story.frame_story_clip')
+def bench_frame_story_clip(lib):
+	for track in lib.Story.RootFolder.Tracks:
+		for clip in track.Clips:
+			clip.Selected = True
+	return lib.frame_story_clip
+
+@benchmark('story.move_selected_clip_to_frame')
+def bench_move_clip(lib):
+	track = lib.Story.RootFolder.Tracks[0]
+	for clip in track.Clips:
+		clip.Selected = False
+	track.Clips[0].Selected = True
+	return lambda: lib.move_selected_clip_to_frame(0)
+
+@benchmark('story.insert_takes_in_story', repeat = 1, mutates = True)
+def bench_insert_takes(lib):
+	takes = list(lib.lScene.Takes) * 50
+	return lambda: lib.insert_takes_in_story(takes, lib.Story.RootFolder.Tracks[0])
+
+@benchmark('story.insert_take_in_storyMode.per_take', repeat = 1, mutates = True)
+def bench_insert_take_per_take(lib):
+	takes = list(lib.lScene.Takes) * 50
+	lib.Story.RootFolder.Tracks[0].Selected = True
+	def run():
+		for take in takes:
+			lib.insert_take_in_storyMode(take)
+	return run
+
+########## HIERARCHY ##########
+
+@benchmark('hierarchy.get_children')
+def bench_get_children(lib):
+	roots = [comp for comp in lib.lScene.Components if isinstance(comp, fb_standin.FBModel) and comp.Parent is None and comp.Children]
+	root = max(roots, key = lambda model: len(model.Children))
+	return lambda: lib.get_children(root)
+
+@benchmark('hierarchy.get_joint_list')
+def bench_joint_list(lib):
+	lib.unselect_all_comp()
+	lib.get_comp_by_name('Actor00_Hips').Selected = True
+	return lib.get_joint_list
+
+########## TRANSFORMATIONS ##########
+
+def _actor_joints(lib):
+	return lib.get_children(lib.get_comp_by_name('Actor00_Hips'), includeParent = True)
+
+@benchmark('transforms.sample_global_matrices')
+def bench_sample_global_matrices(lib):
+	joints = _actor_joints(lib)
+	return lambda: lib.sample_global_matrices(joints, 0, 99)
+
+@benchmark('transforms.go_to_frame_get_vector.per_joint')
+def bench_go_to_frame_get_vector(lib):
+	joints = _actor_joints(lib)
+	def run():
+		vector = lib.FBVector3d()
+		for frame in range(100):
+			for joint in joints:
+				lib.go_to_frame(frame)
+				joint.GetVector(vector, lib.FBModelTransformationType.kModelTranslation, True)
+				joint.GetVector(vector, lib.FBModelTransformationType.kModelRotation, True)
+	return run
+
+########## BATCH EDITS ##########
+
+def _select_props(lib, count):
+	lib.unselect_all_comp()
+	props = [comp for comp in lib.lScene.Components if comp.Name.startswith('prop_')][:count]
+	for prop in props:
+		prop.Selected = True
+
+def _with_batching(lib, enabled, func):
+	def run():
+		lib.set_scene_batching(enabled)
+		try:
+			func()
+		finally:
+			lib.set_scene_batching(True)
+	return run
+
+@benchmark('batch.group_selected_components', repeat = 1, mutates = True)
+def bench_group_batched(lib):
+	_select_props(lib, 1000)
+	return _with_batching(lib, True, lib.group_selected_components)
+
+@benchmark('batch.group_selected_components.unbatched', repeat = 1, mutates = True)
+def bench_group_unbatched(lib):
+	_select_props(lib, 1000)
+	return _with_batching(lib, False, lib.group_selected_components)
+
+@benchmark('batch.characterise_skeleton', repeat = 1, mutates = True)
+def bench_characterise_batched(lib):
+	return _with_batching(lib, True, lambda: lib.characterise_skeleton('Actor00'))
+
+@benchmark('batch.characterise_skeleton.unbatched', repeat = 1, mutates = True)
+def bench_characterise_unbatched(lib):
+	return _with_batching(lib, False, lambda: lib.characterise_skeleton('Actor00'))
+
+@benchmark('batch.delete_components_from_namespace', repeat = 1, mutates = True)
+def bench_delete_namespace(lib):
+	return lambda: lib.delete_components_from_namespace('NS03')
+
+########## JOBS ##########
+
+@benchmark('jobs.build_review', repeat = 1, mutates = True)
+def bench_build_review(lib):
+	return lib.build_review
+
+@benchmark('jobs.build_review.background', repeat = 1, mutates = True)
+def bench_build_review_background(lib):
+	def run():
+		job = lib.run_in_background(lib.iter_build_review(), 'build_review')
+		while not job.finished:
+			fb_standin.idle()
+	return run
+
+@benchmark('jobs.build_review.plotted', repeat = 1, mutates = True)
+def bench_build_review_plotted(lib):
+	# the Story path to a review take: clips back to back, then each character plotted on the review take
+	def run():
+		lib.build_review()
+		for character in list(lib.lScene.Characters):
+			lib.plot_to_skeleton(character)
+	return run
+
+@benchmark('jobs.concatenate_takes', repeat = 1, mutates = True)
+def bench_concatenate_takes(lib):
+	return lambda: lib.concatenate_takes()
+
+@benchmark('jobs.concatenate_takes.blend_10', repeat = 1, mutates = True)
+def bench_concatenate_takes_blend(lib):
+	return lambda: lib.concatenate_takes(blend_frames = 10)
+
+########## CENSUS ##########
+
+@benchmark('census.get_scene_census')
+def bench_census(lib):
+	return lib.get_scene_census
+
+@benchmark('census.get_scene_census.all_takes')
+def bench_census_all_takes(lib):
+	return lambda: lib.get_scene_census(all_takes = True)
+
+########## TIME CONVERSION ##########
+
+@benchmark('time.frames_to_ticks')
+def bench_frames_to_ticks(lib):
+	frames = list(range(100000))
+	return lambda: lib.frames_to_ticks(frames)
+
+@benchmark('time.frames_to_fbtime.per_item')
+def bench_frames_to_fbtime(lib):
+	frames = list(range(100000))
+	return lambda: [lib.FBTime(0, 0, 0, frame) for frame in frames]
+
+@benchmark('time.timecode_round_trip.drop_frame')
+def bench_timecode_round_trip(lib):
+	frames = list(range(100000))
+	return lambda: lib.timecode_to_frames(lib.frames_to_timecode(frames, 30000 / 1001.0, True), 30000 / 1001.0)
+
+########## KEYS ##########
+
+def _key_arrays(models, frames):
+	import numpy
+	values = numpy.random.RandomState(0).uniform(-180, 180, (frames, 3))
+	return dict((model, {'rotation': (numpy.arange(frames), values)}) for model in models)
+
+@benchmark('keys.write_animation.100x1000', repeat = 1, mutates = True)
+def bench_write_animation(lib):
+	models = [comp for comp in lib.lScene.Components if isinstance(comp, fb_standin.FBModel)][:100]
+	animation = _key_arrays(models, 1000)
+	return lambda: lib.write_animation(animation)
+
+@benchmark('keys.read_keys')
+def bench_read_keys(lib):
+	models = [comp for comp in lib.lScene.Components if isinstance(comp, fb_standin.FBModel)][:100]
+	lib.write_animation(_key_arrays(models, 1000))
+	return lambda: [lib.read_keys(model, 'rotation') for model in models]
+
+########## MOTION COMPARISON ##########
+
+@benchmark('motion.compare_motion_batch', repeat = 1)
+def bench_compare_motion_batch(lib):
+	joints = lib.get_children(lib.get_comp_by_name('Actor00_Hips'), includeParent = True)
+	names = lib.get_take_list()
+	return lambda: lib.compare_motion_batch([(names[0], name) for name in names[1:]], joints)
+
+########## HUDS ##########
+
+def _play(lib, frames):
+	player = lib.FBPlayerControl()
+	def run():
+		for frame in range(frames):
+			player.Goto(lib.frame_to_time(frame))
+	return run
+
+@benchmark('hud.playback')
+def bench_playback(lib):
+	return _play(lib, 100)
+
+@benchmark('hud.playback.performance_hud', mutates = True)
+def bench_playback_performance_hud(lib):
+	lib.add_performance_hud()
+	return _play(lib, 100)
+
+########## SNAPSHOTS ##########
+
+@benchmark('snapshot.take_scene_snapshot')
+def bench_snapshot(lib):
+	return lib.take_scene_snapshot
+
+@benchmark('snapshot.diff_scene_snapshots')
+def bench_snapshot_diff(lib):
+	before = lib.take_scene_snapshot()
+	lib.go_to_frame(10)
+	after = lib.take_scene_snapshot()
+	return lambda: lib.diff_scene_snapshots(before, after)
+
+########## TAKE DEDUPE ##########
+
+@benchmark('dedupe.dedupe_takes', repeat = 1)
+def bench_dedupe(lib):
+	def run():
+		lib.invalidate_take_cache()
+		lib.dedupe_takes()
+	return run
+
+@benchmark('dedupe.dedupe_takes.cached')
+def bench_dedupe_cached(lib):
+	lib.dedupe_takes()
+	return lib.dedupe_takes
+
+########## EXPORT ##########
+
+def _export_dir():
+	import tempfile
+	return tempfile.mkdtemp(prefix = 'fb_benchmark_')
+
+@benchmark('export.character_animation.fbx')
+def bench_export_fbx(lib):
+	path = os.path.join(_export_dir(), 'anim.fbx')
+	return lambda: lib.export_character_animation(path, lib.lApp.CurrentCharacter.Name)
+
+@benchmark('export.animation_binary')
+def bench_export_binary(lib):
+	path = os.path.join(_export_dir(), 'anim.mban')
+	return lambda: lib.export_animation_binary(path)
+
+@benchmark('export.read.fbx')
+def bench_read_fbx(lib):
+	# decoding the key arrays of the exported binary FBX (deflated KeyTime and KeyValueFloat arrays of
+	# every AnimationCurve, as MotionBuilder writes them), the least work a tool does to load it
+	import fb_fbx_reader
+	path = os.path.join(_export_dir(), 'anim.fbx')
+	lib.export_character_animation(path, lib.lApp.CurrentCharacter.Name)
+	def run():
+		with fb_fbx_reader.FbxBinaryReader(path) as reader:
+			for record in reader.children(reader.find('Objects')):
+				if record[0] == 'AnimationCurve':
+					reader.array(reader.find('KeyTime', record))
+					reader.array(reader.find('KeyValueFloat', record))
+	return run
+
+@benchmark('export.read.animation_binary')
+def bench_read_binary(lib):
+	path = os.path.join(_export_dir(), 'anim.mban')
+	lib.export_animation_binary(path)
+	return lambda: lib.read_animation_binary(path)
+
+@benchmark('export.scan_fbx_takes.100_files')
+def bench_scan_fbx_takes(lib):
+	# take manifest of synthetic binary FBX files holding 20k vertices of geometry each, read serially
+	folder = _export_dir()
+	for idx in range(100):
+		fb_standin.write_fbx(os.path.join(folder, 'shot_{:03d}.fbx'.format(idx)), geometry = 20000, seed = idx)
+	return lambda: lib.scan_fbx_takes(folder, workers = 1)
+
+########## LIVE CAPTURE ##########
+
+@benchmark('capture.flush.240_packets', repeat = 1, mutates = True)
+def bench_capture_flush(lib):
+	# packets are fed to the recorder directly, only the flush to the FCurves is timed
+	import struct
+	import numpy
+	joints = lib.get_children(lib.get_comp_by_name('Actor00_Hips'), includeParent = True)
+	recorder = lib.LiveCaptureRecorder(joints)
+	recorder.take = lib.lSys.CurrentTake
+	recorder.start_frame = 0
+	recorder.fps = 30.0
+	values = numpy.random.RandomState(0).uniform(-90, 90, (len(joints), 6))
+	header_size = struct.calcsize(lib._CAPTURE_HEADER)
+	for idx in range(240):
+		recorder._receive(lib.pack_capture_packet(idx, values, idx / 240.0), header_size)
+	return recorder.flush
+
+########## COMMAND SERVER ##########
+
+def _command_round_trip(lib, send):
+	# server started and stopped by the timed call, requests are run by pumping the idle callback
+	import fb_command_client
+	def run():
+		server = lib.CommandServer()
+		port = server.start()
+		try:
+			with fb_command_client.CommandClient(port, token = server.token) as client:
+				receive = send(client)
+				while server.stats["requests"] < receive[0]:
+					fb_standin.idle()
+				receive[1]()
+		finally:
+			server.stop()
+	return run
+
+@benchmark('server.call.200_pipelined')
+def bench_server_pipelined(lib):
+	def send(client):
+		ids = [client.send('get_transport_fps') for _ in range(200)]
+		return len(ids), lambda: [client.receive(request_id) for request_id in ids]
+	return _command_round_trip(lib, send)
+
+@benchmark('server.call.200_batched')
+def bench_server_batched(lib):
+	def send(client):
+		request_id = client._write({"batch": [{"call": "get_transport_fps"}] * 200})
+		return 1, lambda: client._read(request_id)
+	return _command_round_trip(lib, send)
+
+########## MIRROR ##########
+
+@benchmark('mirror.animation.character', repeat = 1, mutates = True)
+def bench_mirror_animation(lib):
+	lib.get_mirror_mapping()
+	return lib.mirror_animation
+
+@benchmark('mirror.mapping.cold')
+def bench_mirror_mapping(lib):
+	return lambda: lib.get_mirror_mapping(rebuild = True)
+
+########## ROTATION FILTERS ##########
+
+@benchmark('rotation_filter.gimbal.character', repeat = 1, mutates = True)
+def bench_filter_rotations(lib):
+	return lambda: lib.filter_rotations(rotation_filter = "gimbal")
+
+@benchmark('rotation_filter.repair_gimbal_flips.70x1000')
+def bench_repair_gimbal_flips(lib):
+	import numpy
+	rotations = numpy.random.RandomState(0).uniform(-180, 180, (1000, 70, 3))
+	return lambda: lib.repair_gimbal_flips(rotations)
+
+########## RUNNER ##########
+
+def run(sizes = DEFAULT_SIZES, only = None, log = True):
+	''' Run the benchmarks at each scene size, returns {name: {size: seconds}} '''
+
+	lib = _load_library()
+	results = {}
+
+	for size in sizes:
+		fb_standin.build_scene(size)
+		for name, setup, repeat, mutates in _BENCHMARKS:
+			if only and not any(name.startswith(prefix) for prefix in only):
+				continue
+			with _silenced():
+				func = setup(lib)
+				best = None
+				for _ in range(repeat):
+					start = _clock()
+					func()
+					elapsed = _clock() - start
+					best = elapsed if best is None else min(best, elapsed)
+			if mutates:
+				fb_standin.build_scene(size)
+			results.setdefault(name, {})[str(size)] = best
+			if log:
+				print("{:<48}{:>10}{:>12.3f} ms".format(name, size, best * 1000))
+
+	return results
+
+def compare(results, baseline, tolerance = 1.5, min_delta = 0.002, log = True):
+	''' Returns the list of (name, size, seconds, baseline seconds) slower than baseline * tolerance '''
+
+	regressions = []
+	for name, timings in sorted(results.items()):
+		for size, elapsed in sorted(timings.items()):
+			reference = baseline.get(name, {}).get(size)
+			if reference is None:
+				continue
+			if elapsed > reference * tolerance and elapsed - reference > min_delta:
+				regressions.append((name, size, elapsed, reference))
+
+	if log:
+		for name, size, elapsed, reference in regressions:
+			print("REGRESSION {} [{}]: {:.3f} ms (baseline {:.3f} ms)".format(name, size, elapsed * 1000, reference * 1000))
+		print("{} regression(s)".format(len(regressions)))
+
+	return regressions
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description = "fb_library benchmarks on synthetic scenes")
+	parser.add_argument('--sizes', type = int, nargs = '+', default = DEFAULT_SIZES)
+	parser.add_argument('--only', nargs = '+', default = None, help = "benchmark name prefixes to run")
+	parser.add_argument('--baseline', default = DEFAULT_BASELINE)
+	parser.add_argument('--save-baseline', action = 'store_true')
+	parser.add_argument('--tolerance', type = float, default = 1.5)
+	parser.add_argument('--output', default = None, help = "write the results as json")
+	parser.add_argument('--ci', action = 'store_true', help = "fail when the baseline file or a benchmark entry is missing")
+	args = parser.parse_args(argv)
+
+	if args.ci and not args.save_baseline and not os.path.exists(args.baseline):
+		print("ERROR, no baseline found at {}, run with --save-baseline to create one".format(args.baseline))
+		return 1
+
+	results = run(args.sizes, args.only)
+
+	if args.output:
+		with open(args.output, 'w') as f:
+			json.dump(results, f, indent = 1, sort_keys = True)
+
+	if args.save_baseline:
+		baseline = {}
+		if os.path.exists(args.baseline):
+			with open(args.baseline) as f:
+				baseline = json.load(f)
+		for name, timings in results.items():
+			baseline.setdefault(name, {}).update(timings)
+		with open(args.baseline, 'w') as f:
+			json.dump(baseline, f, indent = 1, sort_keys = True)
+		print("Baseline saved here: {}".format(args.baseline))
+		return 0
+
+	if not os.path.exists(args.baseline):
+		print("No baseline found, run with --save-baseline to create one")
+		return 0
+
+	with open(args.baseline) as f:
+		baseline = json.load(f)
+
+	regressions = compare(results, baseline, args.tolerance)
+	if args.ci:
+		missing = [(name, size) for name, timings in sorted(results.items()) for size in sorted(timings) if baseline.get(name, {}).get(size) is None]
+		for name, size in missing:
+			print("MISSING BASELINE {} [{}]".format(name, size))
+		if missing:
+			return 1
+
+	return 1 if regressions else 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,112 @@
+# Author: Alexandre
+## Client of the fb_library command server, runs in any python (no pyfbsdk needed)
+####################################
+#
+# usage:
+#	in MotionBuilder:   start_command_server(8765, token, log = True)   (a random token is printed if not given)
+#	outside:            import fb_command_client
+#	                    client = fb_command_client.CommandClient(8765, token = token)
+#	                    client.call('get_take_list')
+#	                    client.batch([('set_current_take', ['Take 002']), ('get_take_length',)])
+#	                    for name in client.stream('get_all_scene_components'): ...
+#
+# Requests can be pipelined: send() returns a request id right away, receive() waits for its answer.
+
+import json
+import socket
+
+class CommandError(Exception):
+	''' Error raised by a library function on the server '''
+
+class CommandClient(object):
+	''' Connection to a command server, one JSON request or response per line '''
+
+	def __init__(self, port, host = "127.0.0.1", timeout = 60.0, token = ""):
+		# token: the shared token of the server, sent with every request
+		self.token = token
+		self._socket = socket.create_connection((host, port), timeout)
+		self._stream = self._socket.makefile("rb")
+		self._next_id = 0
+		# answers read while waiting for another request
+		self._pending = {}
+		self.last_ms = None
+
+	def close(self):
+		self._stream.close()
+		self._socket.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def _write(self, request):
+		self._next_id += 1
+		request["id"] = self._next_id
+		request["token"] = self.token
+		self._socket.sendall((json.dumps(request) + "\n").encode("utf-8"))
+		return self._next_id
+
+	def _read(self, request_id):
+		# next message of a request, messages of other requests are kept for later
+		queue = self._pending.get(request_id)
+		if queue:
+			return queue.pop(0)
+		while True:
+			line = self._stream.readline()
+			if not line:
+				raise ConnectionError("command server closed the connection")
+			message = json.loads(line.decode("utf-8"))
+			if message.get("id") == request_id:
+				return message
+			self._pending.setdefault(message.get("id"), []).append(message)
+
+	def send(self, call, *args, **kwargs):
+		''' Send a request without waiting, returns its id for receive() '''
+
+		return self._write({"call": call, "args": list(args), "kwargs": kwargs})
+
+	def receive(self, request_id):
+		''' Result of a sent request, raises CommandError if it failed '''
+
+		message = self._read(request_id)
+		self.last_ms = message.get("ms")
+		if not message.get("ok"):
+			raise CommandError(message.get("error"))
+		return message.get("result")
+
+	def call(self, call, *args, **kwargs):
+		''' Run a library function and return its result '''
+
+		return self.receive(self.send(call, *args, **kwargs))
+
+	def batch(self, calls):
+		''' Run (name, [args], {kwargs}) calls in one request, returns [{"ok", "result" | "error", "ms"}] '''
+
+		batch = []
+		for item in calls:
+			batch.append({"call": item[0], "args": list(item[1]) if len(item) > 1 else [], "kwargs": item[2] if len(item) > 2 else {}})
+		message = self._read(self._write({"batch": batch}))
+		self.last_ms = message.get("ms")
+		if not message.get("ok"):
+			raise CommandError(message.get("error"))
+		return message["results"]
+
+	def stream(self, call, *args, **kwargs):
+		''' Yield the items of a list result as the server sends them in chunks '''
+
+		request_id = self._write({"call": call, "args": list(args), "kwargs": kwargs, "stream": True})
+		while True:
+			message = self._read(request_id)
+			if "chunk" in message:
+				for item in message["chunk"]:
+					yield item
+				continue
+			self.last_ms = message.get("ms")
+			if not message.get("ok"):
+				raise CommandError(message.get("error"))
+			if not message.get("done"):
+				# not a list, sent whole
+				yield message.get("result")
+			return
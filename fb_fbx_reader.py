@@ -0,0 +1,288 @@
+# Author: Alexandre
+## Reader of binary FBX files: take names, spans, fps, characters and namespaces without opening the scene
+## Runs in any python (no pyfbsdk needed), so directories can be scanned by a pool of worker processes
+####################################
+#
+# usage:
+#	import fb_fbx_reader
+#	fb_fbx_reader.read_fbx_info('C:/mocap/shot_010.fbx')
+#	fb_fbx_reader.scan_fbx_files('C:/mocap', workers = 8, manifest_path = 'C:/mocap/manifest.json')
+#
+#	python fb_fbx_reader.py C:/mocap --workers 8 --output manifest.json
+#
+# The file is memory-mapped and only the few records holding this information are decoded: every
+# other record (geometry, animation curves, textures) is skipped through its end offset unread,
+# FbxBinaryReader.array() decodes the array of a record (KeyTime, KeyValueFloat) when it is needed.
+
+import os
+import sys
+import json
+import mmap
+import time
+import zlib
+import struct
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+_FBX_MAGIC = b"Kaydara FBX Binary  \x00"
+_FBX_HEADER_SIZE = 27
+
+# FBX time unit
+FBX_TICKS_PER_SECOND = 46186158000
+
+# GlobalSettings TimeMode (FbxTime::EMode) -> fps, None for custom (CustomFrameRate)
+FBX_TIME_MODES = {0: 30.0, 1: 120.0, 2: 100.0, 3: 60.0, 4: 50.0, 5: 48.0, 6: 30.0, 7: 30.0, 8: 29.97, 9: 29.97, 10: 25.0,
+	11: 24.0, 12: 1000.0, 13: 23.976, 14: None, 15: 96.0, 16: 72.0, 17: 59.94, 18: 119.88}
+
+# scalar property type -> struct format
+_FBX_SCALARS = {b"Y": "<h", b"C": "<?", b"I": "<i", b"F": "<f", b"D": "<d", b"L": "<q"}
+
+# array property type -> struct item format
+_FBX_ARRAYS = {b"f": "f", b"d": "d", b"l": "q", b"i": "i", b"b": "b"}
+
+class FbxBinaryReader(object):
+	''' Memory-mapped binary FBX file, records are decoded on demand '''
+
+	# a record is (name, end offset, property count, properties offset, children offset), the children
+	# of a record run from its children offset to its end offset, minus the closing null record
+	def __init__(self, path):
+		self.path = path
+		self._file = open(path, "rb")
+		try:
+			self._data = mmap.mmap(self._file.fileno(), 0, access = mmap.ACCESS_READ)
+		except ValueError:
+			# empty file
+			self._file.close()
+			raise ValueError("{} is not a binary FBX file".format(path))
+		if self._data[:len(_FBX_MAGIC)] != _FBX_MAGIC:
+			self.close()
+			raise ValueError("{} is not a binary FBX file".format(path))
+		self.version = struct.unpack_from("<I", self._data, 23)[0]
+		# 64 bit offsets from 7.5
+		self._record = "<QQQB" if self.version >= 7500 else "<IIIB"
+		self._record_size = struct.calcsize(self._record)
+		self._null_size = self._record_size - 1
+
+	def close(self):
+		self._data.close()
+		self._file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def _read_record(self, offset):
+		# record at offset, None for a null record (end of a list)
+		end, count, size, name_size = struct.unpack_from(self._record, self._data, offset)
+		if end == 0:
+			return None
+		start = offset + self._record_size
+		name = self._data[start:start + name_size].decode("utf-8", "replace")
+		return name, end, count, start + name_size, start + name_size + size
+
+	def children(self, record = None):
+		''' Yield the child records of a record (the top level records if None) '''
+
+		if record is None:
+			offset, end = _FBX_HEADER_SIZE, len(self._data)
+		else:
+			offset, end = record[4], record[1]
+		while offset + self._record_size <= end:
+			child = self._read_record(offset)
+			if child is None:
+				return
+			yield child
+			offset = child[1]
+
+	def find(self, name, record = None):
+		''' First child record of a given name, None if missing '''
+
+		for child in self.children(record):
+			if child[0] == name:
+				return child
+		return None
+
+	def properties(self, record, count = None):
+		''' Values of the first count (all by default) properties of a record, arrays are returned as (type, length) '''
+
+		data = self._data
+		offset = record[3]
+		values = []
+		for _ in range(record[2] if count is None else min(count, record[2])):
+			code = data[offset:offset + 1]
+			offset += 1
+			if code in _FBX_SCALARS:
+				fmt = _FBX_SCALARS[code]
+				values.append(struct.unpack_from(fmt, data, offset)[0])
+				offset += struct.calcsize(fmt)
+			elif code in (b"S", b"R"):
+				size = struct.unpack_from("<I", data, offset)[0]
+				raw = data[offset + 4:offset + 4 + size]
+				values.append(raw.decode("utf-8", "replace") if code == b"S" else raw)
+				offset += 4 + size
+			elif code in (b"f", b"d", b"l", b"i", b"b"):
+				length, encoding, size = struct.unpack_from("<III", data, offset)
+				values.append((code.decode(), length))
+				offset += 12 + size
+			else:
+				raise ValueError("{}: unknown property type {!r} at offset {}".format(self.path, code, offset - 1))
+		return values
+
+	def array(self, record):
+		''' Values of the first property of a record, an array (KeyTime, KeyValueFloat, Vertices...), as a tuple '''
+
+		data = self._data
+		offset = record[3]
+		code = data[offset:offset + 1]
+		if code not in _FBX_ARRAYS:
+			raise ValueError("{}: {} does not start with an array".format(self.path, record[0]))
+		length, encoding, size = struct.unpack_from("<III", data, offset + 1)
+		raw = data[offset + 13:offset + 13 + size]
+		if encoding == 1:
+			raw = zlib.decompress(raw)
+		return struct.unpack_from("<{}{}".format(length, _FBX_ARRAYS[code]), raw)
+
+def _object_name(name):
+	# "Name\x00\x01Class" -> "Name"
+	return name.split("\x00\x01")[0]
+
+def read_fbx_info(path):
+	''' Returns {"path", "version", "fps", "current_take", "takes" [{"name", "start", "stop", "file"}], "characters", "namespaces"} of a binary FBX file '''
+
+	# take spans are in frames at the file fps, namespaces are read from the object names ("ns:joint")
+	with FbxBinaryReader(path) as reader:
+		fps = None
+		custom_fps = None
+		settings = reader.find("GlobalSettings")
+		settings = reader.find("Properties70", settings) if settings else None
+		for prop in reader.children(settings) if settings else ():
+			name = reader.properties(prop, 1)[0]
+			if name == "TimeMode":
+				fps = FBX_TIME_MODES.get(reader.properties(prop)[-1])
+			elif name == "CustomFrameRate":
+				custom_fps = reader.properties(prop)[-1]
+		if fps is None:
+			fps = custom_fps if custom_fps and custom_fps > 0 else 30.0
+
+		characters = []
+		namespaces = set()
+		objects = reader.find("Objects")
+		for record in reader.children(objects) if objects else ():
+			# id, name, class: geometry and curve data in the children are never read
+			values = reader.properties(record, 2)
+			if len(values) < 2:
+				continue
+			name = _object_name(values[1])
+			if record[0] == "Character":
+				characters.append(name)
+			if ":" in name:
+				namespaces.add(name.rsplit(":", 1)[0])
+
+		takes = []
+		current_take = None
+		takes_record = reader.find("Takes")
+		for record in reader.children(takes_record) if takes_record else ():
+			if record[0] == "Current":
+				current_take = reader.properties(record, 1)[0] or None
+			elif record[0] == "Take":
+				take = {"name": reader.properties(record, 1)[0], "start": None, "stop": None, "file": None}
+				for child in reader.children(record):
+					if child[0] == "LocalTime":
+						start, stop = reader.properties(child, 2)
+						take["start"] = int(round(start * fps / FBX_TICKS_PER_SECOND))
+						take["stop"] = int(round(stop * fps / FBX_TICKS_PER_SECOND))
+					elif child[0] == "FileName":
+						take["file"] = reader.properties(child, 1)[0]
+				takes.append(take)
+
+		return {
+			"path": path,
+			"version": reader.version,
+			"fps": fps,
+			"current_take": current_take,
+			"takes": takes,
+			"characters": characters,
+			"namespaces": sorted(namespaces),
+		}
+
+def _scan_file(path):
+	# (path, info, error) of one file, errors are returned so one bad file does not stop a scan
+	try:
+		return path, read_fbx_info(path), None
+	except Exception as e:
+		return path, None, "{}: {}".format(type(e).__name__, e)
+
+def list_fbx_files(folder, recursive = True):
+	''' Sorted paths of the .fbx files of a folder '''
+
+	paths = []
+	for root, dirs, files in os.walk(folder):
+		paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(".fbx"))
+		if not recursive:
+			break
+	return sorted(paths)
+
+def scan_fbx_files(files, workers = None, executable = None, manifest_path = None, log = False):
+	''' Read the take manifest of FBX files (or of every .fbx under a folder) with a pool of processes '''
+
+	# returns {"files": {path: info}, "failed": [(path, error)], "seconds"}, written as json to manifest_path if given
+	# workers defaults to the cpu count, inside MotionBuilder pass a standalone interpreter (mobupy) as executable
+	import multiprocessing
+
+	if isinstance(files, str) and os.path.isdir(files):
+		files = list_fbx_files(files)
+	files = list(files)
+	workers = workers or multiprocessing.cpu_count()
+	start = _clock()
+	infos = {}
+	failed = []
+
+	if workers > 1 and len(files) > 1:
+		if executable:
+			multiprocessing.set_executable(executable)
+		pool = multiprocessing.Pool(workers)
+		try:
+			results = list(pool.imap_unordered(_scan_file, files, chunksize = max(1, min(64, len(files) // (workers * 4)))))
+		finally:
+			pool.close()
+			pool.join()
+	else:
+		results = [_scan_file(path) for path in files]
+
+	for path, info, error in results:
+		if error:
+			failed.append((path, error))
+			if log:
+				print("ERROR, {}: {}".format(path, error))
+		else:
+			infos[path] = info
+	elapsed = _clock() - start
+
+	manifest = {"files": infos, "failed": failed, "seconds": elapsed}
+	if manifest_path:
+		with open(manifest_path, "w") as f:
+			json.dump(manifest, f, indent = 1, sort_keys = True)
+
+	if log:
+		print("{} files scanned in {:.2f} s ({:.1f} files/s), {} takes, {} failed".format(len(files), elapsed, len(files) / elapsed if elapsed else 0.0, sum(len(info["takes"]) for info in infos.values()), len(failed)))
+
+	return manifest
+
+def main(argv = None):
+	import argparse
+	parser = argparse.ArgumentParser(description = "take manifest of binary FBX files")
+	parser.add_argument('files', nargs = '+', help = "FBX files or folders")
+	parser.add_argument('--workers', type = int, default = None)
+	parser.add_argument('--output', default = None, help = "write the manifest as json")
+	args = parser.parse_args(argv)
+
+	files = []
+	for path in args.files:
+		files.extend(list_fbx_files(path) if os.path.isdir(path) else [path])
+	manifest = scan_fbx_files(files, args.workers, manifest_path = args.output, log = True)
+	return 1 if manifest["failed"] else 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -19,18 +19,326 @@ from modules import datetime  # for date and time
 import file_system_library as flib
 import operator
 import time
+import json
+import functools
+import threading
+import contextlib
+import fnmatch
+import re
+
+# optional, required by the vectorized helpers only
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+########## INSTRUMENTATION ##########
+
+# perf_counter when available (python 3), wall clock otherwise
+_clock = getattr(time, 'perf_counter', time.time)
+
+# aggregated stats per traced function: name -> [calls, total, min, max, sdk_calls, objects]
+_trace_stats = {}
+# chrome trace events, only recorded while a profile is running
+_trace_events = []
+_trace_recording = [False]
+_trace_origin = [_clock()]
+_trace_lock = threading.Lock()
+_trace_local = threading.local()
+
+def _trace_stack():
+	# per thread stack of [sdk_calls, objects] counters of the running traced calls
+	stack = getattr(_trace_local, 'stack', None)
+	if stack is None:
+		stack = _trace_local.stack = []
+	return stack
+
+def _trace_active():
+	# per thread names of the traced functions currently running
+	active = getattr(_trace_local, 'active', None)
+	if active is None:
+		active = _trace_local.active = set()
+	return active
+
+def _trace_count(sdk_calls = 1, objects = 0):
+	# add SDK calls and touched objects to the innermost traced call
+	stack = _trace_stack()
+	if stack:
+		stack[-1][0] += sdk_calls
+		stack[-1][1] += objects
+
+def _trace_iter(collection):
+	# iterate over an SDK collection, counting one call and one touched object per item
+	_trace_count(1, 0)
+	for item in collection:
+		_trace_count(1, 1)
+		yield item
+
+def _trace_record(name, start, end, counters):
+	# store a finished call in the stats table (and the event list while profiling)
+	elapsed = end - start
+	with _trace_lock:
+		stats = _trace_stats.get(name)
+		if stats is None:
+			_trace_stats[name] = [1, elapsed, elapsed, elapsed, counters[0], counters[1]]
+		else:
+			stats[0] += 1
+			stats[1] += elapsed
+			stats[2] = min(stats[2], elapsed)
+			stats[3] = max(stats[3], elapsed)
+			stats[4] += counters[0]
+			stats[5] += counters[1]
+
+		if _trace_recording[0]:
+			_trace_events.append({
+				"name": name,
+				"cat": "fb_library",
+				"ph": "X",
+				"ts": (start - _trace_origin[0]) * 1e6,
+				"dur": elapsed * 1e6,
+				"pid": os.getpid(),
+				"tid": threading.current_thread().ident,
+				"args": {"sdk_calls": counters[0], "objects": counters[1]},
+			})
+
+def traced(func):
+	''' Decorator recording wall time, call count, SDK calls and objects touched by a function '''
+
+	name = func.__name__
+
+	@functools.wraps(func)
+	def wrapper(*args, **kwargs):
+		# recursive calls (get_children...) are part of the outermost call of the same function
+		active = _trace_active()
+		if name in active:
+			return func(*args, **kwargs)
+		stack = _trace_stack()
+		counters = [0, 0]
+		stack.append(counters)
+		active.add(name)
+		start = _clock()
+		try:
+			return func(*args, **kwargs)
+		finally:
+			end = _clock()
+			active.discard(name)
+			stack.pop()
+			# nested calls are included in the caller counters
+			if stack:
+				stack[-1][0] += counters[0]
+				stack[-1][1] += counters[1]
+			_trace_record(name, start, end, counters)
+
+	return wrapper
+
+def reset_trace(log = False):
+	''' Clear all recorded stats and trace events '''
+
+	with _trace_lock:
+		_trace_stats.clear()
+		del _trace_events[:]
+		_trace_origin[0] = _clock()
+
+	if log:
+		print("Trace reset")
+
+def get_trace_report(sort_by = 'total', log = False):
+	''' Returns the traced stats per function as a list of dicts, sorted by the given key (descending) '''
+
+	with _trace_lock:
+		items = [(name, list(stats)) for name, stats in _trace_stats.items()]
+
+	report = []
+	for name, (calls, total, fastest, slowest, sdk_calls, objects) in items:
+		report.append({
+			"name": name,
+			"calls": calls,
+			"total": total,
+			"mean": total / calls,
+			"min": fastest,
+			"max": slowest,
+			"sdk_calls": sdk_calls,
+			"objects": objects,
+		})
+	report.sort(key = operator.itemgetter(sort_by), reverse = True)
+
+	if log:
+		print("{:<36}{:>8}{:>12}{:>12}{:>12}{:>12}".format("function", "calls", "total ms", "mean ms", "sdk calls", "objects"))
+		for row in report:
+			print("{:<36}{:>8}{:>12.3f}{:>12.3f}{:>12}{:>12}".format(row["name"], row["calls"], row["total"] * 1000, row["mean"] * 1000, row["sdk_calls"], row["objects"]))
+
+	return report
+
+def export_trace(target_path, format = 'chrome', log = False):
+	''' Export recorded events as a Chrome trace (chrome://tracing, Perfetto) or the stats report as json '''
+
+	if format == 'chrome':
+		with _trace_lock:
+			data = {"traceEvents": list(_trace_events), "displayTimeUnit": "ms"}
+	elif format == 'json':
+		data = {"functions": get_trace_report()}
+	else:
+		raise ValueError("format argument must be chrome or json")
+
+	target_dir = os.path.dirname(target_path)
+	if target_dir:
+		flib.ensure_dir(target_dir)
+
+	with open(target_path, 'w') as f:
+		json.dump(data, f, indent = 1)
+
+	if log:
+		print("Trace exported here: {}".format(target_path))
+
+@contextlib.contextmanager
+def profile_script(name = 'script', trace_path = None, log = True):
+	''' Context manager profiling a whole user script: stats are reset, events recorded and reported on exit '''
+
+	reset_trace()
+	_trace_recording[0] = True
+	counters = [0, 0]
+	_trace_stack().append(counters)
+	start = _clock()
+	try:
+		yield
+	finally:
+		end = _clock()
+		_trace_stack().pop()
+		_trace_record(name, start, end, counters)
+		_trace_recording[0] = False
+
+		if trace_path:
+			export_trace(trace_path, log = log)
+		if log:
+			get_trace_report(log = True)
+
+########## BATCH EDITS ##########
+
+# bulk operations use scene_batch() unless disabled with set_scene_batching(False)
+_batch_enabled = [True]
+_batch_local = threading.local()
+
+class SceneBatch(object):
+	''' Scene edits collected inside a scene_batch() block, applied at once when the block exits '''
+
+	def __init__(self, name):
+		self.name = name
+		self.elapsed = 0.0
+		self.applied = 0
+		self._edits = []
+		self._deletions = []
+		self._deleted_ids = set()
+
+	def set(self, comp, attribute, value):
+		''' Queue an attribute change (Parent, Rotation, Selected...) '''
+		self._edits.append((comp, attribute, value))
+
+	def delete(self, comp):
+		''' Queue a deletion (once per component), deletions are applied after all attribute changes '''
+		# keyed by name, pyfbsdk can return a new wrapper of the same object on each access
+		key = (type(comp).__name__, comp.LongName)
+		if key not in self._deleted_ids:
+			self._deleted_ids.add(key)
+			self._deletions.append(comp)
+
+	def __len__(self):
+		return len(self._edits) + len(self._deletions)
+
+	def _apply(self):
+		# apply the edits, restoring the previous values if one of them fails
+		applied = []
+		try:
+			for comp, attribute, value in self._edits:
+				previous = getattr(comp, attribute)
+				setattr(comp, attribute, value)
+				applied.append((comp, attribute, previous))
+		except Exception:
+			for comp, attribute, previous in reversed(applied):
+				setattr(comp, attribute, previous)
+			raise
+		_trace_count(len(self._edits), len(self._edits))
+
+		for comp in self._deletions:
+			comp.FBDelete()
+		_trace_count(len(self._deletions), len(self._deletions))
+
+def set_scene_batching(enabled = True, log = False):
+	''' Enable or disable batching of the library bulk edits (to compare timings) '''
+
+	_batch_enabled[0] = enabled
+
+	if log:
+		print("Scene batching {}".format("ON" if enabled else "OFF"))
+
+def _apply_batch(batch):
+	# apply and empty the queued edits of a batch, inside the undo transaction of the outermost block
+	if not len(batch):
+		return
+	batched = _batch_local.batched
+	batch.applied += len(batch)
+	start = _clock()
+	if batched:
+		if not _batch_local.transaction:
+			FBUndoManager().TransactionBegin(_batch_local.name)
+			_batch_local.transaction = True
+		FBBeginChangeAllModels()
+	try:
+		batch._apply()
+	finally:
+		if batched:
+			FBEndChangeAllModels()
+		del batch._edits[:]
+		del batch._deletions[:]
+		batch._deleted_ids.clear()
+		batch.elapsed += _clock() - start
+
+@contextlib.contextmanager
+def scene_batch(name = "scene_batch", batched = None, log = False):
+	''' Collect scene edits and apply them with evaluation suspended, in a single undo transaction '''
+
+	# a block opened inside another one first applies the edits queued so far by the outer block, then applies
+	# its own edits when it exits: library functions called inside a user block read back the scene they edited.
+	# All the blocks share the undo transaction of the outermost one, evaluation is suspended for each apply only
+	outer = getattr(_batch_local, 'batch', None)
+	batch = SceneBatch(name)
+	if outer is None:
+		_batch_local.batched = _batch_enabled[0] if batched is None else batched
+		_batch_local.name = name
+		_batch_local.transaction = False
+	else:
+		_apply_batch(outer)
+	_batch_local.batch = batch
+
+	# nothing is applied if the block fails, the edits of the inner blocks that exited are kept
+	try:
+		try:
+			yield batch
+		finally:
+			_batch_local.batch = outer
+		_apply_batch(batch)
+	finally:
+		if outer is None and _batch_local.transaction:
+			FBUndoManager().TransactionEnd()
+			_batch_local.transaction = False
+
+	if log:
+		print("{}: {} edits applied in {:.3f} ms ({})".format(name, batch.applied, batch.elapsed * 1000, "batched" if _batch_local.batched else "not batched"))
 
 ########## COMPONENTS ##########
 
+@traced
 def unselect_all_comp(log = False):
 	''' Unselect all components '''
 	
-	for comp in lSys.Scene.Components:
-		comp.Selected = False
+	with scene_batch("unselect_all_comp") as batch:
+		for comp in _trace_iter(lSys.Scene.Components):
+			if comp.Selected:
+				batch.set(comp, 'Selected', False)
 	
 	if log:
 		print ("All components unselected")
 
+@traced
 def get_comp_by_name(name, namespace = None, log = False):
 	''' Get component by name '''
 
@@ -38,19 +346,21 @@ def get_comp_by_name(name, namespace = None, log = False):
 		name = "{}:{}".format(namespace, name)
 		
 	comp = FBFindModelByLabelName(name)
+	_trace_count()
 	
 	if log:
 		print("Returning " + name)
 
 	return comp
 	
+@traced
 def select_comp_by_name(name, append = False, log = False):
 	''' Selects model by a given name, appends it or not to the selection and returns it '''
 	
 	if not append:
 		unselect_all_comp(log)
 	
-	model = get_comp_by_name(name, log) 
+	model = get_comp_by_name(name, log = log)
 	model.Selected = True
 	
 	if log:
@@ -61,12 +371,14 @@ def select_comp_by_name(name, append = False, log = False):
 
 	return model
 	
+@traced
 def get_selected_components(log = False):
 	''' Returns a list of all selected components from the scene '''
 	
 	# get the list of selected models
 	lModelList = FBModelList()
 	FBGetSelectedModels(lModelList)
+	_trace_count(1, len(lModelList))
 
 	if log:
 		print ("{} components selected:".format (len (lModelList) ) )
@@ -76,6 +388,7 @@ def get_selected_components(log = False):
 	return lModelList
 
 
+@traced
 def get_selected_components_name(log = False):
 	''' Returns name of selected components '''
 
@@ -89,6 +402,7 @@ def get_selected_components_name(log = False):
 
 	return comp_names
 
+@traced
 def get_children(parentModel, _childLst = None, includeParent = False, selected = False, log = False):
 	''' return the list of all children '''
 	
@@ -101,7 +415,7 @@ def get_children(parentModel, _childLst = None, includeParent = False, selected
 	# Check if any children exist
 	if (len (children) > 0):
 		# Loop through the children
-		for child in children:
+		for child in _trace_iter(children):
 			# Get any children
 			_childLst.append(child)
 			get_children(child, _childLst)
@@ -112,10 +426,11 @@ def get_children(parentModel, _childLst = None, includeParent = False, selected
 	
 	if log:
 		for child in _childLst:
-			print child.Namne
+			print(child.Name)
 
 	return(_childLst)    
 
+@traced
 def group_selected_components(log = False):
 	''' parent selected components under a new group, name from pop-up'''
 	
@@ -144,34 +459,44 @@ def group_selected_components(log = False):
 	group.Size = 0.0
 	group.Parent = group_parent
 
-	for comp in comp_list:
-		comp.Parent = group
+	with scene_batch("group_selected_components", log = log) as batch:
+		for comp in comp_list:
+			batch.set(comp, 'Parent', group)
 	
 	if log:
 		print("[{}] parented under {}".format(', '.join(get_selected_components_name()), group.Name))
 
+@traced
 def delete_selected_components(log = False):
 	""" delete all selected components """
 	
 	lModelList = get_selected_components()
-	for model in lModelList:
-		print type(model)
-		model.FBDelete()
-
-	if log:
-		print("Deleting model: {}".format(model.Name))
+	with scene_batch("delete_selected_components") as batch:
+		for model in lModelList:
+			if log:
+				print("Deleting model: {}".format(model.Name))
+			batch.delete(model)
 
 
+@traced
 def delete_model_and_children(pModel, log = False):
 	""" delete selected model """
 
-	while len(pModel.Children) > 0:
-		delete_model_and_children(pModel.Children[-1])
-	pModel.FBDelete()
-	if log:
-		print("Deleting model: {}".format(pModel.Name))
+	# children are deleted before their parent, last child first
+	with scene_batch("delete_model_and_children") as batch:
+		stack = [pModel]
+		ordered = []
+		while stack:
+			model = stack.pop()
+			ordered.append(model)
+			stack.extend(_trace_iter(model.Children))
+		for model in reversed(ordered):
+			if log:
+				print("Deleting model: {}".format(model.Name))
+			batch.delete(model)
 
 
+@traced
 def get_component_by_namespace(namespace, log = False):
 	''' Returns all components sharing a given namespace '''
 
@@ -185,6 +510,7 @@ def get_component_by_namespace(namespace, log = False):
 	return lReturnList
 
 
+@traced
 def delete_components_from_namespace(namespace, log = False):
 	"""" delete all scene components from given namespace """
 	""" source: http://www.vicdebaie.com/blog/motionbuilder-python-clean-character-from-scene-with-fbdelete/ """
@@ -205,21 +531,29 @@ def delete_components_from_namespace(namespace, log = False):
 		else: 
 			pass
 	##Take Every Item We Stored In Our List lRemovelist
-	for item in lRemovelist:
-		##Delete It
-		if log:
-			print("Deleting " + item.LongName)
-		item.FBDelete()
+	with scene_batch("delete_components_from_namespace") as batch:
+		for item in lRemovelist:
+			##Delete It
+			if log:
+				print("Deleting " + item.LongName)
+			batch.delete(item)
 
 
+# scene collections walked by get_all_scene_components, Components last
+_SCENE_COLLECTIONS = ["Constraints", "Handles", "UserObjects", "ControlSets", "CharacterExtensions", "Characters", "Materials", "Shaders", "Textures", "Folders", "ObjectPoses", "CharacterPoses", "KeyingGroups", "Notes", "VideoClips", "Components"]
+
+def _scene_collections():
+	# (name, collection) of each scene collection
+	return [(name, getattr(lScene, name)) for name in _SCENE_COLLECTIONS]
+
+@traced
 def get_all_scene_components(log = False):
 	""" returns a list of all components in the scene (all types) """
 	
 	compList = []
-	lFBList = [lScene.Constraints, lScene.Handles, lScene.UserObjects, lScene.ControlSets, lScene.CharacterExtensions,lScene.Characters, lScene.Materials, lScene.Shaders, lScene.Textures, lScene.Folders, lScene.ObjectPoses, lScene.CharacterPoses, lScene.KeyingGroups, lScene.Notes, lScene.VideoClips, lScene.Components]##With Each Item In Our List lFBList
 	
-	for item in lFBList:
-		for comp in item:
+	for name, item in _scene_collections():
+		for comp in _trace_iter(item):
 			compList.append(comp)
 			if log:
 				print (comp.Name)
@@ -227,57 +561,212 @@ def get_all_scene_components(log = False):
 	return compList
 	
 	
+@traced
 def unselect_all_components(log = False):
 	""" unselect all scene components """
 	
 	compList = get_all_scene_components()
 
-	for comp in compList:
-		if comp.Selected:
-			comp.Selected = False
-			if log:
-				print("{} unselected".format(comp.Name))
+	with scene_batch("unselect_all_components") as batch:
+		for comp in compList:
+			_trace_count(1, 0)
+			if comp.Selected:
+				batch.set(comp, 'Selected', False)
+				if log:
+					print("{} unselected".format(comp.Name))
 
 	
+########## SEARCH ##########
+
+# [components, names, long names, lower case names, lower case long names], built on first search
+_name_table = [None]
+_name_table_hooked = [False]
+
+# (query, mode, case_sensitive, long_name) -> indices in the name table, cleared with the table
+_search_cache = {}
+_SEARCH_CACHE_SIZE = 256
+
+_SEARCH_MODES = ("auto", "substring", "glob", "regex")
+_GLOB_CHARS = re.compile(r"[*?\[]")
+
+# scene changes that leave names untouched
+_NAME_TABLE_KEEP = (FBSceneChangeType.kFBSceneChangeSelect, FBSceneChangeType.kFBSceneChangeUnselect)
+
+def _on_scene_change(control, event):
+	if event.Type not in _NAME_TABLE_KEEP:
+		invalidate_name_table()
+
+def invalidate_name_table(log = False):
+	''' Drop the cached name table and search results, rebuilt on the next search '''
+
+	# called automatically from the scene OnChange event (objects added, removed or renamed)
+	_name_table[0] = None
+	_search_cache.clear()
+
+	if log:
+		print("Name table cleared")
+
+def _get_name_table():
+	if _name_table[0] is None:
+		if not _name_table_hooked[0]:
+			lScene.OnChange.Add(_on_scene_change)
+			_name_table_hooked[0] = True
+		# every component is in Components, the typed collections would only repeat them
+		comps = list(_trace_iter(lScene.Components))
+		names = [comp.Name for comp in comps]
+		long_names = [comp.LongName for comp in comps]
+		_trace_count(2 * len(comps), 0)
+		_name_table[0] = [comps, names, long_names, [name.lower() for name in names], [name.lower() for name in long_names]]
+	return _name_table[0]
+
+# (query, mode, case_sensitive) -> compiled query
+_query_cache = {}
+
+def compile_search_query(query, mode = "auto", case_sensitive = False):
+	''' Compile a query into (include, exclude) matchers, terms are separated by spaces, all must match, "-term" excludes '''
+
+	# auto: glob for terms with * ? [, substring otherwise
+	# substring / glob / regex: every term is read in the given mode, globs match the whole name
+	key = (query, mode, case_sensitive)
+	if key in _query_cache:
+		return _query_cache[key]
+	if mode not in _SEARCH_MODES:
+		raise ValueError("mode must be one of {}".format(", ".join(_SEARCH_MODES)))
+
+	flags = 0 if case_sensitive else re.IGNORECASE
+	include, exclude = [], []
+	for term in query.split():
+		target = include
+		if term.startswith("-") and len(term) > 1:
+			term, target = term[1:], exclude
+		if mode == "regex":
+			target.append(re.compile(term, flags).search)
+		elif mode == "glob" or (mode == "auto" and _GLOB_CHARS.search(term)):
+			target.append(re.compile(fnmatch.translate(term), flags).match)
+		else:
+			target.append(re.compile(re.escape(term), flags).search)
+	if len(_query_cache) >= _SEARCH_CACHE_SIZE:
+		_query_cache.clear()
+	compiled = _query_cache[key] = (tuple(include), tuple(exclude))
+	return compiled
+
+def _is_narrowing(previous, query, mode):
+	# substring results of "previous" contain the ones of a query typed on top of it
+	if mode not in ("auto", "substring") or not query.startswith(previous):
+		return False
+	if mode == "auto" and _GLOB_CHARS.search(query):
+		return False
+	return not any(term.startswith("-") for term in previous.split())
+
+def _search_indices(query, mode, case_sensitive, long_name):
+	# indices of the matching components in the name table, reusing the results of a shorter query
+	table = _get_name_table()
+	key = (query, mode, case_sensitive, long_name)
+	indices = _search_cache.get(key)
+	if indices is not None:
+		return table, indices
+
+	candidates = None
+	for (previous, prev_mode, prev_case, prev_long), prev_indices in _search_cache.items():
+		if (prev_mode, prev_case, prev_long) == key[1:] and previous.strip() and _is_narrowing(previous, query, mode):
+			if candidates is None or len(prev_indices) < len(candidates):
+				candidates = prev_indices
+
+	include, exclude = compile_search_query(query, mode, case_sensitive)
+	if case_sensitive:
+		names = table[2] if long_name else table[1]
+	else:
+		# lower case table, patterns are compiled case insensitive
+		names = table[4] if long_name else table[3]
+	if candidates is None:
+		candidates = range(len(names))
+	if mode == "substring" or (mode == "auto" and not _GLOB_CHARS.search(query)):
+		# plain substrings, skip the regex engine
+		terms = [term for term in query.split() if not (term.startswith("-") and len(term) > 1)]
+		excluded = [term[1:] for term in query.split() if term.startswith("-") and len(term) > 1]
+		if not case_sensitive:
+			terms = [term.lower() for term in terms]
+			excluded = [term.lower() for term in excluded]
+		indices = [idx for idx in candidates if all(term in names[idx] for term in terms) and not any(term in names[idx] for term in excluded)]
+	else:
+		indices = [idx for idx in candidates if all(match(names[idx]) for match in include) and not any(match(names[idx]) for match in exclude)]
+
+	if len(_search_cache) >= _SEARCH_CACHE_SIZE:
+		_search_cache.clear()
+	_search_cache[key] = indices
+	return table, indices
+
+def iter_search_components(query, mode = "auto", case_sensitive = False, long_name = False):
+	''' Yield the components matching a query lazily, see compile_search_query '''
+
+	table, indices = _search_indices(query, mode, case_sensitive, long_name)
+	comps = table[0]
+	for idx in indices:
+		yield comps[idx]
+
+@traced
+def search_components(query, mode = "auto", case_sensitive = False, long_name = False, select = False, append = False, log = False):
+	''' Returns the components matching a query (glob, regex or substring terms), selected in one batch if select '''
+
+	# names are read from a cached table (see invalidate_name_table), repeated queries and queries typed
+	# on top of a previous one only scan the previous results
+	result = list(iter_search_components(query, mode, case_sensitive, long_name))
+
+	if select:
+		matched = set(id(comp) for comp in result)
+		with scene_batch("search_components") as batch:
+			for comp in _get_name_table()[0]:
+				_trace_count(1, 0)
+				if id(comp) in matched:
+					if not comp.Selected:
+						batch.set(comp, 'Selected', True)
+				elif not append and comp.Selected:
+					batch.set(comp, 'Selected', False)
+
+	if log:
+		for comp in result:
+			print(comp.LongName)
+		print("{} components matching {}".format(len(result), query))
+
+	return result
+
+@traced
 def search_components_from_string(string, select = False, log = False):
 	""" return a list of all components containing a given string in their name, select them if True """
 	
-	resultList = []
-	unselect_all_components()
-	
-	for comp in get_all_scene_components():
-		if string in comp.Name:
-			resultList.append(comp)
-			if select and not comp.Selected:
-				comp.Selected = True
-			if log:
-				print comp.Name
+	resultList = search_components(string, "substring", True, select = select, log = log)
 	if not resultList:    
 		print ("String {} not found in current Scene".format(string))
-	   
+
+	return resultList
+	
 				
 ########## JOINTS ##########    
 
+@traced
 def get_joint_list(log = False):
 	""" Get all the children joints from the selected root """
 
 	# Get selected models
 	selected_models = FBModelList()
 	FBGetSelectedModels(selected_models)
+	_trace_count()
 
 	if len(selected_models) == 0:
 		raise ValueError("No joint selected. Please select root joint.")
 	elif len(selected_models) > 1:
 		raise ValueError("More than one joint selected. Please select root joint only.")
 	else:
-		joint_list = [joint for joint in get_children(selected_models[0], includeParent = True, log = log) if type(joint) == FBModelSkeleton]
+		joint_list = [joint for joint in get_children(selected_models[0], includeParent = True) if type(joint) == FBModelSkeleton]
 		if log:
-			print(joint.Name)
+			for joint in joint_list:
+				print(joint.Name)
 
 	return joint_list
 
 ########## TRANSFORMATIONS ##########
 
+@traced
 def align_objects(obj, source, log = False):
 	
 	# Get Our Source's Translation And Rotation
@@ -291,26 +780,90 @@ def align_objects(obj, source, log = False):
 	obj.Rotation = sourceRot
 	
 	if log:
-		print "ALIGNING %s to %s" % (obj.Name, source.Name)
+		print("ALIGNING %s to %s" % (obj.Name, source.Name))
+
+def iter_global_matrices(models, start, end, stride = 1, chunk = 256):
+	''' Yield (frames, matrices (frames, models, 4, 4)) chunks of global matrices over a frame range of the current take '''
+
+	# time is moved once per frame and every model is read in that evaluation, the time is restored at the end
+	# Goto does not evaluate the scene, it is evaluated right after so the matrices are those of the frame
+	_require_numpy()
+	frames = np.arange(start, end + 1, stride)
+	current_time = FBTime(lSys.LocalTime.Get())
+	player = FBPlayerControl()
+	matrix = FBMatrix()
+	try:
+		for first in range(0, len(frames), chunk):
+			chunk_frames = frames[first:first + chunk]
+			values = np.empty((len(chunk_frames), len(models), 16))
+			for idx, frame in enumerate(chunk_frames.tolist()):
+				player.Goto(frame_to_time(frame))
+				lScene.Evaluate()
+				row = values[idx]
+				for jdx, model in enumerate(models):
+					model.GetMatrix(matrix)
+					row[jdx] = matrix
+				_trace_count(len(models) + 2, len(models))
+			# FBMatrix is column major
+			yield chunk_frames, values.reshape(len(chunk_frames), len(models), 4, 4).transpose(0, 1, 3, 2)
+	finally:
+		player.Goto(current_time)
+		lScene.Evaluate()
+
+@traced
+def sample_global_matrices(models = None, start = None, end = None, stride = 1, chunk = 256, out_path = None, log = False):
+	''' Returns frames and global matrices (frames, models, 4, 4) of models (get_joint_list by default) on the current take '''
+
+	# start and end default to the current take span, every stride frames is sampled, chunk frames at a time
+	# with out_path the chunks are streamed to a .npy file as they are sampled and a read-only memmap is returned
+	_require_numpy()
+	models = get_joint_list() if models is None else list(models)
+	span = lSys.CurrentTake.LocalTimeSpan
+	start = span.GetStart().GetFrame() if start is None else start
+	end = span.GetStop().GetFrame() if end is None else end
+	frames = np.arange(start, end + 1, stride)
+	shape = (len(frames), len(models), 4, 4)
+
+	if out_path:
+		matrices = np.lib.format.open_memmap(out_path, mode = 'w+', dtype = np.float64, shape = shape)
+	else:
+		matrices = np.empty(shape)
+	first = 0
+	for chunk_frames, values in iter_global_matrices(models, start, end, stride, chunk):
+		matrices[first:first + len(chunk_frames)] = values
+		first += len(chunk_frames)
+	if out_path:
+		matrices.flush()
+		del matrices
+		matrices = np.load(out_path, mmap_mode = 'r')
+
+	if log:
+		print("{} models sampled on {} frames{}".format(len(models), len(frames), " to {}".format(out_path) if out_path else ""))
+
+	return frames, matrices
 
 ########## CONSTRAINTS ##########
 
+@traced
 def get_constraints():
 	# return list of constraints in the scene
 	return [const for const in lScene.Constraints]
 
 
+@traced
 def get_constraints_name():
 	# return list of scene constraints name
 	return [const.Name for const in get_constraints()]
 
+@traced
 def get_constraint_by_name(const_name):
 	# return constraint based on its name
 
-	for const in lScene.Constraints:
+	for const in _trace_iter(lScene.Constraints):
 		if const.Name == "const_name":
 			return const
 
+@traced
 def parentConstraint(parent, child, snap = True, weight = 100, active = True, name = "_parentConst"):
 	''' Creates a parent constraint'''
 	 
@@ -338,6 +891,7 @@ def parentConstraint(parent, child, snap = True, weight = 100, active = True, na
 
 	return lMyConstraint
 
+@traced
 def rotationConstraint(parent, child, snap = True, weight = 100, active = True, name = "_rotationConst"):
 	''' Creates a rotation constraint'''
 	 
@@ -367,11 +921,12 @@ def rotationConstraint(parent, child, snap = True, weight = 100, active = True,
 
 ########## TAKES ##########
 
+@traced
 def set_current_take(takeName, log = False):
 	''' Set the current take to a given or current one '''
 	log_str = None
 	
-	for take in lSys.Scene.Takes:
+	for take in _trace_iter(lSys.Scene.Takes):
 		if take.Name == takeName:
 			lSys.CurrentTake = take
 			log_str = "Current take is {}".format(take.Name)
@@ -382,6 +937,7 @@ def set_current_take(takeName, log = False):
 	if log:
 		print (log_str)
 
+@traced
 def get_take_list(clipboard = None, log = False):
 	'''Return the take list from the current scene, copied to clipboard if specified'''
 
@@ -390,7 +946,7 @@ def get_take_list(clipboard = None, log = False):
 	if clipboard:
 		pyperclip.copy(None)
 
-	for take in lSys.Scene.Takes:
+	for take in _trace_iter(lSys.Scene.Takes):
 		take_list.append(take.Name)
 		if log:
 			print (take.Name)
@@ -405,6 +961,7 @@ def get_take_list(clipboard = None, log = False):
 		
 	return take_list
 	
+@traced
 def get_take_by_name(takeName = None, log = False):
 	'''Return a take by name, current one if not given'''
 	
@@ -415,7 +972,7 @@ def get_take_by_name(takeName = None, log = False):
 			print("Take name not specified.")
 	
 	# browsing through takes
-	for take in lSys.Scene.Takes:
+	for take in _trace_iter(lSys.Scene.Takes):
 		if take.Name == takeName:
 			if log:
 				print ("Returning {}".format(takeName))
@@ -427,11 +984,13 @@ def get_take_by_name(takeName = None, log = False):
 		
 	return lSys.CurrentTake
 
+@traced
 def get_current_take(log = False):
 	'''Return current take'''
 
 	get_take_by_name(None, log)
 	
+@traced
 def get_current_take_name(clipboard = False, log = False):
 	'''Return current take name, copied to clipboard if specified'''
 		
@@ -447,24 +1006,29 @@ def get_current_take_name(clipboard = False, log = False):
 	
 	return takeName
 	
+@traced
 def rename_current_take(newTakeName = str(datetime.datetime.now()), log = False):
 	'''Rename the current take to a given name, datetime if not specified'''
 
+	invalidate_take_cache(lSys.CurrentTake.Name)
 	lSys.CurrentTake.Name = newTakeName
 	
 	if log:
 		print("Take renamed {}".format(newTakeName))
 	 
+@traced
 def create_new_take(takeName = str(datetime.datetime.now()), current = True, log = False):
 	''' Create new take with specified name (datetime if not) and set it as current '''
 
 	lSys.Scene.Takes.append(FBTake(takeName))   
+	invalidate_take_cache(takeName)
 	if current:
 		set_current_take(takeName, log)
 	
 	if log:
 		print ("New take created: {}".format( takeName))
 		
+@traced
 def duplicate_take(takeName = None, newTakeName = str(datetime.datetime.now()), log = False):
 	'''Duplicate a take (current if none) with a given name (datetime if none)''' 
 	
@@ -472,18 +1036,22 @@ def duplicate_take(takeName = None, newTakeName = str(datetime.datetime.now()),
 		set_current_take(takeName, log)
 	
 	lSys.CurrentTake.CopyTake(newTakeName)
+	invalidate_take_cache(newTakeName)
+	_trace_count()
 	
 	if log:
 		print ("Take {} duplicated and renamed".format(get_current_take_name(log)))
 		
 	return lSys.CurrentTake.Name
 
+@traced
 def delete_take_by_name(takeName = lSys.CurrentTake, log = False):
 	'''Delete a take by name, current one if not given'''
    
-	for take in lSys.Scene.Takes:
+	for take in _trace_iter(lSys.Scene.Takes):
 		if take.Name == takeName:
 			take.FBDelete()
+			invalidate_take_cache(takeName)
 			if log:
 				print("Take {} deleted".format(takeName))
 			return
@@ -492,17 +1060,21 @@ def delete_take_by_name(takeName = lSys.CurrentTake, log = False):
 	if log:
 		print("Take not found, specify a valid take name or none to delete the current one")
 
+@traced
 def delete_all_takes_but_current(log = False):
 	''' Delete all takes but current one '''
 
 	current_take = get_current_take_name()
-	for take in get_take_list():
-		if take != current_take:
-			delete_take_by_name(take)
+	with scene_batch("delete_all_takes_but_current") as batch:
+		for take in _trace_iter(lSys.Scene.Takes):
+			if take.Name != current_take:
+				batch.delete(take)
+	invalidate_take_cache()
 
 	if log:
 		print("All takes deleted, except {}".format(current_take))
 
+@traced
 def get_selected_components_name(log = False):
 	''' Returns the name of all selected components '''
 
@@ -516,6 +1088,7 @@ def get_selected_components_name(log = False):
 	
 	return compName
 	
+@traced
 def plot_to_current_take(log = False):
 	''' Plot selected Story clip to the current take '''
 	
@@ -537,9 +1110,15 @@ def plot_to_current_take(log = False):
 	if log:
 		print ("Story clip plotted to new take {}".format(lSys.CurrentTake.Name))
 
+@traced
 def plot_to_take(newTake = False, takeName = None, log = False):
 	''' Plot selected Story clip to a new take of the name '''
 	
+	_run_steps(iter_plot_to_take(newTake, takeName, log))
+
+def iter_plot_to_take(newTake = False, takeName = None, log = False):
+	''' Steps of plot_to_take, yields the progress after each stage (the plots themselves are atomic) '''
+	
 	selected = 0
 	startFrame = None
 	endFrame = None
@@ -549,8 +1128,8 @@ def plot_to_take(newTake = False, takeName = None, log = False):
 		toogle_story_mode(log)
 	
 	# Get start, end frames and name of selected clips
-	for track in Story.RootFolder.Tracks:
-		for clip in track.Clips:
+	for track in _trace_iter(Story.RootFolder.Tracks):
+		for clip in _trace_iter(track.Clips):
 			if clip.Selected:
 				startFrame = clip.Start.GetFrame()
 				endFrame = clip.Stop.GetFrame()
@@ -565,7 +1144,7 @@ def plot_to_take(newTake = False, takeName = None, log = False):
 		return
 	
 	# Get clip name if not given (without extension)
-	if not takeName:
+	if takeName:
 		extensions = {".fbx", ".Fbx", ".FBX"}
 		for ext in extensions:
 			takeName = takeName.replace(ext,"")
@@ -576,13 +1155,47 @@ def plot_to_take(newTake = False, takeName = None, log = False):
 	# Frame selected clip
 	set_timespan(startFrame, endFrame, log)
 	
+	# the take and character are found again after each yield, the artist may have switched them in between
+	take_name = lSys.CurrentTake.Name
+	char_name = lApp.CurrentCharacter.LongName
+	yield 0.1
+	
 	# Plot clip to take
-	plot_to_skeleton_and_rig(log)
+	char = _restore_plot_context(take_name, char_name)
+	plot_to_skeleton(char, log)
+	yield 0.6
+	char = _restore_plot_context(take_name, char_name)
+	plot_to_rig(char, log)
+	yield 1.0
 	
 	# Log
 	if log:
 		print ("Story clip plotted to new take {}".format(lSys.CurrentTake.Name))
 
+def _restore_plot_context(take_name, char_name):
+	# make the take and character of a running plot current again, returns the character
+	take = None
+	for item in lScene.Takes:
+		if item.Name == take_name:
+			take = item
+			break
+	char = None
+	for item in lScene.Characters:
+		if item.LongName == char_name:
+			char = item
+			break
+	_trace_count(2)
+	if take is None:
+		raise RuntimeError("take {} was deleted before the plot".format(take_name))
+	if char is None:
+		raise RuntimeError("character {} was deleted before the plot".format(char_name))
+	if lSys.CurrentTake.Name != take_name:
+		lSys.CurrentTake = take
+	if lApp.CurrentCharacter is None or lApp.CurrentCharacter.LongName != char_name:
+		lApp.CurrentCharacter = char
+	return char
+
+@traced
 def go_to_previous_take(loop = True, log = False):
 	''' go to previous take, last if reaching the beginning and loop True'''
 
@@ -605,6 +1218,7 @@ def go_to_previous_take(loop = True, log = False):
 	if log:
 		print ("Moving to previous take [{}]".format(lSys.CurrentTake.Name))
 
+@traced
 def go_to_next_take(loop = True, log = False):
 	''' go to next take, first if reaching the end and loop True '''
 
@@ -627,11 +1241,12 @@ def go_to_next_take(loop = True, log = False):
 	if log:
 		print ("Moving to next take [{}]".format(lSys.CurrentTake.Name))
 
+@traced
 def add_take_separator(log = False):
 	''' Adds separator after the current take '''
 	
 	# create a unique name
-	sep_name = "_" * length(get_current_take_name())
+	sep_name = "_" * len(get_current_take_name())
 	
 	takelist = get_take_list()
 	
@@ -646,13 +1261,16 @@ def add_take_separator(log = False):
 				
 ########## TIMELINE ##########
 
+@traced
 def set_timespan(start, end, log = False):
 	''' Set current timespan to start/end frame '''
 	
-	lSys.CurrentTake.LocalTimeSpan = FBTimeSpan(FBTime(0, 0, 0, start, 0), FBTime(0, 0, 0, end, 0))
+	lSys.CurrentTake.LocalTimeSpan = FBTimeSpan(frame_to_time(start), frame_to_time(end))
+	invalidate_take_cache(lSys.CurrentTake.Name)
 	if log:
 		print ("TimeSpan set to [{}-{}]".format(start, end))
 
+@traced
 def get_current_frame(log = False):
 	''' get current frane number '''
 	
@@ -663,76 +1281,376 @@ def get_current_frame(log = False):
 
 	return current
 	
+@traced
 def go_to_frame(frame = 0, log = False):
 	''' jump to a given frame, 0 as default '''
 
-	t = FBTime(0, 0, 0, frame, 0)
+	t = frame_to_time(frame)
 	FBPlayerControl().Goto(t)
+	_trace_count()
 	
 	if log:
 		print ("Go to frame {}".format(t))
 
 	return 0
 	
-def get_timeline_start_end_frame(log = False):
-	''' Returns the start and end frames of the timeline as a tuple '''
+@traced
+def get_timeline_start_end_frame(log = False, takeName = None):
+	''' Returns the start and end frames of the timeline as a tuple (current take or given one) '''
 	
-	lStartFrame = lSys.CurrentTake.LocalTimeSpan.GetStart().GetFrame()
-	lEndFrame = lSys.CurrentTake.LocalTimeSpan.GetStop().GetFrame()
+	if takeName:
+		span = get_take_spans()[takeName]
+		lStartFrame, lEndFrame = span["start"], span["stop"]
+	else:
+		lStartFrame = lSys.CurrentTake.LocalTimeSpan.GetStart().GetFrame()
+		lEndFrame = lSys.CurrentTake.LocalTimeSpan.GetStop().GetFrame()
 	
 	if log:
 		print ("Timeline frames: [{}-{}]".format(lStartFrame, lEndFrame))
 		
 	return lStartFrame, lEndFrame
 
-def get_take_length(log = False):
-	''' Returns the length in frames of the current take '''
+@traced
+def get_take_length(log = False, takeName = None):
+	''' Returns the length in frames of the current take (or given one) '''
 	
-	start, end = get_timeline_start_end_frame(log)
+	start, end = get_timeline_start_end_frame(log, takeName)
 	length = end - start
 
 	if log:
-		print ("Current take length: {} frames".format(length))
+		print ("Take length: {} frames".format(length))
 
 	return length
 
+# take name -> (stamp, (key_start, key_stop)), see get_take_spans
+_take_extent_cache = {}
+
+@traced
+def invalidate_take_cache(takeName = None, log = False):
+	''' Forget the cached data of a take (all takes if not given), called by the library functions editing takes '''
+
+	# the take stamps see edits changing a key count or the first or last key of a curve, not a middle key value:
+	# the fingerprints (get_take_fingerprints) of a take edited by the library are only rehashed through this call
+	if takeName is None:
+		_take_extent_cache.clear()
+		_take_hash_cache.clear()
+	else:
+		_take_extent_cache.pop(takeName, None)
+		_take_hash_cache.pop(takeName, None)
+
+	if log:
+		print("Take cache cleared for {}".format(takeName or "all takes"))
+
+_TRANSFORM_PROPERTIES = ("Translation", "Rotation", "Scaling")
+
+def _take_leaves(model, take, leaves = None, animate = False):
+	# leaf animation nodes of the model transform curves in a take, read through GetAnimationNode(take)
+	# so the current take is left alone; with animate the properties are animated first
+	if leaves is None:
+		leaves = []
+	for name in _TRANSFORM_PROPERTIES:
+		prop = getattr(model, name)
+		if animate:
+			prop.SetAnimated(True)
+		node = prop.GetAnimationNode(take)
+		_trace_count()
+		if node is not None:
+			_census_leaves(node, leaves)
+	return leaves
+
+def _animated_models():
+	# models with animated properties, the animation nodes are shared by all the takes
+	return [comp for comp in _trace_iter(lScene.Components) if isinstance(comp, FBModel) and comp.AnimationNode.Nodes]
+
+def _take_curves(take, models):
+	# (id, leaf animation node) of every transform FCurve of the models in a take, in a stable order
+	curves = []
+	for model in models:
+		for leaf in _take_leaves(model, take):
+			curves.append(("{}/{}/{}".format(model.LongName, leaf.Parent.Name, leaf.Name), leaf))
+	curves.sort(key = lambda item: item[0])
+	return curves
+
+def _take_stamp(curves):
+	# cheap change stamp of a take: key count, first and last key time and value of each curve
+	stamp = []
+	for curve_id, leaf in curves:
+		keys = leaf.FCurve.Keys
+		count = len(keys)
+		_trace_count(3 if count else 1, 1)
+		if count:
+			stamp.append((curve_id, count, keys[0].Time.Get(), keys[-1].Time.Get(), keys[0].Value, keys[-1].Value))
+	return hash(tuple(stamp))
+
+def _take_key_extent(curves):
+	# first and last key frames of the curves of a take
+	key_start = None
+	key_stop = None
+	for curve_id, leaf in curves:
+		keys = leaf.FCurve.Keys
+		_trace_count()
+		if len(keys):
+			first = keys[0].Time.GetFrame()
+			last = keys[-1].Time.GetFrame()
+			key_start = first if key_start is None else min(key_start, first)
+			key_stop = last if key_stop is None else max(key_stop, last)
+	return key_start, key_stop
+
+@traced
+def get_take_spans(key_extent = False, log = False):
+	''' Returns {take name: {"start", "stop", "length"}} frames of all takes, without changing the current take '''
+
+	# LocalTimeSpan is read directly on each take, spans set by hand are always seen. The real key extent
+	# ("key_start", "key_stop", only with key_extent) is cached per take and reused while the take stamp
+	# (key count, first and last key of each curve) is unchanged, an edit moving the extent changes the stamp
+
+	models = _animated_models() if key_extent else None
+	spans = {}
+	for take in _trace_iter(lScene.Takes):
+		start = take.LocalTimeSpan.GetStart().GetFrame()
+		stop = take.LocalTimeSpan.GetStop().GetFrame()
+		span = spans[take.Name] = {"start": start, "stop": stop, "length": stop - start}
+		if key_extent:
+			curves = _take_curves(take, models)
+			stamp = _take_stamp(curves)
+			cached = _take_extent_cache.get(take.Name)
+			if cached is None or cached[0] != stamp:
+				cached = _take_extent_cache[take.Name] = (stamp, _take_key_extent(curves))
+			span["key_start"], span["key_stop"] = cached[1]
+
+	# forget the takes deleted or renamed outside the library
+	if len(_take_extent_cache) > len(spans):
+		for name in list(_take_extent_cache):
+			if name not in spans:
+				del _take_extent_cache[name]
+
+	if log:
+		for name, span in spans.items():
+			print("{:<32}[{}-{}] {} frames".format(name, span["start"], span["stop"], span["length"]))
+
+	return spans
+
+# transport modes by fps (as string) or name
+_FPS_MODES = {
+	'1000': FBTimeMode.kFBTimeMode1000Frames,
+	'120': FBTimeMode.kFBTimeMode120Frames,
+	'100': FBTimeMode.kFBTimeMode100Frames,
+	'96': FBTimeMode.kFBTimeMode96Frames,
+	'72': FBTimeMode.kFBTimeMode72Frames,
+	'60': FBTimeMode.kFBTimeMode60Frames,
+	'59.94': FBTimeMode.kFBTimeMode5994Frames,
+	'50': FBTimeMode.kFBTimeMode50Frames,
+	'48': FBTimeMode.kFBTimeMode48Frames,
+	'30': FBTimeMode.kFBTimeMode30Frames,
+	'NTSC_FULL': FBTimeMode.kFBTimeMode30Frames,
+	'29.97': FBTimeMode.kFBTimeMode2997Frames,
+	'NTSC_DROP': FBTimeMode.kFBTimeMode2997Frames_Drop,
+	'25': FBTimeMode.kFBTimeMode25Frames,
+	'PAL': FBTimeMode.kFBTimeMode25Frames,
+	'24': FBTimeMode.kFBTimeMode24Frames,
+	'23.976': FBTimeMode.kFBTimeMode23976Frames,
+}
+
+@traced
 def set_framerate(fps, log = False):
+	''' Set the transport fps from a number (30, 29.97, 23.976...) or a mode name (PAL, NTSC_DROP...) '''
 
-	modes_dic = {
-		'1000': FBTimeMode.kFBTimeMode1000Frames,
-		'120': FBTimeMode.kFBTimeMode120Frames,
-		'100': FBTimeMode.kFBTimeMode100Frames,
-		'96': FBTimeMode.kFBTimeMode96Frames,
-		'72': FBTimeMode.kFBTimeMode72Frames,
-		'60': FBTimeMode.kFBTimeMode60Frames,
-		'59.94': FBTimeMode.kFBTimeMode5994Frames,
-		'50': FBTimeMode.kFBTimeMode50Frames,
-		'48': FBTimeMode.kFBTimeMode48Frames,
-		'30': FBTimeMode.kFBTimeMode30Frames,
-		'NTSC_FULL': FBTimeMode.kFBTimeMode30Frames,
-		'29.97': FBTimeMode.kFBTimeMode2997Frames,
-		'NTSC_DROP': FBTimeMode.kFBTimeMode2997Frames_Drop,
-		'25': FBTimeMode.kFBTimeMode25Frames,
-		'PAL': FBTimeMode.kFBTimeMode25Frames,
-		'24': FBTimeMode.kFBTimeMode24Frames,
-		'23.976': FBTimeMode.kFBTimeMode23976Frames,
-	}
-	
-	if str(fps) in modes_dic.keys():
-		FBPlayerControl().SetTransportFps(modes_dic[str(fps)])
+	# 30.0 and 30 are the same mode, anything unknown is a custom rate
+	key = fps if isinstance(fps, str) else "{:g}".format(fps)
+
+	if key in _FPS_MODES:
+		FBPlayerControl().SetTransportFps(_FPS_MODES[key])
 	else:
 		FBPlayerControl().SetTransportFps(FBTimeMode.kFBTimeModeCustom, float(fps))
 
+	if log:
+		print("Framerate set to {}".format(fps))
+
+
+########## TIME CONVERSION ##########
+
+# MotionBuilder time unit (FBTime ticks per second)
+TICKS_PER_SECOND = 46186158000
+
+# frames dropped every minute (but every tenth) by drop-frame timecode, by nominal fps
+_DROP_FRAMES = {30: 2, 60: 4}
+
+# drop-frame transport modes
+_DROP_MODES = (FBTimeMode.kFBTimeMode2997Frames_Drop,)
+
+def _require_numpy():
+	if np is None:
+		raise ImportError("numpy is required by the vectorized time and animation functions")
+
+def _fps(fps):
+	# given fps or the current transport one
+	if fps is None:
+		return FBPlayerControl().GetTransportFpsValue()
+	return float(fps)
+
+@traced
+def get_transport_fps(log = False):
+	''' Returns the transport fps (float) and whether it uses drop-frame timecode '''
+
+	player = FBPlayerControl()
+	fps = player.GetTransportFpsValue()
+	drop_frame = player.GetTransportFps() in _DROP_MODES
+
+	if log:
+		print("Transport: {:g} fps{}".format(fps, " drop-frame" if drop_frame else ""))
+
+	return fps, drop_frame
+
+def frame_to_time(frame, fps = None):
+	''' FBTime of a (possibly fractional) frame at the given or transport fps '''
+
+	return FBTime(int(round(frame * TICKS_PER_SECOND / _fps(fps))))
+
+def frames_to_ticks(frames, fps = None):
+	''' Array of frames to an int64 array of FBTime ticks '''
+
+	_require_numpy()
+	return np.rint(np.asarray(frames, dtype = np.float64) * (TICKS_PER_SECOND / _fps(fps))).astype(np.int64)
+
+def ticks_to_frames(ticks, fps = None):
+	''' Array of FBTime ticks to a float array of frames '''
+
+	_require_numpy()
+	return np.asarray(ticks, dtype = np.float64) * (_fps(fps) / TICKS_PER_SECOND)
+
+def frames_to_seconds(frames, fps = None):
+	''' Array of frames to a float array of seconds '''
+
+	_require_numpy()
+	return np.asarray(frames, dtype = np.float64) / _fps(fps)
+
+def seconds_to_frames(seconds, fps = None):
+	''' Array of seconds to a float array of frames '''
+
+	_require_numpy()
+	return np.asarray(seconds, dtype = np.float64) * _fps(fps)
+
+def _timecode_base(fps, drop_frame):
+	# nominal (integer) fps and frames dropped per minute
+	nominal = int(round(fps))
+	drop = _DROP_FRAMES.get(nominal, 0) if drop_frame else 0
+	if drop_frame and not drop:
+		raise ValueError("drop-frame timecode is only defined for 29.97 and 59.94 fps")
+	return nominal, drop
+
+def frames_to_timecode(frames, fps = None, drop_frame = None):
+	''' Array of frames to a list of SMPTE timecodes (hh:mm:ss:ff, hh:mm:ss;ff for drop-frame) '''
+
+	_require_numpy()
+	if fps is None:
+		fps, transport_drop = get_transport_fps()
+		if drop_frame is None:
+			drop_frame = transport_drop
+	nominal, drop = _timecode_base(fps, drop_frame)
+	frames = np.rint(np.asarray(frames, dtype = np.float64)).astype(np.int64)
+
+	if drop:
+		# add back the frame numbers skipped by the timecode
+		per_10_minutes = nominal * 600 - drop * 9
+		per_minute = nominal * 60 - drop
+		tens, rest = np.divmod(frames, per_10_minutes)
+		frames = frames + drop * 9 * tens + np.where(rest > drop, drop * ((rest - drop) // per_minute), 0)
+
+	ff = frames % nominal
+	ss = (frames // nominal) % 60
+	mm = (frames // (nominal * 60)) % 60
+	hh = (frames // (nominal * 3600)) % 24
+	separator = ";" if drop else ":"
+	return ["{:02d}:{:02d}:{:02d}{}{:02d}".format(h, m, sec, separator, f) for h, m, sec, f in zip(hh.tolist(), mm.tolist(), ss.tolist(), ff.tolist())]
+
+def timecode_to_frames(timecodes, fps = None, drop_frame = None):
+	''' List of SMPTE timecodes to an int64 array of frames, drop-frame is detected from ";" if not given '''
+
+	_require_numpy()
+	timecodes = list(timecodes)
+	if not timecodes:
+		return np.zeros(0, dtype = np.int64)
+	if fps is None:
+		fps = get_transport_fps()[0]
+	if drop_frame is None:
+		drop_frame = ";" in timecodes[0]
+	nominal, drop = _timecode_base(fps, drop_frame)
+
+	# one split for the whole list, then integer math on the columns
+	fields = np.array(re.split(r"[:;.,]", ":".join(timecodes)), dtype = np.int64).reshape(-1, 4)
+	hh, mm, ss, ff = fields[:, 0], fields[:, 1], fields[:, 2], fields[:, 3]
+	frames = ((hh * 60 + mm) * 60 + ss) * nominal + ff
+
+	if drop:
+		minutes = hh * 60 + mm
+		frames -= drop * (minutes - minutes // 10)
+
+	return frames
+
+# EDL event: number, reel, track, transition, source in/out, record in/out
+_EDL_EVENT = re.compile(r"^\s*(\d+)\s+(\S+)\s+(\S+)\s+(\S+)\s+(?:\d+\s+)?(\d\d[:;.]\d\d[:;.]\d\d[:;.]\d\d)\s+(\d\d[:;.]\d\d[:;.]\d\d[:;.]\d\d)\s+(\d\d[:;.]\d\d[:;.]\d\d[:;.]\d\d)\s+(\d\d[:;.]\d\d[:;.]\d\d[:;.]\d\d)")
+_EDL_CLIP_NAME = re.compile(r"^\s*\*\s*FROM CLIP NAME:\s*(.*)$")
+
+@traced
+def parse_timecode_file(path, fps = None, drop_frame = None, columns = None, log = False):
+	''' Parse an EDL (events) or a CSV (timecode columns) into frame arrays '''
+
+	# EDL: {"event", "reel", "track", "clip", "src_in", "src_out", "rec_in", "rec_out"}
+	# CSV: one entry per column, the timecode columns (or the given ones) converted to frames
+	_require_numpy()
+
+	if path.lower().endswith(".edl"):
+		events = {"event": [], "reel": [], "track": [], "clip": []}
+		timecodes = dict((key, []) for key in ("src_in", "src_out", "rec_in", "rec_out"))
+		with open(path) as f:
+			for line in f:
+				match = _EDL_EVENT.match(line)
+				if match:
+					groups = match.groups()
+					events["event"].append(int(groups[0]))
+					events["reel"].append(groups[1])
+					events["track"].append(groups[2])
+					events["clip"].append(None)
+					for key, value in zip(("src_in", "src_out", "rec_in", "rec_out"), groups[4:]):
+						timecodes[key].append(value)
+					continue
+				match = _EDL_CLIP_NAME.match(line)
+				if match and events["clip"]:
+					events["clip"][-1] = match.group(1).strip()
+		for key, values in timecodes.items():
+			events[key] = timecode_to_frames(values, fps, drop_frame)
+		result = events
+	else:
+		import csv
+		with open(path) as f:
+			rows = list(csv.DictReader(f))
+		result = {}
+		names = rows[0].keys() if rows else []
+		for name in names:
+			values = [row[name].strip() for row in rows]
+			is_timecode = all(re.match(r"^\d\d[:;.]\d\d[:;.]\d\d[:;.]\d\d$", value) for value in values)
+			if (columns is None and is_timecode) or (columns is not None and name in columns):
+				result[name] = timecode_to_frames(values, fps, drop_frame)
+			else:
+				result[name] = values
+
+	if log:
+		count = max([len(values) for values in result.values()] or [0])
+		print("{} entries read from {}".format(count, path))
+
+	return result
+
 
 ########## STORY EDITOR ##########
 
+@traced
 def frame_story_clip(log = False):
 	''' Frame selected Story clips by changing the timeline start and end frames '''
 	
 	nbClips = 0
 
-	for track in FBStory().RootFolder.Tracks:
-		for clip in track.Clips:
+	for track in _trace_iter(FBStory().RootFolder.Tracks):
+		for clip in _trace_iter(track.Clips):
 			if clip.Selected:
 
 				# get selected clip start and end frame
@@ -762,6 +1680,7 @@ def frame_story_clip(log = False):
 		if log:
 			print ("ERROR, select at least one Story Clip")
 					
+@traced
 def toogle_story_mode(log = False):
 	''' Toggle story mode on/off '''
 	
@@ -773,9 +1692,15 @@ def toogle_story_mode(log = False):
 		else:
 			print ("Story mode ON")
 
+@traced
 def order_takes_based_on_file(filename, log = False):
 	'''Reorder the take list based on a text file (one take per line)'''
 	
+	_run_steps(iter_order_takes_based_on_file(filename, log))
+
+def iter_order_takes_based_on_file(filename, log = False):
+	'''Steps of order_takes_based_on_file, yields the progress after each duplicated take'''
+	
 	# Creates list of all takes from file (one element per line)
 	textfile = [line.rstrip('\n') for line in open(filename)]
 	
@@ -811,16 +1736,18 @@ def order_takes_based_on_file(filename, log = False):
 		duplicate_take(old_name, new_name)
 		if log:
 			print ("duplicate {}".format(old_name))
+		yield 0.9 * (n + 1) / len(take_dict)
 
 	# Update takelist
 	takelist = get_take_list()
 	
 	# Delete old takes (only the ones from the textfile that have been duplicated)
-	for takeName in takelist:
-		if takeName in textfile:
-			get_take(takeName).FBDelete()
-			if log:
-				print ("delete {}".format(takeName))
+	with scene_batch("order_takes_based_on_file") as batch:
+		for take in _trace_iter(lSys.Scene.Takes):
+			if take.Name in textfile:
+				batch.delete(take)
+				if log:
+					print ("delete {}".format(take.Name))
 	
 	# Rename new takes
 	for take in lSys.Scene.Takes:
@@ -828,26 +1755,31 @@ def order_takes_based_on_file(filename, log = False):
 			take.Name = take.Name.replace(suffix, "")
 			if log:
 				print ("rename {}".format(take.Name))
+	invalidate_take_cache()
 	
+	yield 1.0
+
 	# print (log)
 	if log:
 		print ("Takes ordered: {}".format(len(take_dict)))
 		print ("Takes not in file: {}".format(takes_not_in_file))
 
+@traced
 def move_selected_clip_to_frame(frame = get_current_frame(), log = False):
 	''' Move a selected clip in the Story Mode to a given frame (current if not specified) '''
 	
-	if type(frame) != int:
-		print ("ERROR, enter frame number as an integer")
+	if not isinstance(frame, (int, float)):
+		print ("ERROR, enter frame number as a number")
 		return
 		
-	for track in Story.RootFolder.Tracks:
-		for clip in track.Clips:
+	for track in _trace_iter(Story.RootFolder.Tracks):
+		for clip in _trace_iter(track.Clips):
 			if clip.Selected:
-				clip.Start = FBTime(0,0,0,frame)
+				clip.Start = frame_to_time(frame)
 				if log:
-					print ("Clip {} moved to frame {}".format((clip.Name, frame)))
+					print ("Clip {} moved to frame {}".format(clip.Name, frame))
 
+@traced
 def insert_character_animation_track(log = False):
 	''' Insert a character animation track using the current character in the Story Mode and select it '''
 	
@@ -860,9 +1792,13 @@ def insert_character_animation_track(log = False):
 		
 	return track
 
-def insert_take_in_storyMode(take = lSys.CurrentTake, log = False):
+@traced
+def insert_take_in_storyMode(take = None, log = False):
 	''' Insert take in Story mode, current if not specified'''
 	
+	if take is None:
+		take = lSys.CurrentTake
+	
 	# turn on Story mode
 	if Story.Mute:
 		toogle_story_mode(log)
@@ -875,7 +1811,8 @@ def insert_take_in_storyMode(take = lSys.CurrentTake, log = False):
 			
 	# if no track or no selected one, creates one and select it
 	if not selected:
-		newTrack = Story.RootFolder.Tracks.append("Inserted Track") 
+		newTrack = FBStoryTrack(FBStoryTrackType.kFBStoryTrackCharacter, Story.RootFolder)
+		newTrack.Name = "Inserted Track"
 		newTrack.Selected = True
 		
 	# insert current take to selected track
@@ -890,9 +1827,73 @@ def insert_take_in_storyMode(take = lSys.CurrentTake, log = False):
 			if log:
 				print ("Take {} inserted in {}".format(take.Name, track.Name))
 
+_STORY_PLACEMENTS = ("sequential", "gap", "aligned")
+
+@traced
+def insert_takes_in_story(takes = None, track = None, start_frame = None, placement = "sequential", gap = 0, log = False):
+	''' Insert takes (names or FBTake, all by default) as clips of a Story track in one pass, returns the clips '''
+	
+	# track: FBStoryTrack, track name or None for a new character track
+	# start_frame: first clip start, after the last clip of the track if not given
+	# placement: "sequential" clips back to back, "gap" with gap frames between clips,
+	# "aligned" at the start of an existing clip of the same take on another track (sequential otherwise)
+	if placement not in _STORY_PLACEMENTS:
+		raise ValueError("placement must be one of {}".format(", ".join(_STORY_PLACEMENTS)))
+	
+	takes = list(lScene.Takes if takes is None else takes)
+	if not all(isinstance(take, FBTake) for take in takes):
+		# the name lookup walks all the takes, only built when names are given
+		scene_takes = dict((take.Name, take) for take in _trace_iter(lScene.Takes))
+		takes = [scene_takes[take] if not isinstance(take, FBTake) else take for take in takes]
+	
+	if track is None:
+		track = insert_character_animation_track()
+	elif not isinstance(track, FBStoryTrack):
+		track_name = track
+		track = next((lTrack for lTrack in Story.RootFolder.Tracks if lTrack.Name == track_name), None)
+		if track is None:
+			raise ValueError("No Story track named {}".format(track_name))
+	
+	if start_frame is None:
+		start_frame = max([clip.Stop.GetFrame() for clip in track.Clips] or [0])
+	
+	# first clip start of each take on the other tracks, told apart by name
+	# since the wrappers returned by Tracks are not the ones held in track
+	aligned = {}
+	if placement == "aligned":
+		for lTrack in _trace_iter(Story.RootFolder.Tracks):
+			if lTrack.LongName != track.LongName:
+				for clip in _trace_iter(lTrack.Clips):
+					start = clip.Start.GetFrame()
+					name = clip.Take.Name
+					if name not in aligned or start < aligned[name]:
+						aligned[name] = start
+	
+	Story.Mute = False
+	spacing = gap if placement == "gap" else 0
+	frame = start_frame
+	clips = []
+	
+	for take in takes:
+		span = take.LocalTimeSpan
+		clip_frame = aligned.get(take.Name, frame)
+		clip = track.CopyTakeIntoTrack(span, take, frame_to_time(clip_frame))
+		clips.append(clip)
+		_trace_count(1, 1)
+		if take.Name not in aligned:
+			frame += span.GetStop().GetFrame() - span.GetStart().GetFrame() + spacing
+		if log:
+			print ("Take {} inserted in {} at frame {}".format(take.Name, track.Name, clip_frame))
+	
+	if log:
+		print ("{} takes inserted in {}".format(len(clips), track.Name))
+	
+	return clips
+
 
 ########## OBJECTS ##########    
 
+@traced
 def align_objects(source, target, transformation = (0,1,0), log = False):
 	''' align source object to target object according to a given transformation tuple (translation, rotation, scale)'''
 	
@@ -917,6 +1918,7 @@ def align_objects(source, target, transformation = (0,1,0), log = False):
 	if log:
 		print ("{} aligned to {}".format(source.Name, target.Name))
 		
+@traced
 def align_objects_from_name(source_name, target_name, transformation = (1,1,0), log = False):
 	''' align a source object to a target one based on a string name input '''
 	
@@ -927,25 +1929,32 @@ def align_objects_from_name(source_name, target_name, transformation = (1,1,0),
 
 ########## KEYS ##########
 
+@traced
 def set_key(log = False):
 	''' set key on selected at current time '''
 	
 	FBPlayerControl().Key()
+	invalidate_take_cache(lSys.CurrentTake.Name)
+	_trace_count()
 	if log:
 		print("Key added at current time")
 
+@traced
 def clear_anim(pNode, log = False):
 	''' clear all keys on passed animation node '''
 	
 	# check if keys on selecte model
 	if pNode.FCurve:
 		pNode.FCurve.EditClear()
+		invalidate_take_cache(lSys.CurrentTake.Name)
+		_trace_count(1, 1)
 	
 	# if not, browse recursively through children until finding a model with keys
 	else:
-		for lNode in pNode.Nodes:
+		for lNode in _trace_iter(pNode.Nodes):
 			clear_anim( lNode )
 
+@traced
 def clear_anim_on_selected(log = False):
 	''' clear all keys on selected objects (current layer) '''
 
@@ -959,9 +1968,163 @@ def clear_anim_on_selected(log = False):
 		if log:
 			print( "Anim keys deleted on {}".format(lModel.Name))
 
+# model property of each transform channel
+_CHANNEL_PROPERTIES = {"translation": "Translation", "rotation": "Rotation", "scaling": "Scaling"}
+_AXES = {"x": 0, "y": 1, "z": 2}
+
+_TANGENT_MODES = {
+	"auto": FBTangentMode.kFBTangentModeAuto,
+	"tcb": FBTangentMode.kFBTangentModeTCB,
+	"user": FBTangentMode.kFBTangentModeUser,
+	"break": FBTangentMode.kFBTangentModeBreak,
+	"clamp": FBTangentMode.kFBTangentModeClampProgressive,
+}
+
+_INTERPOLATIONS = {
+	"constant": FBInterpolation.kFBInterpolationConstant,
+	"linear": FBInterpolation.kFBInterpolationLinear,
+	"cubic": FBInterpolation.kFBInterpolationCubic,
+}
+
+def _channel_curves(model, channel):
+	# FCurves of "translation", "rotation", "scaling" (3 curves) or of one axis ("rotation.x")
+	name, _, axis = channel.lower().partition(".")
+	prop = getattr(model, _CHANNEL_PROPERTIES[name])
+	prop.SetAnimated(True)
+	leaves = prop.GetAnimationNode().Nodes
+	_trace_count(2, 1)
+	if axis:
+		return [leaves[_AXES[axis]].FCurve]
+	return [leaf.FCurve for leaf in leaves]
+
+@contextlib.contextmanager
+def _on_layer(layer):
+	# make an animation layer (index or name, created if missing) current on the current take
+	take = lSys.CurrentTake
+	if layer is None:
+		yield
+		return
+
+	if not isinstance(layer, int):
+		index = None
+		for idx in range(take.GetLayerCount()):
+			if take.GetLayer(idx).Name == layer:
+				index = idx
+				break
+		if index is None:
+			take.CreateNewLayer()
+			index = take.GetLayerCount() - 1
+			take.GetLayer(index).Name = layer
+		layer = index
+
+	previous = take.GetCurrentLayer()
+	take.SetCurrentLayer(layer)
+	try:
+		yield
+	finally:
+		take.SetCurrentLayer(previous)
+
+def _write_curves(curves, ticks, values, interpolation, tangent, replace):
+	# write one column of values per curve, reusing a single FBTime
+	time = FBTime(0)
+	tick_list = ticks.tolist()
+	for idx, curve in enumerate(curves):
+		column = values[:, idx].tolist()
+		if replace and tick_list:
+			curve.KeyDeleteByTimeRange(FBTime(tick_list[0]), FBTime(tick_list[-1]), True)
+		curve.EditBegin(len(tick_list))
+		try:
+			for tick, value in zip(tick_list, column):
+				time.Set(tick)
+				curve.KeyAdd(time, value, interpolation, tangent)
+		finally:
+			curve.EditEnd()
+		_trace_count(len(tick_list) + 2, 1)
+
+@traced
+def write_keys(model, channel, frames, values, tangent = "auto", interpolation = "cubic", layer = None, replace = True, fps = None, log = False):
+	''' Write arrays of frames and values (N x 3, or N for one axis like "rotation.x") into a model transform channel '''
+
+	write_animation({model: {channel: (frames, values)}}, tangent, interpolation, layer, replace, fps, log)
+
+@traced
+def write_animation(animation, tangent = "auto", interpolation = "cubic", layer = None, replace = True, fps = None, log = False):
+	''' Write {model: {channel: (frames, values)}} straight into the FCurves of the current take, in bulk '''
+
+	# keys already on the curves inside the written frame range are replaced (replace = True)
+	# or merged, the layer is an index or a name (created if missing)
+	_require_numpy()
+	tangent = _TANGENT_MODES[tangent]
+	interpolation = _INTERPOLATIONS[interpolation]
+	count = 0
+
+	with _on_layer(layer):
+		for model, channels in animation.items():
+			for channel, (frames, values) in channels.items():
+				ticks = frames_to_ticks(frames, fps)
+				values = np.asarray(values, dtype = np.float64)
+				if values.ndim == 1:
+					values = values[:, None]
+				curves = _channel_curves(model, channel)
+				if values.shape != (len(ticks), len(curves)):
+					raise ValueError("{} {}: expected values of shape ({}, {}), got {}".format(model.Name, channel, len(ticks), len(curves), values.shape))
+				_write_curves(curves, ticks, values, interpolation, tangent, replace)
+				count += values.size
+
+	invalidate_take_cache(lSys.CurrentTake.Name)
+
+	if log:
+		print("{} keys written on {} models".format(count, len(animation)))
+
+	return count
+
+@traced
+def read_keys(model, channel, fps = None, log = False):
+	''' Returns (frames, values) arrays of a model transform channel (values N x 3, or N for one axis) '''
+
+	# axes keyed at different times are evaluated at the union of their key times
+	_require_numpy()
+	name, _, axis = channel.lower().partition(".")
+	prop = getattr(model, _CHANNEL_PROPERTIES[name])
+	node = prop.GetAnimationNode() if prop.IsAnimated() else None
+	if node is None:
+		return np.zeros(0), np.zeros((0,) if axis else (0, 3))
+
+	curves = [node.Nodes[_AXES[axis]].FCurve] if axis else [leaf.FCurve for leaf in node.Nodes]
+	columns = []
+	for curve in curves:
+		keys = curve.Keys
+		columns.append(([key.Time.Get() for key in keys], [key.Value for key in keys]))
+		_trace_count(len(keys) + 1, 1)
+
+	ticks = columns[0][0]
+	if any(column[0] != ticks for column in columns[1:]):
+		ticks = sorted(set().union(*[column[0] for column in columns]))
+		time = FBTime(0)
+		values = []
+		for curve in curves:
+			column = []
+			for tick in ticks:
+				time.Set(tick)
+				column.append(curve.Evaluate(time))
+			values.append(column)
+	else:
+		values = [column[1] for column in columns]
+
+	frames = ticks_to_frames(np.array(ticks, dtype = np.int64), fps)
+	values = np.array(values, dtype = np.float64).T
+	if axis:
+		values = values[:, 0]
+
+	if log:
+		print("{} keys read on {} {}".format(len(frames), model.Name, channel))
+
+	return frames, values
+
 
 ########## CHARACTERS ##########       
 
+@traced
 def set_current_character(character, log = False):
 	''' set the current character '''
 
@@ -971,12 +2134,13 @@ def set_current_character(character, log = False):
 		print("Current character is " + character.Name)
 
 
+@traced
 def set_current_character_by_name(name, log = False):
 	''' set the current character based on string '''
 	
 	char_exists = False
 	lCharInScene = lScene.Characters
-	for character in lCharInScene:
+	for character in _trace_iter(lCharInScene):
 
 			if character.Name == name:
 				set_current_character(character)
@@ -991,11 +2155,12 @@ def set_current_character_by_name(name, log = False):
 	return lApp.CurrentCharacter
 	 
 	 
+@traced
 def get_character_by_name(name, log = False):
 	''' get a character based on string '''
 	
 	lCharInScene = lScene.Characters
-	for character in lCharInScene:
+	for character in _trace_iter(lCharInScene):
 		if character.Name == name:
 			if log:
 				print("Returning " + name)
@@ -1005,6 +2170,7 @@ def get_character_by_name(name, log = False):
 		print("ERROR, {} does not exist".format(name))
 		
 		
+@traced
 def plot_to_skeleton(char = lApp.CurrentCharacter, log = False):
 	''' Plot a character (current if not specified) motion onto the skeleton '''
 
@@ -1021,10 +2187,13 @@ def plot_to_skeleton(char = lApp.CurrentCharacter, log = False):
 	 
 	# Plotting to the skeleton
 	char.PlotAnimation(FBCharacterPlotWhere.kFBCharacterPlotOnSkeleton,PlotOptions)
+	invalidate_take_cache(lSys.CurrentTake.Name)
+	_trace_count()
 
 	if log:
 		print ("{} motion plotted on skeleton".format(char.Name))
 
+@traced
 def plot_to_rig(char = lApp.CurrentCharacter, log = False):
 	''' Plot a character (current if not specified) motion onto the rig '''
 	
@@ -1041,10 +2210,13 @@ def plot_to_rig(char = lApp.CurrentCharacter, log = False):
 	
 	# Plotting to the rig
 	char.PlotAnimation(FBCharacterPlotWhere.kFBCharacterPlotOnControlRig,PlotOptions)
+	invalidate_take_cache(lSys.CurrentTake.Name)
+	_trace_count()
 
 	if log:
 		print ("{} motion plotted on rig".format(char.Name))
 		
+@traced
 def plot_to_skeleton_and_rig(log = False):
 	'''Plot to skeleton and back to rig'''
 
@@ -1053,6 +2225,7 @@ def plot_to_skeleton_and_rig(log = False):
 	plot_to_rig(char, log)
 
 
+@traced
 def plot_selected_all_properties(log = False):
 	
 	# Set options for Plot process
@@ -1067,10 +2240,13 @@ def plot_selected_all_properties(log = False):
 	lOptions.UseConstantKeyReducer = False
 	
 	lSys.CurrentTake.PlotTakeOnSelected(lOptions)
+	invalidate_take_cache(lSys.CurrentTake.Name)
+	_trace_count()
 
 	if log:
 		print("Selected components plotted (all properties")
 
+@traced
 def characterise_skeleton(skeleton_name, system = 'OT', log = False):
 
 	if system == 'OT':
@@ -1083,13 +2259,14 @@ def characterise_skeleton(skeleton_name, system = 'OT', log = False):
 		# go to frame -1
 		go_to_frame(-1, log)
 
-		# zero out the root translation at hips_height
-		root_joint.Translation = FBVector3d(0,root_joint_height,0)
+		with scene_batch("characterise_skeleton", log = log) as batch:
+			# zero out the root translation at hips_height
+			batch.set(root_joint, 'Translation', FBVector3d(0,root_joint_height,0))
 
-		# zero out rotation on all joints
-		children = get_children(root_joint)
-		for child in children:
-			child.Rotation = FBVector3d(0,0,0)
+			# zero out rotation on all joints
+			children = get_children(root_joint)
+			for child in children:
+				batch.set(child, 'Rotation', FBVector3d(0,0,0))
 
 		# key skeleton
 		set_key(log)
@@ -1114,6 +2291,7 @@ def characterise_skeleton(skeleton_name, system = 'OT', log = False):
 	# Assign joints using the HIK template
 	fails = list()
 	for joint in joints:
+		_trace_count(1, 1)
 		slot = pCharacter.PropertyList.Find(joint.Name.replace(char_prefix, "") + 'Link')  # todo: This only works for HIK naming convention. Prompt for preset?
 		if slot is not None:
 			slot.append(joint)
@@ -1129,9 +2307,15 @@ def characterise_skeleton(skeleton_name, system = 'OT', log = False):
 
 
 ########## IMPORT/EXPORT ##########     
+@traced
 def export_character_animation(target_path, rig_name, lSaveOptions = False, log = False):
 	''' Export character animation using given or default options '''
 
+	_run_steps(iter_export_character_animation(target_path, rig_name, lSaveOptions, log))
+
+def iter_export_character_animation(target_path, rig_name, lSaveOptions = False, log = False):
+	''' Steps of export_character_animation, the save itself is a single SDK call '''
+
 	# Default Save Animation Options    
 	if not lSaveOptions:
 		lSaveOptions = FBFbxOptions (False) # false = will not save options 
@@ -1144,17 +2328,205 @@ def export_character_animation(target_path, rig_name, lSaveOptions = False, log
 	target_dir = os.path.dirname(target_path)
 	flib.ensure_dir(target_dir)
 	rig_char = get_character_by_name(rig_name)
+	yield 0.1
 	
 	lApp.SaveCharacterRigAndAnimation(target_path, rig_char, lSaveOptions)
+	_trace_count()
+	yield 1.0
 
 	if log:
 		print("{} has been exported here: {}".format(rig_name, target_path))
 
+# compact binary animation (.mban): little endian header, joint table, constant values, animated
+# channel table (joint, component, min, scale), chunk index (first frame, offset, size) and chunks
+# of uint16 quantized frames (frames x animated channels), zlib compressed if FLAG_ZLIB is set
+_MBAN_MAGIC = b"MBAN"
+_MBAN_VERSION = 1
+_MBAN_FLAG_ZLIB = 1
+_MBAN_HEADER = "<4sHHdiIIIII"
+_MBAN_CHANNEL = "<IBff"
+_MBAN_CHUNK = "<IQI"
+
+def _character_joints(character):
+	# skeleton joints linked to a character, in slot order
+	joints = []
+	for prop in character.PropertyList:
+		if prop.Name.endswith("Link") and len(prop):
+			joints.append(prop[0])
+	_trace_count(1, len(joints))
+	return joints
+
+def _sample_local_transforms(joints, frames, fps = None):
+	# local translation, rotation and scaling (frames, joints, 9) read from the FCurves of the current take
+	# baked curves (one key per frame) are copied, the others are evaluated, channels without curve are constant
+	ticks = frames_to_ticks(frames, fps)
+	tick_list = ticks.tolist()
+	time = FBTime(0)
+	values = np.empty((len(frames), len(joints), 9))
+	for jdx, joint in enumerate(joints):
+		for channel, name in enumerate(("Translation", "Rotation", "Scaling")):
+			prop = getattr(joint, name)
+			node = prop.GetAnimationNode() if prop.IsAnimated() else None
+			_trace_count(2, 1)
+			if node is None:
+				values[:, jdx, channel * 3:channel * 3 + 3] = prop.Data
+				continue
+			for axis, leaf in enumerate(node.Nodes):
+				curve = leaf.FCurve
+				keys = curve.Keys
+				column = values[:, jdx, channel * 3 + axis]
+				if len(keys) == len(tick_list) and [key.Time.Get() for key in keys] == tick_list:
+					column[:] = [key.Value for key in keys]
+				elif len(keys):
+					for idx, tick in enumerate(tick_list):
+						time.Set(tick)
+						column[idx] = curve.Evaluate(time)
+				else:
+					column[:] = prop.Data[axis]
+				_trace_count(len(keys) + 1, 1)
+	return values
+
+@traced
+def export_animation_binary(target_path, rig_name = None, joints = None, start = None, end = None, chunk = 256, compress = True, epsilon = 1e-6, log = False):
+	''' Export the baked skeleton animation of a character (current if not given) or joint list to a compact binary file '''
+
+	# channels varying less than epsilon are stored once as constants, the others are quantized
+	# to 16 bits over their own range, frames are written in chunks that can be read one at a time
+	import zlib
+	import struct
+	_require_numpy()
+
+	if joints is None:
+		character = get_character_by_name(rig_name) if rig_name else lApp.CurrentCharacter
+		joints = _character_joints(character)
+	joints = list(joints)
+	span = lSys.CurrentTake.LocalTimeSpan
+	start = span.GetStart().GetFrame() if start is None else start
+	end = span.GetStop().GetFrame() if end is None else end
+	frames = np.arange(start, end + 1)
+
+	values = _sample_local_transforms(joints, frames).reshape(len(frames), -1)
+	low = values.min(axis = 0)
+	high = values.max(axis = 0)
+	animated = np.flatnonzero(high - low > epsilon)
+	scale = (high[animated] - low[animated]) / 65535.0
+	quantized = np.rint((values[:, animated] - low[animated]) / scale).astype("<u2")
+
+	index = dict((joint.LongName, idx) for idx, joint in enumerate(joints))
+	chunks = []
+	for first in range(0, len(frames), chunk):
+		data = quantized[first:first + chunk].tobytes()
+		chunks.append((first, zlib.compress(data, 6) if compress else data))
+
+	flib.ensure_dir(os.path.dirname(target_path))
+	with open(target_path, "wb") as f:
+		f.write(struct.pack(_MBAN_HEADER, _MBAN_MAGIC, _MBAN_VERSION, _MBAN_FLAG_ZLIB if compress else 0, get_transport_fps()[0], start, len(frames), len(joints), len(animated), chunk, len(chunks)))
+		for joint in joints:
+			name = joint.LongName.encode("utf-8")
+			parent = joint.Parent
+			f.write(struct.pack("<Hi", len(name), index.get(parent.LongName, -1) if parent is not None else -1))
+			f.write(name)
+		f.write(values[0].astype("<f4").tobytes())
+		for channel, offset, step in zip(animated.tolist(), low[animated].tolist(), scale.tolist()):
+			f.write(struct.pack(_MBAN_CHANNEL, channel // 9, channel % 9, offset, step))
+		# chunk offsets are known once the index size is
+		offset = f.tell() + struct.calcsize(_MBAN_CHUNK) * len(chunks)
+		for first, data in chunks:
+			f.write(struct.pack(_MBAN_CHUNK, first, offset, len(data)))
+			offset += len(data)
+		for first, data in chunks:
+			f.write(data)
+
+	if log:
+		print("{} joints, {} frames, {} of {} channels animated exported here: {} ({} bytes)".format(len(joints), len(frames), len(animated), values.shape[1], target_path, os.path.getsize(target_path)))
+
+	return target_path
+
+class AnimationBinaryReader(object):
+	''' Reader of the files written by export_animation_binary, frames are decoded one chunk at a time '''
+
+	def __init__(self, path):
+		import struct
+		_require_numpy()
+		self.path = path
+		with open(path, "rb") as f:
+			header = f.read(struct.calcsize(_MBAN_HEADER))
+			magic, version, flags, self.fps, self.start, self.frame_count, joint_count, channel_count, self.chunk_frames, chunk_count = struct.unpack(_MBAN_HEADER, header)
+			if magic != _MBAN_MAGIC or version > _MBAN_VERSION:
+				raise ValueError("{} is not a binary animation file".format(path))
+			self.compressed = bool(flags & _MBAN_FLAG_ZLIB)
+			self.names = []
+			self.parents = []
+			for _ in range(joint_count):
+				size, parent = struct.unpack("<Hi", f.read(6))
+				self.names.append(f.read(size).decode("utf-8"))
+				self.parents.append(parent)
+			self.constants = np.frombuffer(f.read(4 * 9 * joint_count), dtype = "<f4").astype(np.float64)
+			channels = np.frombuffer(f.read(struct.calcsize(_MBAN_CHANNEL) * channel_count), dtype = np.dtype([("joint", "<u4"), ("component", "u1"), ("offset", "<f4"), ("scale", "<f4")]))
+			self.channels = channels["joint"].astype(np.int64) * 9 + channels["component"]
+			self.offsets = channels["offset"].astype(np.float64)
+			self.scales = channels["scale"].astype(np.float64)
+			self.chunks = [struct.unpack(_MBAN_CHUNK, f.read(struct.calcsize(_MBAN_CHUNK))) for _ in range(chunk_count)]
+
+	@property
+	def frames(self):
+		return np.arange(self.start, self.start + self.frame_count)
+
+	def read_chunk(self, idx):
+		''' Returns (frames, values (frames, joints, 9)) of one chunk '''
+
+		import zlib
+		first, offset, size = self.chunks[idx]
+		with open(self.path, "rb") as f:
+			f.seek(offset)
+			data = f.read(size)
+		if self.compressed:
+			data = zlib.decompress(data)
+		quantized = np.frombuffer(data, dtype = "<u2").reshape(-1, len(self.channels))
+		values = np.tile(self.constants, (len(quantized), 1))
+		values[:, self.channels] = quantized * self.scales + self.offsets
+		return self.start + first + np.arange(len(quantized)), values.reshape(len(quantized), len(self.names), 9)
+
+	def __iter__(self):
+		for idx in range(len(self.chunks)):
+			yield self.read_chunk(idx)
+
+	def read(self):
+		''' Returns (frames, values (frames, joints, 9)) of the whole file, values are local translation, rotation, scaling '''
+
+		values = np.empty((self.frame_count, len(self.names), 9))
+		for frames, chunk in self:
+			values[frames - self.start] = chunk
+		return self.frames, values
+
+@traced
+def read_animation_binary(path, log = False):
+	''' Read a binary animation file, returns {"fps", "names", "parents", "frames", "values" (frames, joints, 9)} '''
+
+	reader = AnimationBinaryReader(path)
+	frames, values = reader.read()
+
+	if log:
+		print("{} joints, {} frames read from {}".format(len(reader.names), len(frames), path))
+
+	return {"fps": reader.fps, "names": reader.names, "parents": reader.parents, "frames": frames, "values": values}
+
+@traced
+def scan_fbx_takes(files, workers = None, manifest_path = None, executable = None, log = False):
+	''' Take names, spans, fps, characters and namespaces of binary FBX files (or of the .fbx under a folder), read without opening them '''
+
+	# see fb_fbx_reader.scan_fbx_files, files are read by a pool of processes (mobupy as executable in MotionBuilder)
+	import fb_fbx_reader
+	manifest = fb_fbx_reader.scan_fbx_files(files, workers, executable, manifest_path, log)
+	_trace_count(len(manifest["files"]) + len(manifest["failed"]), 0)
+	return manifest
+
 
 ########## HUDS ##########   
 
+@traced
 def add_text_hud_to_camera(HUD_name = "HUD", camera_name = "Perspective", text_element = "TextHUD", text_content = "myText", text_font = "Arial", text_height = 5, text_justif = FBHUDElementHAlignment.kFBHUDLeft, text_dock_horizontal = FBHUDElementHAlignment.kFBHUDLeft, text_dock_vertical = FBHUDElementVAlignment.kFBHUDTop):
-	''' Add a text HUD to a given camera (default top-left) '''
+	''' Add a text HUD to a given camera or list of cameras (default top-left), returns the HUD and its text element '''
 
 	HUD = FBHUD(HUD_name)
 	lText = FBHUDTextElement(text_element)
@@ -1166,15 +2538,157 @@ def add_text_hud_to_camera(HUD_name = "HUD", camera_name = "Perspective", text_e
 	lText.HorizontalDock = text_dock_horizontal
 	lText.VerticalDock = text_dock_vertical
 	HUD.ConnectSrc(lText) #Connect HUDTextElement to the HUD
-	get_comp_by_name(camera_name).ConnectSrc(HUD)
+	for name in ([camera_name] if isinstance(camera_name, str) else camera_name):
+		get_comp_by_name(name).ConnectSrc(HUD)
+
+	return HUD, lText
+
+class PerformanceHUD(object):
+	''' HUD showing playback fps against transport fps, evaluation time, dropped frames, take and character '''
+
+	# updated from the evaluation pipeline callback: each evaluation only stores a few numbers in a
+	# preallocated ring buffer, the text is rebuilt every refresh seconds
+	COLUMNS = ("time", "frame", "interval_ms", "eval_ms", "dropped")
+
+	def __init__(self, camera_name = "Perspective", size = 1024, refresh = 0.25, stutter_path = None, stutter_frames = 3):
+		self.hud, self.element = add_text_hud_to_camera("PerformanceHUD", camera_name, "PerformanceText", "")
+		self.refresh = refresh
+		self.stutter_path = stutter_path
+		self.stutter_frames = stutter_frames
+		self.running = False
+		self._size = size
+		self.reset()
+
+	def reset(self):
+		''' Clear the ring buffer and counters '''
+
+		self._rows = [None] * self._size
+		self._count = 0
+		self._dropped = 0
+		self._last_frame = None
+		self._last_time = None
+		self._eval_start = None
+		self._window_start = _clock()
+		self._window_frames = 0
+		self._window_eval = 0.0
+		self._last_dump = 0.0
+
+	@property
+	def dropped(self):
+		return self._dropped
+
+	def attach(self, camera_name):
+		''' Show the HUD on another camera (name or list of names) '''
+
+		for name in ([camera_name] if isinstance(camera_name, str) else camera_name):
+			get_comp_by_name(name).ConnectSrc(self.hud)
+
+	def start(self):
+		if not self.running:
+			FBEvaluateManager().OnEvaluationPipelineEvent.Add(self._on_evaluation)
+			self.running = True
+
+	def stop(self):
+		if self.running:
+			FBEvaluateManager().OnEvaluationPipelineEvent.Remove(self._on_evaluation)
+			self.running = False
+
+	def remove(self):
+		''' Stop and delete the HUD '''
+
+		self.stop()
+		self.element.FBDelete()
+		self.hud.FBDelete()
+
+	def _on_evaluation(self, control, event):
+		now = _clock()
+		if event.GetTiming() != FBGlobalEvalCallbackTiming.kFBGlobalEvalCallbackAfterDAG:
+			self._eval_start = now
+			return
+		if self._eval_start is None:
+			return
+		eval_time = now - self._eval_start
+		self._eval_start = None
+
+		# only evaluations that moved the time count as played frames
+		frame = lSys.LocalTime.GetFrame()
+		if frame == self._last_frame:
+			return
+		interval = now - self._last_time if self._last_time is not None else 0.0
+		dropped = 0
+		if self._last_frame is not None and 1 < frame - self._last_frame and interval < 1.0:
+			dropped = frame - self._last_frame - 1
+			self._dropped += dropped
+		self._last_frame = frame
+		self._last_time = now
+
+		self._rows[self._count % self._size] = (now, frame, interval * 1000.0, eval_time * 1000.0, dropped)
+		self._count += 1
+		self._window_frames += 1
+		self._window_eval += eval_time
+
+		if self.stutter_path and dropped >= self.stutter_frames and now - self._last_dump > 1.0:
+			self._last_dump = now
+			self.dump_csv(self.stutter_path.format(time = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")))
+
+		if now - self._window_start >= self.refresh:
+			self._refresh(now)
+
+	def _refresh(self, now):
+		elapsed = now - self._window_start
+		fps = self._window_frames / elapsed if elapsed else 0.0
+		eval_ms = self._window_eval * 1000.0 / self._window_frames if self._window_frames else 0.0
+		character = lApp.CurrentCharacter
+		self.element.Content = "{:.1f}/{:g} fps   eval {:.2f} ms   dropped {}   {}   {}".format(fps, FBPlayerControl().GetTransportFpsValue(), eval_ms, self._dropped, lSys.CurrentTake.Name, character.Name if character else "-")
+		self._window_start = now
+		self._window_frames = 0
+		self._window_eval = 0.0
+
+	def get_log(self):
+		''' Rows of the ring buffer, oldest first (see COLUMNS) '''
+
+		if self._count <= self._size:
+			return self._rows[:self._count]
+		start = self._count % self._size
+		return self._rows[start:] + self._rows[:start]
+
+	def dump_csv(self, path):
+		''' Write the ring buffer to a csv file '''
+
+		import csv
+		with open(path, 'w') as f:
+			writer = csv.writer(f)
+			writer.writerow(self.COLUMNS)
+			writer.writerows(self.get_log())
+		return path
+
+@traced
+def add_performance_hud(camera_name = "Perspective", size = 1024, stutter_path = None, log = False):
+	''' Create and start a performance HUD on a camera or list of cameras, returns it '''
+
+	# stutter_path: csv dumped when frames are dropped, "{time}" is replaced by the date and time
+	hud = PerformanceHUD(camera_name, size, stutter_path = stutter_path)
+	hud.start()
+
+	if log:
+		print("Performance HUD added to {}".format(camera_name))
+
+	return hud
 
 ########## MISC ##########
 
+@traced
 def build_review(log = False):  
 	''' Puts all takes one after the other in the Story editor for reviewing  '''          
 	
-	# Get take list
-	take_list = get_take_list()
+	_run_steps(iter_build_review(log))
+
+def iter_build_review(log = False):
+	''' Steps of build_review, yields the progress after each inserted take '''
+	
+	# Get take list and lengths, without switching takes
+	take_list = list(lScene.Takes)
+	spans = get_take_spans()
 	
 	# Toogle Story mode on and create new character track
 	Story.Mute = False
@@ -1183,23 +2697,2023 @@ def build_review(log = False):
 	frame = 0
 	count = 0
 	
-	# Fill up Story track for all valid takes 
-	for take in take_list:
-		if take[0] != "_":
+	# Fill up Story track for all valid takes, placed back to back
+	for idx, take in enumerate(take_list):
+		if take.Name[0] != "_":
 			if log:
-				print ("Inserting {}".format(take))
-			set_current_take(take)
-			insert_current_take()
-			length = get_take_length()
-			move_selected_clip_to_frame(frame)  
-			frame += length
+				print ("Inserting {}".format(take.Name))
+			insert_takes_in_story([take], track, frame)
+			frame += spans[take.Name]["length"]
 			count += 1
+		yield float(idx + 1) / len(take_list)
 	
 	create_new_take("___REVIEW___")
 	set_timespan(0,frame)
 	
 	if log:
 		print ("{} takes inserted in the Story Editor".format(count))
-		
-		
+
+@traced
+def concatenate_takes(takes = None, new_take_name = "___REVIEW___", blend_frames = 0, models = None, start_frame = 0, log = False):
+	''' Lay takes (all but the "_" ones by default) end to end in a new take by copying their keys, no Story or plot, returns the take '''
+
+	# keys of each take are clipped to its span and shifted after the previous take, with blend_frames the
+	# takes overlap by that many frames and are cross-faded (smoothstep) on every frame of the overlap
+	# the transform curves of each take are read, and those of the new take written, through
+	# GetAnimationNode(take): the current take is never changed
+	_require_numpy()
+	takes_by_name = dict((take.Name, take) for take in lScene.Takes)
+	if takes is None:
+		takes = [take for take in lScene.Takes if not take.Name.startswith("_")]
+	takes = [takes_by_name[take] if isinstance(take, str) else take for take in takes]
+	if not takes:
+		raise ValueError("No take to concatenate")
+	if models is None:
+		models = [comp for comp in _trace_iter(lScene.Components) if isinstance(comp, FBModel)]
+	models = list(models)
+
+	# placement of each take: first frame in the new take and frame offset of its keys
+	spans = [(take.LocalTimeSpan.GetStart().GetFrame(), take.LocalTimeSpan.GetStop().GetFrame()) for take in takes]
+	for start, stop in spans:
+		if blend_frames > stop - start:
+			raise ValueError("blend_frames is longer than a take")
+	positions = [start_frame]
+	for start, stop in spans[:-1]:
+		positions.append(positions[-1] + stop - start - blend_frames)
+	end_frame = positions[-1] + spans[-1][1] - spans[-1][0]
+	blend = np.arange(blend_frames + 1)
+	weights = blend / float(blend_frames) if blend_frames else blend
+	weights = weights * weights * (3.0 - 2.0 * weights)
+
+	# [take][leaf] -> (frames, values, head values, tail values), frames already offset
+	segments = []
+	for idx, take in enumerate(takes):
+		start, stop = spans[idx]
+		offset = positions[idx] - start
+		last = positions[idx + 1] if idx + 1 < len(takes) else end_frame + 1
+		segment = []
+		for model in models:
+			for leaf in _take_leaves(model, take):
+				curve = leaf.FCurve
+				keys = curve.Keys
+				_trace_count(len(keys) + 1, 1)
+				if not len(keys):
+					segment.append(None)
+					continue
+				# one pass over the keys, time and value side by side
+				pairs = np.array([(key.Time.Get(), key.Value) for key in keys], dtype = np.float64)
+				frames = ticks_to_frames(pairs[:, 0].astype(np.int64)) + offset
+				values = pairs[:, 1]
+				# a key on the first frame of a take wins over the last key of the previous one
+				inside = (frames >= positions[idx]) & (frames < last)
+				head = tail = None
+				if blend_frames:
+					if idx:
+						head = np.array([curve.Evaluate(frame_time) for frame_time in (frame_to_time(start + frame) for frame in blend.tolist())])
+					if idx + 1 < len(takes):
+						tail = np.array([curve.Evaluate(frame_time) for frame_time in (frame_to_time(stop - blend_frames + frame) for frame in blend.tolist())])
+				segment.append((frames[inside], values[inside], head, tail))
+		segments.append(segment)
+
+	new_take = FBTake(new_take_name)
+	lScene.Takes.append(new_take)
+	new_take.LocalTimeSpan = FBTimeSpan(frame_to_time(start_frame), frame_to_time(end_frame))
+	_trace_count(2)
+	# same leaves in the same order as the reads, the animated properties are shared by all takes
+	leaves = []
+	for model in models:
+		_take_leaves(model, new_take, leaves)
+
+	interpolation = _INTERPOLATIONS["cubic"]
+	tangent = _TANGENT_MODES["auto"]
+	count = 0
+	for jdx, leaf in enumerate(leaves):
+		frames = []
+		values = []
+		for idx in range(len(takes)):
+			part = segments[idx][jdx]
+			if part is None:
+				continue
+			if idx and blend_frames:
+				# cross-fade with the previous take, kept as is when one of them has no keys
+				previous = segments[idx - 1][jdx]
+				if previous is not None:
+					frames.append(positions[idx] + blend)
+					values.append(previous[3] * (1.0 - weights) + part[2] * weights)
+					after = part[0] > positions[idx] + blend_frames
+					frames.append(part[0][after])
+					values.append(part[1][after])
+					continue
+			frames.append(part[0])
+			values.append(part[1])
+		if not frames:
+			continue
+		frames = np.concatenate(frames)
+		values = np.concatenate(values)
+		order = np.argsort(frames, kind = "mergesort")
+		_write_curves([leaf.FCurve], frames_to_ticks(frames[order]), values[order][:, None], interpolation, tangent, False)
+		count += len(frames)
+	invalidate_take_cache(new_take_name)
+
+	if log:
+		print("{} takes concatenated in {} (frames {} to {}), {} keys on {} curves".format(len(takes), new_take_name, start_frame, end_frame, count, len(leaves)))
+
+	return new_take
+
+
+########## JOBS ##########
+
+def _run_steps(steps):
+	# run all steps of a resumable operation at once
+	for _ in steps:
+		pass
+
+class Job(object):
+	''' Resumable operation: a generator of steps yielding its progress (0 to 1, or None) '''
+
+	PENDING = "pending"
+	RUNNING = "running"
+	PAUSED = "paused"
+	DONE = "done"
+	CANCELLED = "cancelled"
+	FAILED = "failed"
+
+	def __init__(self, name, steps):
+		self.name = name
+		self.status = Job.PENDING
+		self.progress = 0.0
+		self.steps = 0
+		self.elapsed = 0.0
+		self.error = None
+		self._steps = iter(steps)
+
+	def pause(self):
+		if self.status in (Job.PENDING, Job.RUNNING):
+			self.status = Job.PAUSED
+
+	def resume(self):
+		if self.status == Job.PAUSED:
+			self.status = Job.RUNNING
+
+	def cancel(self):
+		if self.status in (Job.PENDING, Job.RUNNING, Job.PAUSED):
+			self.status = Job.CANCELLED
+			# let the generator run its cleanup (finally blocks)
+			if hasattr(self._steps, 'close'):
+				self._steps.close()
+
+	@property
+	def finished(self):
+		return self.status in (Job.DONE, Job.CANCELLED, Job.FAILED)
+
+	def step(self):
+		''' Run one step, returns False once the job is finished '''
+
+		if self.finished or self.status == Job.PAUSED:
+			return not self.finished
+		self.status = Job.RUNNING
+		start = _clock()
+		try:
+			progress = next(self._steps)
+		except StopIteration:
+			self.status = Job.DONE
+			self.progress = 1.0
+		except Exception as error:
+			self.status = Job.FAILED
+			self.error = error
+		else:
+			self.steps += 1
+			if progress is not None:
+				self.progress = float(progress)
+		self.elapsed += _clock() - start
+		return not self.finished
+
+	def __repr__(self):
+		return "<Job {} {} {:.0%}>".format(self.name, self.status, self.progress)
+
+class JobQueue(object):
+	''' Jobs run one after the other from the UI idle callback, within a time budget per tick '''
+
+	def __init__(self, budget = 0.02):
+		self.budget = budget
+		self.jobs = []
+		self._running = False
+
+	def submit(self, name, steps):
+		''' Queue a generator of steps, returns its Job '''
+
+		job = Job(name, steps)
+		self.jobs.append(job)
+		self.start()
+		return job
+
+	def start(self):
+		''' Register the idle callback '''
+
+		if not self._running:
+			lSys.OnUIIdle.Add(self._on_idle)
+			self._running = True
+
+	def stop(self):
+		''' Unregister the idle callback, pending jobs are kept '''
+
+		if self._running:
+			lSys.OnUIIdle.Remove(self._on_idle)
+			self._running = False
+
+	def tick(self):
+		''' Run steps of the first runnable job until the time budget is spent '''
+
+		start = _clock()
+		while _clock() - start < self.budget:
+			job = next((job for job in self.jobs if not job.finished and job.status != Job.PAUSED), None)
+			if job is None:
+				break
+			job.step()
+			if job.status == Job.FAILED:
+				print("ERROR, job {} failed: {}".format(job.name, job.error))
+
+		# forget finished jobs, stop listening once nothing is left to run
+		self.jobs = [job for job in self.jobs if not job.finished]
+		if not self.jobs:
+			self.stop()
+
+	def _on_idle(self, control, event):
+		self.tick()
+
+	def cancel_all(self):
+		for job in self.jobs:
+			job.cancel()
+
+	def pause_all(self):
+		for job in self.jobs:
+			job.pause()
+
+	def resume_all(self):
+		for job in self.jobs:
+			job.resume()
+
+# queue used by run_in_background()
+job_queue = JobQueue()
+
+@traced
+def run_in_background(steps, name = None, log = False):
+	''' Run a resumable operation (iter_build_review(), iter_plot_to_take()...) from the UI idle callback '''
+
+	if name is None:
+		name = getattr(steps, '__name__', 'job')
+	job = job_queue.submit(name, steps)
+
+	if log:
+		print("Job {} queued ({} in queue)".format(name, len(job_queue.jobs)))
+
+	return job
+
+@traced
+def get_jobs(log = False):
+	''' Returns the queued jobs with their status and progress '''
+
+	if log:
+		for job in job_queue.jobs:
+			print("{:<32}{:<12}{:>6.0%}".format(job.name, job.status, job.progress))
+
+	return list(job_queue.jobs)
+
+
+########## PIPELINE ##########
+
+# journal entry marking a file as fully processed
+_PIPELINE_FILE_DONE = "__file__"
+
+# lock shared by the worker processes to append to the checkpoint journal
+_pipeline_lock = [None]
+
+def _pipeline_stage_spec(stage):
+	# "name" or ("name", {kwargs}) -> (name, kwargs)
+	if isinstance(stage, (tuple, list)):
+		name, kwargs = stage[0], dict(stage[1]) if len(stage) > 1 else {}
+	else:
+		name, kwargs = stage, {}
+	if not callable(globals().get(name)):
+		raise ValueError("{} is not a library function".format(name))
+	return name, kwargs
+
+def _pipeline_format(value, path):
+	# replace {path}, {dir} and {name} in string arguments
+	if not isinstance(value, str):
+		return value
+	return value.format(path = path, dir = os.path.dirname(path), name = os.path.splitext(os.path.basename(path))[0])
+
+def _pipeline_journal(checkpoint_path, entry):
+	# append one line to the checkpoint journal
+	if not checkpoint_path:
+		return
+	lock = _pipeline_lock[0]
+	if lock is not None:
+		lock.acquire()
+	try:
+		with open(checkpoint_path, 'a') as f:
+			f.write(json.dumps(entry) + "\n")
+			f.flush()
+			os.fsync(f.fileno())
+	finally:
+		if lock is not None:
+			lock.release()
+
+def _pipeline_worker_init(lock):
+	_pipeline_lock[0] = lock
+
+def _pipeline_stages_hash(stages):
+	# identifies a stage list in the journal, a rerun with other stages or arguments processes the files again
+	import hashlib
+	return hashlib.sha1(json.dumps(stages, sort_keys = True, default = str).encode("utf-8")).hexdigest()[:16]
+
+def _pipeline_process_file(task):
+	# open a file and run all stages on it, returns [(stage, seconds, error)]
+	path, stages, checkpoint_path, stages_hash = task
+	results = []
+
+	for name, kwargs in [("open", None)] + stages:
+		start = _clock()
+		error = None
+		try:
+			if kwargs is None:
+				lApp.FileOpen(path, False)
+			else:
+				globals()[name](**dict((key, _pipeline_format(value, path)) for key, value in kwargs.items()))
+		except Exception as e:
+			error = "{}: {}".format(type(e).__name__, e)
+		elapsed = _clock() - start
+		results.append((name, elapsed, error))
+		_pipeline_journal(checkpoint_path, {"file": path, "stage": name, "stages": stages_hash, "seconds": elapsed, "status": "failed" if error else "done", "error": error})
+		if error:
+			return path, results
+
+	_pipeline_journal(checkpoint_path, {"file": path, "stage": _PIPELINE_FILE_DONE, "stages": stages_hash, "status": "done"})
+	return path, results
+
+@traced
+def read_pipeline_checkpoint(checkpoint_path, stages_hash = None, log = False):
+	''' Returns {file: [done stages]} from a checkpoint journal, fully processed files contain "__file__" '''
+
+	# with stages_hash only the entries written by a run of the same stage list are read
+
+	done = {}
+	if checkpoint_path and os.path.exists(checkpoint_path):
+		with open(checkpoint_path) as f:
+			for line in f:
+				try:
+					entry = json.loads(line)
+				except ValueError:
+					# last line of an interrupted write
+					continue
+				if entry.get("status") == "done" and (stages_hash is None or entry.get("stages") == stages_hash):
+					done.setdefault(entry["file"], []).append(entry["stage"])
+
+	if log:
+		finished = [path for path, stages in done.items() if _PIPELINE_FILE_DONE in stages]
+		print("{} files processed, {} started".format(len(finished), len(done)))
+
+	return done
+
+@traced
+def run_pipeline(files, stages, checkpoint_path = None, workers = 1, executable = None, log = False):
+	''' Run library functions as stages on each file (or each .fbx of a folder), in parallel and resumable '''
+
+	# stages are "function_name" or ("function_name", {kwargs}), string kwargs can use {path}, {dir} and {name}
+	# every stage is journaled in checkpoint_path, a rerun with the same stages skips the files already processed
+	import multiprocessing
+
+	if isinstance(files, str) and os.path.isdir(files):
+		files = sorted(os.path.join(files, f) for f in os.listdir(files) if f.lower().endswith(".fbx"))
+	stages = [_pipeline_stage_spec(stage) for stage in stages]
+
+	# files fully processed by a previous run are skipped, interrupted ones restart from their first stage
+	# (the scene state between two stages is not saved)
+	stages_hash = _pipeline_stages_hash(stages)
+	done = read_pipeline_checkpoint(checkpoint_path, stages_hash)
+	todo = [path for path in files if _PIPELINE_FILE_DONE not in done.get(path, ())]
+	if log:
+		print("Pipeline: {} files, {} already processed, {} workers".format(len(files), len(files) - len(todo), workers))
+
+	tasks = [(path, stages, checkpoint_path, stages_hash) for path in todo]
+	stats = dict((name, {"files": 0, "failed": 0, "seconds": 0.0}) for name in ["open"] + [name for name, _ in stages])
+	failed = []
+	start = _clock()
+
+	if workers > 1 and len(tasks) > 1:
+		# MotionBuilder embeds python, workers must run a standalone interpreter (mobupy)
+		if executable:
+			multiprocessing.set_executable(executable)
+		lock = multiprocessing.Lock()
+		pool = multiprocessing.Pool(workers, _pipeline_worker_init, (lock,))
+		try:
+			results = pool.imap_unordered(_pipeline_process_file, tasks)
+			for path, file_results in results:
+				_pipeline_stats(stats, failed, path, file_results, log)
+		finally:
+			pool.close()
+			pool.join()
+	else:
+		for task in tasks:
+			path, file_results = _pipeline_process_file(task)
+			_pipeline_stats(stats, failed, path, file_results, log)
+
+	elapsed = _clock() - start
+	# throughput over the wall clock time, the stage seconds are summed over the workers
+	for stage in stats.values():
+		stage["files_per_second"] = stage["files"] / elapsed if elapsed else 0.0
+
+	if log:
+		print("{:<36}{:>8}{:>8}{:>12}{:>12}".format("stage", "files", "failed", "cpu seconds", "files/s"))
+		for name in ["open"] + [name for name, _ in stages]:
+			stage = stats[name]
+			print("{:<36}{:>8}{:>8}{:>12.2f}{:>12.2f}".format(name, stage["files"], stage["failed"], stage["seconds"], stage["files_per_second"]))
+		print("{} files in {:.2f} s ({:.2f} files/s), {} failed".format(len(tasks), elapsed, len(tasks) / elapsed if elapsed else 0.0, len(failed)))
+
+	return {"stages": stats, "files": len(tasks), "skipped": len(files) - len(todo), "failed": failed, "seconds": elapsed, "files_per_second": len(tasks) / elapsed if elapsed else 0.0}
+
+def _pipeline_stats(stats, failed, path, file_results, log):
+	# accumulate the stage timings of one file
+	for name, seconds, error in file_results:
+		stage = stats[name]
+		stage["seconds"] += seconds
+		if error:
+			stage["failed"] += 1
+			failed.append((path, name, error))
+			if log:
+				print("ERROR, {} failed on {}: {}".format(name, path, error))
+		else:
+			stage["files"] += 1
+
+
+########## SCENE CENSUS ##########
+
+# rough memory cost in bytes, used to rank namespaces, takes and types (not an exact measure)
+_CENSUS_BYTES_PER_OBJECT = {"FBModelSkeleton": 1536, "FBModelNull": 1024, "FBModel": 2048, "FBCharacter": 65536, "FBTake": 4096}
+_CENSUS_BYTES_DEFAULT = 1024
+_CENSUS_BYTES_PER_FCURVE = 256
+_CENSUS_BYTES_PER_KEY = 64
+_CENSUS_BYTES_PER_VERTEX = 48
+
+def _census_leaves(node, leaves):
+	# collect the animation nodes holding an FCurve
+	for child in node.Nodes:
+		if child.FCurve is not None:
+			leaves.append(child)
+		else:
+			_census_leaves(child, leaves)
+
+def _census_is_orphan_constraint(constraint):
+	return not any(constraint.ReferenceGetCount(group) for group in range(constraint.ReferenceGroupGetCount()))
+
+def _census_is_orphan_material(material):
+	return not any(isinstance(material.GetDst(idx), FBModel) for idx in range(material.GetDstCount()))
+
+@traced
+def get_scene_census(all_takes = False, log = False):
+	''' Count objects per collection, type and namespace, FCurves and keys per take and character, orphans and memory '''
+
+	# FCurves of each take are read through GetAnimationNode(take) (_take_leaves),
+	# the current take is left alone when all_takes is set
+
+	collections = {}
+	types = {}
+	namespaces = {}
+	characters = {}
+	orphaned_constraints = []
+	orphaned_materials = []
+	object_bytes = 0
+	geometry_bytes = 0
+
+	# long name of the models linked to each character (SDK wrappers are not the same python objects from one access to the next)
+	model_character = {}
+	for character in _trace_iter(lScene.Characters):
+		characters[character.Name] = {"models": 0, "fcurves": 0, "keys": 0, "bytes": 0}
+		for prop in character.PropertyList:
+			if prop.Name.endswith("Link") and len(prop):
+				model_character[prop[0].LongName] = character.Name
+				characters[character.Name]["models"] += 1
+
+	# animated models with the stats of their namespace and character
+	curve_owners = []
+
+	for name, collection in _scene_collections():
+		collections[name] = len(collection)
+
+	# single pass: every component is in Components
+	for comp in _trace_iter(lScene.Components):
+		type_name = type(comp).__name__
+		types[type_name] = types.get(type_name, 0) + 1
+		namespace = comp.LongName.rpartition(':')[0]
+		ns_stats = namespaces.get(namespace)
+		if ns_stats is None:
+			ns_stats = namespaces[namespace] = {"objects": 0, "fcurves": 0, "keys": 0, "bytes": 0}
+		ns_stats["objects"] += 1
+		size = _CENSUS_BYTES_PER_OBJECT.get(type_name, _CENSUS_BYTES_DEFAULT)
+
+		if isinstance(comp, FBModel):
+			geometry = getattr(comp, "Geometry", None)
+			if geometry is not None:
+				vertices = geometry.VertexCount() * _CENSUS_BYTES_PER_VERTEX
+				size += vertices
+				geometry_bytes += vertices
+			if comp.AnimationNode.Nodes:
+				curve_owners.append((comp, ns_stats, characters.get(model_character.get(comp.LongName))))
+		elif isinstance(comp, FBConstraint):
+			if _census_is_orphan_constraint(comp):
+				orphaned_constraints.append(comp.LongName)
+		elif isinstance(comp, FBMaterial):
+			if _census_is_orphan_material(comp):
+				orphaned_materials.append(comp.LongName)
+
+		ns_stats["bytes"] += size
+		object_bytes += size
+
+	# keys of each take, attributed to the model namespace and character
+	takes = {}
+	take_list = list(_trace_iter(lScene.Takes)) if all_takes else [lSys.CurrentTake]
+	for take in take_list:
+		take_stats = takes[take.Name] = {"fcurves": 0, "keys": 0, "bytes": 0}
+		for model, ns_stats, char_stats in curve_owners:
+			leaves = _take_leaves(model, take)
+			keys = 0
+			for leaf in leaves:
+				keys += len(leaf.FCurve.Keys)
+			_trace_count(len(leaves), len(leaves))
+			size = len(leaves) * _CENSUS_BYTES_PER_FCURVE + keys * _CENSUS_BYTES_PER_KEY
+			for stats in (take_stats, ns_stats, char_stats):
+				if stats is not None:
+					stats["fcurves"] += len(leaves)
+					stats["keys"] += keys
+					stats["bytes"] += size
+
+	animation_bytes = sum(stats["bytes"] for stats in takes.values())
+	census = {
+		"collections": collections,
+		"types": types,
+		"namespaces": namespaces,
+		"takes": takes,
+		"characters": characters,
+		"orphaned_constraints": orphaned_constraints,
+		"orphaned_materials": orphaned_materials,
+		"bytes": {"objects": object_bytes, "geometry": geometry_bytes, "animation": animation_bytes, "total": object_bytes + animation_bytes},
+	}
+
+	if log:
+		_print_census(census)
+
+	return census
+
+def _print_census(census):
+	mb = 1024.0 * 1024.0
+	print("Scene census: {:.1f} MB estimated ({:.1f} MB animation)".format(census["bytes"]["total"] / mb, census["bytes"]["animation"] / mb))
+	for title in ("namespaces", "takes", "characters"):
+		print("-- {} --".format(title))
+		for name, stats in sorted(census[title].items(), key = lambda item: -item[1]["bytes"]):
+			print("{:<32}{:>10} keys{:>10.2f} MB".format(name or "(no namespace)", stats["keys"], stats["bytes"] / mb))
+	print("-- types --")
+	for name, count in sorted(census["types"].items(), key = lambda item: -item[1]):
+		print("{:<32}{:>10}".format(name, count))
+	print("Orphaned constraints: {}".format(len(census["orphaned_constraints"])))
+	print("Orphaned materials: {}".format(len(census["orphaned_materials"])))
+
+def _census_delta(before, after):
+	# numeric difference of two nested dicts, entries without change are dropped
+	delta = {}
+	for key in set(before) | set(after):
+		old, new = before.get(key), after.get(key)
+		if isinstance(old, dict) or isinstance(new, dict):
+			sub = _census_delta(old or {}, new or {})
+			if sub:
+				delta[key] = sub
+		elif isinstance(old, list) or isinstance(new, list):
+			added = sorted(set(new or []) - set(old or []))
+			removed = sorted(set(old or []) - set(new or []))
+			if added or removed:
+				delta[key] = {"added": added, "removed": removed}
+		elif (new or 0) != (old or 0):
+			delta[key] = (new or 0) - (old or 0)
+	return delta
+
+@traced
+def diff_scene_census(before, after, log = False):
+	''' Returns the differences between two censuses (after - before), largest growth printed first '''
+
+	delta = _census_delta(before, after)
+
+	if log:
+		mb = 1024.0 * 1024.0
+		print("Total: {:+.2f} MB".format(delta.get("bytes", {}).get("total", 0) / mb))
+		for title in ("namespaces", "takes", "characters"):
+			for name, stats in sorted(delta.get(title, {}).items(), key = lambda item: -abs(item[1].get("bytes", 0))):
+				print("{:<12}{:<32}{:>+10} keys{:>+10.2f} MB".format(title[:-1], name or "(no namespace)", stats.get("keys", 0), stats.get("bytes", 0) / mb))
+
+	return delta
+
+
+########## MOTION COMPARISON ##########
+
+def fbmatrices_to_array(matrices):
+	''' List of FBMatrix (column major) to a (N, 4, 4) row major float array '''
+
+	_require_numpy()
+	return np.array([list(matrix) for matrix in matrices], dtype = np.float64).reshape(-1, 4, 4).transpose(0, 2, 1)
+
+def euler_to_matrices(rotations):
+	''' Array of XYZ euler rotations in degrees (..., 3) to rotation matrices (..., 3, 3), MotionBuilder default order '''
+
+	_require_numpy()
+	r = np.radians(np.asarray(rotations, dtype = np.float64))
+	cx, cy, cz = np.cos(r[..., 0]), np.cos(r[..., 1]), np.cos(r[..., 2])
+	sx, sy, sz = np.sin(r[..., 0]), np.sin(r[..., 1]), np.sin(r[..., 2])
+	out = np.empty(r.shape[:-1] + (3, 3))
+	# Rz * Ry * Rx
+	out[..., 0, 0] = cz * cy
+	out[..., 0, 1] = cz * sy * sx - sz * cx
+	out[..., 0, 2] = cz * sy * cx + sz * sx
+	out[..., 1, 0] = sz * cy
+	out[..., 1, 1] = sz * sy * sx + cz * cx
+	out[..., 1, 2] = sz * sy * cx - cz * sx
+	out[..., 2, 0] = -sy
+	out[..., 2, 1] = cy * sx
+	out[..., 2, 2] = cy * cx
+	return out
+
+def matrices_to_euler(matrices):
+	''' Rotation matrices (..., 3, 3) or transforms (..., 4, 4) to XYZ euler rotations in degrees (..., 3) '''
+
+	_require_numpy()
+	m = _rotation_part(matrices)
+	sy = -np.clip(m[..., 2, 0], -1.0, 1.0)
+	gimbal = np.abs(sy) > 0.9999999
+	rx = np.where(gimbal, np.arctan2(-m[..., 1, 2], m[..., 1, 1]), np.arctan2(m[..., 2, 1], m[..., 2, 2]))
+	rz = np.where(gimbal, 0.0, np.arctan2(m[..., 1, 0], m[..., 0, 0]))
+	return np.degrees(np.stack([rx, np.arcsin(sy), rz], axis = -1))
+
+def _rotation_part(matrices):
+	# upper 3x3 with the scale removed from each column
+	m = np.asarray(matrices, dtype = np.float64)[..., :3, :3]
+	norms = np.linalg.norm(m, axis = -2, keepdims = True)
+	return m / np.where(norms == 0.0, 1.0, norms)
+
+def rotation_angles(a, b):
+	''' Angle in degrees between two arrays of rotation matrices or transforms (..., 3, 3) / (..., 4, 4) '''
+
+	_require_numpy()
+	ra, rb = _rotation_part(a), _rotation_part(b)
+	# trace of ra^T * rb without building the product
+	trace = np.einsum('...ij,...ij->...', ra, rb)
+	return np.degrees(np.arccos(np.clip((trace - 1.0) * 0.5, -1.0, 1.0)))
+
+def _sample_take_matrices(joints, take, start = None, stop = None):
+	# global matrices (frames, joints, 4, 4) of the joints on a take, one evaluation per frame
+	# FCurves and transforms are only evaluated on the current take: switch and restore it
+	# (takes compared by name, CurrentTake returns a new wrapper on each read)
+	current_take = lSys.CurrentTake
+	switch = take.Name != current_take.Name
+	try:
+		if switch:
+			lSys.CurrentTake = take
+			_trace_count()
+		return sample_global_matrices(joints, start, stop)
+	finally:
+		if switch:
+			lSys.CurrentTake = current_take
+
+@traced
+def sample_take_motion(takeName = None, joints = None, start = None, stop = None, log = False):
+	''' Sample the global matrices of the joints (get_joint_list by default) on a take, current one if not given '''
+
+	# returns {"take", "names", "frames", "matrices" (frames, joints, 4, 4)}
+	_require_numpy()
+	take = lSys.CurrentTake
+	if takeName:
+		take = next((take for take in lScene.Takes if take.Name == takeName), None)
+	if take is None:
+		raise ValueError("Take {} does not exist".format(takeName))
+	joints = get_joint_list() if joints is None else list(joints)
+	frames, matrices = _sample_take_matrices(joints, take, start, stop)
+
+	if log:
+		print("{} joints sampled on {} frames of {}".format(len(joints), len(frames), take.Name))
+
+	return {"take": take.Name, "names": [joint.LongName for joint in joints], "frames": frames, "matrices": matrices}
+
+@traced
+def save_motion_bake(path, motion, log = False):
+	''' Save sampled motion (see sample_take_motion) to a .npz bake, reloaded with load_motion_bake '''
+
+	_require_numpy()
+	np.savez_compressed(path, take = np.array(motion["take"]), names = np.array(motion["names"]), frames = motion["frames"], matrices = motion["matrices"])
+
+	if log:
+		print("Motion bake saved here: {}".format(path))
+
+@traced
+def load_motion_bake(path, log = False):
+	''' Load a .npz bake saved by save_motion_bake '''
+
+	_require_numpy()
+	with np.load(path) as data:
+		motion = {"take": str(data["take"]), "names": [str(name) for name in data["names"]], "frames": data["frames"], "matrices": data["matrices"]}
+
+	if log:
+		print("{} joints on {} frames loaded from {}".format(len(motion["names"]), len(motion["frames"]), path))
+
+	return motion
+
+def _motion_key(source):
+	# cache key of a motion source, None for sampled motion dicts (never cached)
+	if isinstance(source, dict):
+		return None
+	return source.Name if isinstance(source, FBTake) else source
+
+def _motion_name(source):
+	# name of a motion source in the batch results: take name, bake path or sampled take name
+	if isinstance(source, dict):
+		return source["take"]
+	return source.Name if isinstance(source, FBTake) else source
+
+def _motion_source(source, joints, cache):
+	# take name, FBTake, .npz bake path or sampled motion dict -> sampled motion
+	key = _motion_key(source)
+	if key is None:
+		return source
+	if key not in cache:
+		if key.lower().endswith(".npz"):
+			cache[key] = load_motion_bake(key)
+		else:
+			cache[key] = sample_take_motion(key, joints)
+	return cache[key]
+
+@traced
+def compare_motion(reference, candidate, joints = None, position_threshold = 0.1, rotation_threshold = 0.5, log = False, _cache = None):
+	''' Per-joint, per-frame position and rotation error between two takes, bakes (.npz) or sampled motions '''
+
+	# joints are matched by name and frames by number, errors are in scene units and degrees
+	# returns max/RMS per joint and overall, and the frames where a threshold is exceeded
+	_require_numpy()
+	cache = {} if _cache is None else _cache
+	if joints is None and not (isinstance(reference, dict) and isinstance(candidate, dict)):
+		joints = get_joint_list()
+	ref = _motion_source(reference, joints, cache)
+	cand = _motion_source(candidate, joints, cache)
+
+	cand_index = dict((name, idx) for idx, name in enumerate(cand["names"]))
+	ref_joints = [idx for idx, name in enumerate(ref["names"]) if name in cand_index]
+	names = [ref["names"][idx] for idx in ref_joints]
+	cand_joints = [cand_index[name] for name in names]
+	frames, ref_frames, cand_frames = np.intersect1d(ref["frames"], cand["frames"], return_indices = True)
+
+	a = ref["matrices"][ref_frames][:, ref_joints]
+	b = cand["matrices"][cand_frames][:, cand_joints]
+	position = np.linalg.norm(a[..., :3, 3] - b[..., :3, 3], axis = -1)
+	rotation = rotation_angles(a, b)
+
+	over = (position > position_threshold) | (rotation > rotation_threshold)
+	result = {
+		"frames": frames,
+		"names": names,
+		"position_error": position,
+		"rotation_error": rotation,
+		"position_max": float(position.max()) if position.size else 0.0,
+		"position_rms": float(np.sqrt(np.mean(position ** 2))) if position.size else 0.0,
+		"rotation_max": float(rotation.max()) if rotation.size else 0.0,
+		"rotation_rms": float(np.sqrt(np.mean(rotation ** 2))) if rotation.size else 0.0,
+		"frames_over": frames[over.any(axis = 1)],
+		"joints": dict((name, {
+			"position_max": float(position[:, idx].max()) if len(frames) else 0.0,
+			"position_rms": float(np.sqrt(np.mean(position[:, idx] ** 2))) if len(frames) else 0.0,
+			"rotation_max": float(rotation[:, idx].max()) if len(frames) else 0.0,
+			"rotation_rms": float(np.sqrt(np.mean(rotation[:, idx] ** 2))) if len(frames) else 0.0,
+			"frames_over": int(over[:, idx].sum()),
+		}) for idx, name in enumerate(names)),
+	}
+
+	if log:
+		print("{} vs {}: {} joints, {} frames".format(ref["take"], cand["take"], len(names), len(frames)))
+		print("position max {:.4f} rms {:.4f}, rotation max {:.4f} rms {:.4f}, {} frames over threshold".format(result["position_max"], result["position_rms"], result["rotation_max"], result["rotation_rms"], len(result["frames_over"])))
+
+	return result
+
+@traced
+def compare_motion_batch(pairs, joints = None, position_threshold = 0.1, rotation_threshold = 0.5, log = False):
+	''' Compare many (reference, candidate) pairs, each take or bake is sampled once for the whole batch '''
+
+	# returns {(reference, candidate): result} without the per-frame error arrays, and the failing pairs:
+	# over a threshold, or not comparable (missing take or bake) with {"error": message} as result
+	# a sampled source is dropped from the cache after its last pair, so only the sources still needed stay in memory
+	_require_numpy()
+	if joints is None:
+		joints = get_joint_list()
+	pairs = list(pairs)
+	remaining = {}
+	for pair in pairs:
+		for source in pair:
+			source_key = _motion_key(source)
+			if source_key is not None:
+				remaining[source_key] = remaining.get(source_key, 0) + 1
+	cache = {}
+	results = {}
+	failed = []
+
+	for reference, candidate in pairs:
+		key = (_motion_name(reference), _motion_name(candidate))
+		try:
+			result = compare_motion(reference, candidate, joints, position_threshold, rotation_threshold, _cache = cache)
+		except (ValueError, KeyError, IOError, OSError) as error:
+			results[key] = {"error": str(error)}
+			failed.append(key)
+			if log:
+				print("{:<32}{:<32}{}".format(key[0], key[1], error))
+			continue
+		finally:
+			for source in (reference, candidate):
+				source_key = _motion_key(source)
+				if source_key is not None:
+					remaining[source_key] -= 1
+					if not remaining[source_key]:
+						cache.pop(source_key, None)
+		del result["position_error"], result["rotation_error"]
+		results[key] = result
+		if len(result["frames_over"]):
+			failed.append(key)
+		if log:
+			print("{:<32}{:<32}{:>10.4f}{:>10.4f}{:>8}".format(key[0], key[1], result["position_max"], result["rotation_max"], len(result["frames_over"])))
+
+	if log:
+		print("{} pairs compared, {} over threshold".format(len(results), len(failed)))
+
+	return results, failed
+
+
+########## SNAPSHOTS ##########
+
+class SceneSnapshot(object):
+	''' Scene state in parallel arrays, one entry per component (no SDK object is kept) '''
+
+	# names: LongName, types: class name, parents: index of the parent model (-1 if none),
+	# namespaces, selected (bool array), transforms: local translation, rotation and scaling
+	# (N x 9 float array, NaN for components that are not models), time: clock of the capture
+	__slots__ = ("names", "types", "parents", "namespaces", "selected", "transforms", "time", "_index")
+
+	def __init__(self, names, types, parents, namespaces, selected, transforms, time = None):
+		self.names = names
+		self.types = types
+		self.parents = parents
+		self.namespaces = namespaces
+		self.selected = selected
+		self.transforms = transforms
+		self.time = _clock() if time is None else time
+		self._index = None
+
+	def __len__(self):
+		return len(self.names)
+
+	def index(self, name):
+		''' Index of a component LongName, -1 if not in the snapshot '''
+
+		if self._index is None:
+			self._index = dict((name, idx) for idx, name in enumerate(self.names))
+		return self._index.get(name, -1)
+
+	def parent_names(self):
+		''' LongName of the parent of each entry, "" if none '''
+
+		return [self.names[idx] if idx >= 0 else "" for idx in self.parents.tolist()]
+
+	def get(self, name):
+		''' {"type", "parent", "namespace", "selected", "transform"} of a component, None if not in the snapshot '''
+
+		idx = self.index(name)
+		if idx < 0:
+			return None
+		parent = int(self.parents[idx])
+		return {"type": self.types[idx], "parent": self.names[parent] if parent >= 0 else None, "namespace": self.namespaces[idx], "selected": bool(self.selected[idx]), "transform": self.transforms[idx].tolist()}
+
+@traced
+def take_scene_snapshot(log = False):
+	''' Capture names, types, hierarchy, namespaces, selection and local transforms of all scene components '''
+
+	_require_numpy()
+	comps = list(_trace_iter(lScene.Components))
+	count = len(comps)
+	# model LongName -> index and entry index -> parent LongName, parents are resolved after the walk
+	index = {}
+	parent_names = {}
+	names = []
+	types = []
+	namespaces = []
+	parents = np.full(count, -1, dtype = np.int64)
+	selected = np.zeros(count, dtype = bool)
+	transforms = np.full((count, 9), np.nan)
+
+	for idx, comp in enumerate(comps):
+		name = comp.LongName
+		names.append(name)
+		types.append(type(comp).__name__)
+		namespaces.append(name.rpartition(':')[0])
+		selected[idx] = comp.Selected
+		if isinstance(comp, FBModel):
+			index[name] = idx
+			parent = comp.Parent
+			if parent is not None:
+				parent_names[idx] = parent.LongName
+			transforms[idx, 0:3] = comp.Translation.Data
+			transforms[idx, 3:6] = comp.Rotation.Data
+			transforms[idx, 6:9] = comp.Scaling.Data
+			_trace_count(5, 0)
+		else:
+			_trace_count(2, 0)
+	for idx, parent_name in parent_names.items():
+		parents[idx] = index.get(parent_name, -1)
+
+	snapshot = SceneSnapshot(names, types, parents, namespaces, selected, transforms)
+
+	if log:
+		print("Snapshot of {} components ({} models)".format(count, int(np.count_nonzero(~np.isnan(transforms[:, 0])))))
+
+	return snapshot
+
+@traced
+def diff_scene_snapshots(before, after, tolerance = 1e-4, log = False):
+	''' Components added, removed, reparented, moved, selected and deselected between two snapshots '''
+
+	# components are matched by LongName, moved means a local transform value changed by more than tolerance
+	_require_numpy()
+	after_index = dict((name, idx) for idx, name in enumerate(after.names))
+	before_set = set(before.names)
+	common_before = [idx for idx, name in enumerate(before.names) if name in after_index]
+	common_after = [after_index[before.names[idx]] for idx in common_before]
+	common = [before.names[idx] for idx in common_before]
+
+	before_parents = before.parent_names()
+	after_parents = after.parent_names()
+	delta = np.abs(after.transforms[common_after] - before.transforms[common_before])
+	# NaN (not a model) on both sides is no change
+	moved = np.nan_to_num(delta).max(axis = 1) > tolerance if len(common) else np.zeros(0, dtype = bool)
+	was_selected = before.selected[common_before]
+	is_selected = after.selected[common_after]
+
+	diff = {
+		"added": [name for name in after.names if name not in before_set],
+		"removed": [name for name in before.names if name not in after_index],
+		"reparented": [(name, before_parents[b] or None, after_parents[a] or None) for name, b, a in zip(common, common_before, common_after) if before_parents[b] != after_parents[a]],
+		"moved": [common[idx] for idx in np.flatnonzero(moved).tolist()],
+		"selected": [common[idx] for idx in np.flatnonzero(is_selected & ~was_selected).tolist()],
+		"deselected": [common[idx] for idx in np.flatnonzero(was_selected & ~is_selected).tolist()],
+	}
+
+	if log:
+		for key in ("added", "removed", "moved", "selected", "deselected"):
+			print("{}: {}".format(key, len(diff[key])))
+		print("reparented: {}".format(len(diff["reparented"])))
+		for name, old, new in diff["reparented"]:
+			print("    {}: {} -> {}".format(name, old, new))
+
+	return diff
+
+
+########## TAKE DEDUPE ##########
+
+# take name -> fingerprint {"exact", "curves", "profile", "stamp", "precision"}, dropped by invalidate_take_cache
+_take_hash_cache = {}
+
+# values sampled per curve, evenly over the take span, for the near duplicate comparison
+_PROFILE_SAMPLES = 16
+
+def _fingerprint_take(take, curves, precision):
+	# exact hash of the quantized keys and a fixed size profile per curve, sampled by time over the take span
+	import hashlib
+	digest = hashlib.sha1()
+	curve_ids = []
+	profiles = []
+	span = take.LocalTimeSpan
+	start, stop = span.GetStart().Get(), span.GetStop().Get()
+	sample_times = [FBTime(int(tick)) for tick in np.linspace(start, stop, _PROFILE_SAMPLES).round().astype(np.int64).tolist()]
+	for curve_id, leaf in curves:
+		curve = leaf.FCurve
+		keys = curve.Keys
+		count = len(keys)
+		_trace_count(count + _PROFILE_SAMPLES + 1, 1)
+		if not count:
+			continue
+		ticks = np.fromiter((key.Time.Get() for key in keys), dtype = np.int64, count = count)
+		values = np.fromiter((key.Value for key in keys), dtype = np.float64, count = count)
+		digest.update(curve_id.encode("utf-8"))
+		digest.update(ticks.tobytes())
+		digest.update(np.rint(values / precision).astype(np.int64).tobytes())
+		curve_ids.append(curve_id)
+		profiles.append(np.array([curve.Evaluate(sample_time) for sample_time in sample_times]))
+
+	return {
+		"exact": digest.hexdigest(),
+		"curves": hash(tuple(curve_ids)),
+		"profile": np.concatenate(profiles) if profiles else np.zeros(0),
+	}
+
+@traced
+def get_take_fingerprints(precision = 1e-4, rehash = False, log = False):
+	''' Returns {take name: fingerprint} of the quantized animation of each take, only new or edited takes are hashed '''
+
+	# a cached fingerprint is reused while the take stamp (key counts, first and last keys of each curve) is unchanged,
+	# an edit keeping all of them (a middle key value) is only seen with rehash or after invalidate_take_cache
+	_require_numpy()
+	if rehash:
+		_take_hash_cache.clear()
+	hashed = 0
+	fingerprints = {}
+	models = _animated_models()
+
+	for take in list(lScene.Takes):
+		curves = _take_curves(take, models)
+		stamp = _take_stamp(curves)
+		cached = _take_hash_cache.get(take.Name)
+		if cached is None or cached["precision"] != precision or cached["stamp"] != stamp:
+			cached = _fingerprint_take(take, curves, precision)
+			cached["precision"] = precision
+			cached["stamp"] = stamp
+			_take_hash_cache[take.Name] = cached
+			hashed += 1
+		fingerprints[take.Name] = cached
+
+	if log:
+		print("{} takes fingerprinted, {} from cache".format(hashed, len(fingerprints) - hashed))
+
+	return fingerprints
+
+def _near_groups(names, fingerprints, tolerance):
+	# takes whose curve profiles are within tolerance of the first take of their group, each take in one group;
+	# members are compared to that first take only, so a group never chains takes further apart than tolerance
+	groups = []
+	by_curves = {}
+	for name in names:
+		by_curves.setdefault((fingerprints[name]["curves"], len(fingerprints[name]["profile"])), []).append(name)
+	for candidates in by_curves.values():
+		if len(candidates) < 2:
+			continue
+		profiles = np.stack([fingerprints[name]["profile"] for name in candidates])
+		grouped = np.zeros(len(candidates), dtype = bool)
+		for idx in range(len(candidates) - 1):
+			if grouped[idx]:
+				continue
+			close = np.abs(profiles[idx + 1:] - profiles[idx]).max(axis = 1, initial = 0.0) <= tolerance
+			members = [jdx for jdx in (np.flatnonzero(close) + idx + 1).tolist() if not grouped[jdx]]
+			if members:
+				grouped[members] = True
+				groups.append([candidates[idx]] + [candidates[jdx] for jdx in members])
+	return groups
+
+_DEDUPE_ACTIONS = ("report", "delete", "merge")
+
+@traced
+def dedupe_takes(tolerance = 0.01, precision = 1e-4, action = "report", rehash = False, log = False):
+	''' Group takes with identical or near identical animation, optionally delete or merge the exact duplicates '''
+
+	# exact: same keys once quantized to precision, near: same curves with values sampled over the take span within
+	# tolerance. Only exact groups are deleted or merged, near groups are reported. Before a delete or merge every take
+	# is rehashed, the cache never decides what is removed. The first take (scene order) of each group is kept,
+	# "merge" also lists the removed takes in its Comments
+	if action not in _DEDUPE_ACTIONS:
+		raise ValueError("action must be one of {}".format(", ".join(_DEDUPE_ACTIONS)))
+
+	fingerprints = get_take_fingerprints(precision, rehash or action != "report", log)
+	names = [take.Name for take in lScene.Takes]
+
+	by_hash = {}
+	for name in names:
+		by_hash.setdefault(fingerprints[name]["exact"], []).append(name)
+	exact = [group for group in by_hash.values() if len(group) > 1]
+
+	# near duplicates between the exact groups, compared through their first take
+	representatives = [group[0] for group in by_hash.values()]
+	near = []
+	for group in _near_groups(representatives, fingerprints, tolerance):
+		members = []
+		for name in group:
+			members.extend(by_hash[fingerprints[name]["exact"]])
+		near.append(sorted(members, key = names.index))
+
+	removed = []
+	if action != "report":
+		takes = dict((take.Name, take) for take in lScene.Takes)
+		with scene_batch("dedupe_takes") as batch:
+			for group in exact:
+				keep = takes[group[0]]
+				redundant = [name for name in group[1:] if name not in removed]
+				if not redundant:
+					continue
+				if action == "merge":
+					aliases = "aliases: {}".format(", ".join(redundant))
+					batch.set(keep, "Comments", "{}\n{}".format(keep.Comments, aliases) if keep.Comments else aliases)
+				for name in redundant:
+					batch.delete(takes[name])
+					removed.append(name)
+		for name in removed:
+			invalidate_take_cache(name)
+
+	if log:
+		for title, groups in (("Exact", exact), ("Near", near)):
+			for group in groups:
+				print("{} duplicates: {}".format(title, ", ".join(group)))
+		print("{} exact and {} near duplicate groups, {} takes removed".format(len(exact), len(near), len(removed)))
+
+	return {"exact": exact, "near": near, "removed": removed}
+
+
+########## LIVE CAPTURE ##########
+
+# packet: magic, sequence number, sender time (seconds), joint count, then per joint
+# translation and rotation (6 float32), TCP packets are prefixed by their size (uint32)
+_CAPTURE_MAGIC = b"MBLC"
+_CAPTURE_HEADER = "<4sIdH"
+
+def pack_capture_packet(sequence, values, timestamp = None):
+	''' Bytes of one capture packet, values is (joints, 6) translation and rotation '''
+
+	import struct
+	values = np.asarray(values, dtype = "<f4")
+	return struct.pack(_CAPTURE_HEADER, _CAPTURE_MAGIC, sequence, time.time() if timestamp is None else timestamp, len(values)) + values.tobytes()
+
+def _unpack_capture_packet(data, header_size):
+	# (sequence, sender time, (joints, 6) values) or None for a foreign packet
+	import struct
+	magic, sequence, timestamp, count = struct.unpack_from(_CAPTURE_HEADER, data)
+	if magic != _CAPTURE_MAGIC or len(data) != header_size + count * 24:
+		return None
+	return sequence, timestamp, np.frombuffer(data, dtype = "<f4", offset = header_size).reshape(count, 6)
+
+def _recv_exact(connection, size):
+	data = b""
+	while len(data) < size:
+		part = connection.recv(size - len(data))
+		if not part:
+			return None
+		data += part
+	return data
+
+class LiveCaptureRecorder(object):
+	''' Record joint transform packets from a local UDP or TCP socket into the current take '''
+
+	# a background thread receives the packets into a preallocated ring buffer, the UI idle callback
+	# flushes the buffered samples to the FCurves in batches (write_animation), keys are placed at
+	# the sender time relative to the first packet, from the current frame at start
+	def __init__(self, joints, port = 0, host = "127.0.0.1", protocol = "udp", capacity = 4096, flush_interval = 0.05):
+		_require_numpy()
+		if protocol not in ("udp", "tcp"):
+			raise ValueError("protocol must be udp or tcp")
+		self.joints = list(joints)
+		self.host = host
+		self.port = port
+		self.protocol = protocol
+		self.flush_interval = flush_interval
+		self.running = False
+		self._capacity = capacity
+		self._values = np.empty((capacity, len(self.joints), 6))
+		self._times = np.empty(capacity)
+		self._lock = threading.Lock()
+		self._socket = None
+		self._thread = None
+		self.reset_stats()
+
+	def reset_stats(self):
+		self._head = 0
+		self._tail = 0
+		self._last_sequence = None
+		self._first_time = None
+		self._last_flush = 0.0
+		self.stats = {"received": 0, "dropped": 0, "overflow": 0, "invalid": 0, "flushed": 0, "keys": 0, "latency_ms": 0.0, "latency_max_ms": 0.0}
+
+	def start(self):
+		''' Open the socket, start the listener thread and the idle flush, returns the port '''
+
+		import socket
+		if self.running:
+			return self.port
+		self.take = lSys.CurrentTake
+		self.start_frame = lSys.LocalTime.GetFrame()
+		self.fps = get_transport_fps()[0]
+		if self.protocol == "udp":
+			self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+			self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+		else:
+			self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+			self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		self._socket.bind((self.host, self.port))
+		self._socket.settimeout(0.1)
+		if self.protocol == "tcp":
+			self._socket.listen(1)
+		self.port = self._socket.getsockname()[1]
+		self.running = True
+		self._thread = threading.Thread(target = self._listen, name = "LiveCaptureRecorder")
+		self._thread.daemon = True
+		self._thread.start()
+		lSys.OnUIIdle.Add(self._on_idle)
+		return self.port
+
+	def stop(self):
+		''' Stop listening and flush what is left in the buffer '''
+
+		if not self.running:
+			return
+		self.running = False
+		self._thread.join()
+		self._socket.close()
+		lSys.OnUIIdle.Remove(self._on_idle)
+		self.flush()
+
+	def _listen(self):
+		import socket
+		import struct
+		header_size = struct.calcsize(_CAPTURE_HEADER)
+		connection = None
+		while self.running:
+			try:
+				if self.protocol == "udp":
+					data = self._socket.recv(65536)
+				else:
+					if connection is None:
+						connection, _ = self._socket.accept()
+						connection.settimeout(0.1)
+					size = _recv_exact(connection, 4)
+					data = _recv_exact(connection, struct.unpack("<I", size)[0]) if size else None
+					if data is None:
+						connection.close()
+						connection = None
+						continue
+			except socket.timeout:
+				continue
+			except (OSError, socket.error):
+				break
+			self._receive(data, header_size)
+		if connection is not None:
+			connection.close()
+
+	def _receive(self, data, header_size):
+		now = time.time()
+		packet = _unpack_capture_packet(data, header_size) if len(data) >= header_size else None
+		stats = self.stats
+		if packet is None or len(packet[2]) != len(self.joints):
+			stats["invalid"] += 1
+			return
+		sequence, timestamp, values = packet
+		stats["received"] += 1
+		if self._last_sequence is not None and sequence > self._last_sequence + 1:
+			stats["dropped"] += sequence - self._last_sequence - 1
+		self._last_sequence = sequence
+		latency = (now - timestamp) * 1000.0
+		stats["latency_ms"] += (latency - stats["latency_ms"]) / stats["received"]
+		stats["latency_max_ms"] = max(stats["latency_max_ms"], latency)
+		if self._first_time is None:
+			self._first_time = timestamp
+
+		with self._lock:
+			if self._head - self._tail >= self._capacity:
+				stats["overflow"] += 1
+				return
+			slot = self._head % self._capacity
+		self._values[slot] = values
+		self._times[slot] = timestamp
+		with self._lock:
+			self._head += 1
+
+	def _on_idle(self, control, event):
+		if _clock() - self._last_flush >= self.flush_interval:
+			self.flush()
+
+	def flush(self):
+		''' Write the buffered samples as keys, returns the number of samples written '''
+
+		with self._lock:
+			head, tail = self._head, self._tail
+		if head == tail:
+			return 0
+		slots = np.arange(tail, head) % self._capacity
+		values = self._values[slots]
+		frames = self.start_frame + (self._times[slots] - self._first_time) * self.fps
+		with self._lock:
+			self._tail = head
+
+		# takes compared by name, CurrentTake returns a new wrapper on each read
+		current_take = lSys.CurrentTake
+		switch = self.take.Name != current_take.Name
+		try:
+			if switch:
+				lSys.CurrentTake = self.take
+			animation = dict((joint, {"translation": (frames, values[:, idx, 0:3]), "rotation": (frames, values[:, idx, 3:6])}) for idx, joint in enumerate(self.joints))
+			self.stats["keys"] += write_animation(animation, replace = False, fps = self.fps)
+		finally:
+			if switch:
+				lSys.CurrentTake = current_take
+		self.stats["flushed"] += len(slots)
+		self._last_flush = _clock()
+		return len(slots)
+
+@traced
+def record_live_capture(joints = None, port = 0, protocol = "udp", log = False):
+	''' Start recording streamed joint transforms (get_joint_list by default) into the current take, returns the recorder '''
+
+	recorder = LiveCaptureRecorder(get_joint_list() if joints is None else joints, port, protocol = protocol)
+	recorder.start()
+
+	if log:
+		print("Recording {} joints on {} port {}".format(len(recorder.joints), protocol.upper(), recorder.port))
+
+	return recorder
+
+def replay_capture(values, port, host = "127.0.0.1", rate = 120, protocol = "udp", loop = False, stop_event = None):
+	''' Send recorded (frames, joints, 6 or 9) local transforms as capture packets at a given rate, returns packets sent '''
+
+	# packets are scheduled on absolute times so the rate does not drift, usable from a thread
+	import socket
+	import struct
+	values = np.asarray(values, dtype = np.float64)[..., :6]
+	if protocol == "udp":
+		sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		send = lambda packet: sock.sendto(packet, (host, port))
+	else:
+		sock = socket.create_connection((host, port))
+		send = lambda packet: sock.sendall(struct.pack("<I", len(packet)) + packet)
+
+	sent = 0
+	start = time.time()
+	try:
+		while True:
+			for frame in values:
+				if stop_event is not None and stop_event.is_set():
+					return sent
+				delay = start + sent / float(rate) - time.time()
+				if delay > 0:
+					time.sleep(delay)
+				send(pack_capture_packet(sent, frame))
+				sent += 1
+			if not loop:
+				return sent
+	finally:
+		sock.close()
+
+
+########## COMMAND SERVER ##########
+
+def _to_json(value):
+	# library results to json values: components by LongName, arrays and tuples as lists
+	if value is None or isinstance(value, (bool, int, float, str)):
+		return value
+	if isinstance(value, dict):
+		return dict((str(key), _to_json(item)) for key, item in value.items())
+	if isinstance(value, (list, tuple, set)) or type(value).__name__ == "FBModelList":
+		return [_to_json(item) for item in value]
+	if np is not None and isinstance(value, (np.ndarray, np.generic)):
+		return value.tolist()
+	if isinstance(value, FBTime):
+		return value.GetFrame()
+	if hasattr(value, "LongName"):
+		return value.LongName
+	return str(value)
+
+# functions served by default: scene queries and take, frame and character navigation, nothing that
+# edits, deletes, saves or touches files
+_COMMAND_FUNCTIONS = (
+	"get_all_scene_components", "get_comp_by_name", "get_component_by_namespace", "get_children",
+	"get_selected_components", "get_selected_components_name", "search_components", "search_components_from_string",
+	"get_joint_list", "get_constraints", "get_constraints_name", "get_constraint_by_name", "get_character_by_name",
+	"get_take_list", "get_take_by_name", "get_current_take", "get_current_take_name", "get_take_length",
+	"get_take_spans", "get_timeline_start_end_frame", "get_transport_fps", "get_current_frame",
+	"get_scene_census", "get_take_fingerprints", "get_trace_report",
+	"set_current_take", "go_to_previous_take", "go_to_next_take", "go_to_frame", "set_current_character_by_name",
+)
+
+def _command_function(name, functions):
+	# library function by name, if it is in the served functions
+	func = globals().get(name) if name in functions else None
+	if not callable(func) or isinstance(func, type) or getattr(func, "__module__", None) != __name__:
+		raise ValueError("{} is not a served library function".format(name))
+	return func
+
+# bytes of responses a client can leave unread before its connection is dropped
+_COMMAND_SEND_LIMIT = 64 << 20
+
+class _CommandOutbox(object):
+	''' Outgoing lines of a command server connection, written by a background thread '''
+
+	# the main thread only queues the encoded lines, so a client that stops reading never blocks it;
+	# past limit unsent bytes the connection is dropped. pending counts the requests queued and not
+	# answered yet (guarded by the server lock), the connection is closed once the client stopped
+	# sending and every request is answered
+	def __init__(self, connection, limit = None):
+		self.connection = connection
+		self.limit = _COMMAND_SEND_LIMIT if limit is None else limit
+		self.pending = 0
+		self.reading = True
+		self._lines = []
+		self._size = 0
+		self._closing = False
+		self._dropped = False
+		self._ready = threading.Condition()
+		thread = threading.Thread(target = self._write, name = "CommandServerWriter")
+		thread.daemon = True
+		thread.start()
+
+	def put(self, data):
+		with self._ready:
+			if self._closing or self._dropped:
+				return
+			if self._size + len(data) > self.limit:
+				self._drop()
+				return
+			self._lines.append(data)
+			self._size += len(data)
+			self._ready.notify()
+
+	def close(self):
+		''' Close the connection once the queued lines are sent '''
+
+		with self._ready:
+			self._closing = True
+			self._ready.notify()
+
+	def drop(self):
+		''' Close the connection now, unsent lines are lost '''
+
+		with self._ready:
+			self._drop()
+
+	def _drop(self):
+		import socket
+		self._dropped = True
+		self._lines = []
+		self._size = 0
+		self._ready.notify()
+		# wakes the writer blocked in sendall and the reader of the connection
+		try:
+			self.connection.shutdown(socket.SHUT_RDWR)
+		except (OSError, socket.error):
+			pass
+
+	def _write(self):
+		while True:
+			with self._ready:
+				while not self._lines and not self._closing and not self._dropped:
+					self._ready.wait()
+				if self._dropped or not self._lines:
+					break
+				data = self._lines.pop(0)
+			try:
+				self.connection.sendall(data)
+			except (OSError, ValueError):
+				with self._ready:
+					self._drop()
+				break
+			with self._ready:
+				self._size -= len(data)
+		self.connection.close()
+
+class CommandServer(object):
+	''' Library functions served over a local socket, one JSON request or response per line '''
+
+	# request: {"id", "token", "call", "args", "kwargs", "stream"} or {"id", "token", "batch": [requests]}
+	# response: {"id", "ok", "result" | "error", "ms"}, a streamed result is sent as {"id", "chunk"} lines
+	# followed by {"id", "ok", "done", "count", "ms"}; a batch answers {"id", "ok", "results", "ms"}
+	# sockets are read and written on background threads, calls run on the main thread from the UI idle
+	# callback and only queue their responses (_CommandOutbox), a client that stops reading is dropped
+	# every request carries the shared token (random unless given), only the functions listed in functions
+	# (_COMMAND_FUNCTIONS by default) can be called; a line that is not a JSON request with the token closes the
+	# connection, so other protocols (a browser posting HTTP to the port) get no further than their first line
+	def __init__(self, port = 0, host = "127.0.0.1", budget = 0.02, chunk = 1000, token = None, functions = None):
+		import binascii
+		self.host = host
+		self.port = port
+		self.budget = budget
+		self.chunk = chunk
+		self.token = token or binascii.hexlify(os.urandom(16)).decode("ascii")
+		self.functions = frozenset(_COMMAND_FUNCTIONS if functions is None else functions)
+		self.running = False
+		self.stats = {"requests": 0, "errors": 0, "seconds": 0.0}
+		self._requests = []
+		self._lock = threading.Lock()
+		self._socket = None
+		self._outboxes = []
+
+	def start(self):
+		''' Listen on the port (a free one if 0) and register the idle callback, returns the port '''
+
+		import socket
+		if self.running:
+			return self.port
+		self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		self._socket.bind((self.host, self.port))
+		self._socket.listen(4)
+		self._socket.settimeout(0.1)
+		self.port = self._socket.getsockname()[1]
+		self.running = True
+		thread = threading.Thread(target = self._accept, name = "CommandServer")
+		thread.daemon = True
+		thread.start()
+		lSys.OnUIIdle.Add(self._on_idle)
+		return self.port
+
+	def stop(self):
+		if not self.running:
+			return
+		self.running = False
+		lSys.OnUIIdle.Remove(self._on_idle)
+		self._socket.close()
+		for outbox in list(self._outboxes):
+			outbox.drop()
+
+	def _accept(self):
+		import socket
+		while self.running:
+			try:
+				connection, _ = self._socket.accept()
+			except socket.timeout:
+				continue
+			except (OSError, socket.error):
+				break
+			connection.settimeout(None)
+			outbox = _CommandOutbox(connection)
+			self._outboxes.append(outbox)
+			thread = threading.Thread(target = self._read, args = (outbox,), name = "CommandServerConnection")
+			thread.daemon = True
+			thread.start()
+
+	def _read(self, outbox):
+		# queue each request, pipelined requests are answered in order; the connection is closed
+		# on the first line that is not a JSON request with the token
+		import hmac
+		stream = outbox.connection.makefile("rb")
+		rejected = False
+		try:
+			for line in stream:
+				if not line.strip():
+					continue
+				try:
+					request = json.loads(line.decode("utf-8"))
+				except ValueError:
+					request = None
+				if not isinstance(request, dict):
+					rejected = True
+					break
+				if not hmac.compare_digest(str(request.get("token", "")), self.token):
+					self._send(outbox, {"id": request.get("id"), "ok": False, "error": "PermissionError: invalid token"})
+					rejected = True
+					break
+				with self._lock:
+					outbox.pending += 1
+					self._requests.append((outbox, request))
+		except (OSError, ValueError):
+			pass
+		finally:
+			stream.close()
+			if rejected:
+				self.stats["errors"] += 1
+			with self._lock:
+				outbox.reading = False
+				done = rejected or not outbox.pending
+			if done:
+				self._close(outbox)
+
+	def _on_idle(self, control, event):
+		self.tick()
+
+	def tick(self):
+		''' Run queued requests until the time budget is spent '''
+
+		start = _clock()
+		while _clock() - start < self.budget:
+			with self._lock:
+				if not self._requests:
+					break
+				outbox, request = self._requests.pop(0)
+			self._handle(outbox, request)
+			with self._lock:
+				outbox.pending -= 1
+				done = not outbox.reading and not outbox.pending
+			if done:
+				self._close(outbox)
+
+	def _close(self, outbox):
+		if outbox in self._outboxes:
+			self._outboxes.remove(outbox)
+		outbox.close()
+
+	def _send(self, outbox, message):
+		# queued for the writer thread of the connection, never blocks
+		outbox.put((json.dumps(message) + "\n").encode("utf-8"))
+
+	def _call(self, request):
+		func = _command_function(request["call"], self.functions)
+		return func(*request.get("args", []), **request.get("kwargs", {}))
+
+	def _handle(self, outbox, request):
+		start = _clock()
+		request_id = request.get("id")
+		try:
+			if "batch" in request:
+				results = []
+				for item in request["batch"]:
+					item_start = _clock()
+					try:
+						results.append({"ok": True, "result": _to_json(self._call(item)), "ms": (_clock() - item_start) * 1000.0})
+					except Exception as e:
+						self.stats["errors"] += 1
+						results.append({"ok": False, "error": "{}: {}".format(type(e).__name__, e), "ms": (_clock() - item_start) * 1000.0})
+				response = {"id": request_id, "ok": True, "results": results}
+			else:
+				result = _to_json(self._call(request))
+				if request.get("stream") and isinstance(result, list):
+					for first in range(0, len(result), self.chunk):
+						self._send(outbox, {"id": request_id, "chunk": result[first:first + self.chunk]})
+					response = {"id": request_id, "ok": True, "done": True, "count": len(result)}
+				else:
+					response = {"id": request_id, "ok": True, "result": result}
+		except Exception as e:
+			self.stats["errors"] += 1
+			response = {"id": request_id, "ok": False, "error": "{}: {}".format(type(e).__name__, e)}
+		elapsed = _clock() - start
+		response["ms"] = elapsed * 1000.0
+		self.stats["requests"] += 1
+		self.stats["seconds"] += elapsed
+		self._send(outbox, response)
+
+# server started by start_command_server()
+command_server = [None]
+
+@traced
+def start_command_server(port = 0, token = None, log = False):
+	''' Serve the query and navigation functions on a local port (see fb_command_client.py), returns the port '''
+
+	# clients need the token: given here, or generated and read from command_server[0].token (printed with log)
+	if command_server[0] is None or not command_server[0].running:
+		command_server[0] = CommandServer(port, token = token)
+	port = command_server[0].start()
+
+	if log:
+		print("Command server listening on port {}, token {}".format(port, command_server[0].token))
+
+	return port
+
+@traced
+def stop_command_server(log = False):
+	''' Stop the command server '''
+
+	if command_server[0] is not None:
+		command_server[0].stop()
+		if log:
+			print("Command server stopped, {} requests served".format(command_server[0].stats["requests"]))
+
+
+########## MIRROR ##########
+
+# side tokens swapped to find the counterpart of a joint, tried in order: words anywhere in the
+# name, single letters only as a separate token ("L_Arm", "Arm_L", "Arm_L1") or before a capital ("LArm")
+_MIRROR_SIDES = (
+	re.compile(r"(Left|Right)"),
+	re.compile(r"(left|right)"),
+	re.compile(r"(?:^|(?<=[_.\s]))(L|R)(?=$|[_.\s\d]|[A-Z])"),
+	re.compile(r"(?:^|(?<=[_.\s]))(l|r)(?=$|[_.\s\d])"),
+)
+_MIRROR_SWAP = {"Left": "Right", "Right": "Left", "left": "right", "right": "left", "L": "R", "R": "L", "l": "r", "r": "l"}
+
+# tuple of joint long names -> mapping (see get_mirror_mapping), renamed skeletons get a new entry
+_mirror_cache = {}
+
+def get_char_prefix(joints):
+	''' Prefix shared by the joint names of a skeleton ("Actor01_" for Actor01_Hips, Actor01_Spine...), '' if none '''
+
+	names = [joint.Name for joint in joints]
+	prefix = os.path.commonprefix(names) if len(names) > 1 else ""
+	# cut after the last separator so that "Actor01_L" (L_Arm, L_Leg) keeps its side token
+	cut = max(prefix.rfind("_"), prefix.rfind(":"))
+	return prefix[:cut + 1]
+
+def _mirror_name(name):
+	# name with its side token swapped, None for a center joint
+	for pattern in _MIRROR_SIDES:
+		match = pattern.search(name)
+		if match:
+			return name[:match.start(1)] + _MIRROR_SWAP[match.group(1)] + name[match.end(1):]
+	return None
+
+@traced
+def get_mirror_mapping(joints = None, rebuild = False, log = False):
+	''' Returns the left/right pairing of a skeleton (current character by default) and its mirror axis, cached per skeleton '''
+
+	# {"names", "mirror" (index of the counterpart of each joint, itself for center joints), "parents"
+	# (index in the list, -1 outside), "pairs" [(left, right)], "center", "unpaired", "axis" (0, 1, 2)}
+	# the axis is the one separating the pairs the most in the current pose
+	_require_numpy()
+	if joints is None:
+		joints = _character_joints(lApp.CurrentCharacter)
+	joints = list(joints)
+	key = tuple(joint.LongName for joint in joints)
+	mapping = None if rebuild else _mirror_cache.get(key)
+	if mapping is not None:
+		return mapping
+
+	prefix = get_char_prefix(joints)
+	index = dict((joint.Name[len(prefix):], idx) for idx, joint in enumerate(joints))
+	mirror = list(range(len(joints)))
+	pairs = []
+	center = []
+	unpaired = []
+	for idx, joint in enumerate(joints):
+		name = joint.Name[len(prefix):]
+		other = _mirror_name(name)
+		if other is None:
+			center.append(joint.Name)
+		elif other in index:
+			mirror[idx] = index[other]
+			if idx < index[other]:
+				pairs.append((joint.Name, joints[index[other]].Name))
+		else:
+			unpaired.append(joint.Name)
+
+	long_names = dict((joint.LongName, idx) for idx, joint in enumerate(joints))
+	parents = [long_names.get(joint.Parent.LongName, -1) if joint.Parent is not None else -1 for joint in joints]
+	_trace_count(len(joints), len(joints))
+
+	# mirror_local_transforms works on plain XYZ euler rotations, the rotation options would be ignored
+	for joint in joints:
+		if joint.RotationActive:
+			if joint.RotationOrder != FBModelRotationOrder.kFBEulerXYZ:
+				raise ValueError("{} has a rotation order other than XYZ, mirroring is not supported".format(joint.LongName))
+			if any(list(joint.PreRotation)) or any(list(joint.PostRotation)):
+				raise ValueError("{} has a pre or post rotation, mirroring is not supported".format(joint.LongName))
+	_trace_count(len(joints), len(joints))
+
+	# counterparts must hang under counterparts (or under the same joint outside the list)
+	for idx, joint in enumerate(joints):
+		if parents[idx] >= 0:
+			expected = mirror[parents[idx]]
+		else:
+			parent = joint.Parent
+			other = joints[mirror[idx]].Parent
+			# same parent outside the list (or both at the scene root), compared by name as wrappers are not unique
+			same = (parent is None and other is None) or (parent is not None and other is not None and parent.LongName == other.LongName)
+			expected = -1 if same else -2
+		if parents[mirror[idx]] != expected:
+			raise ValueError("{} and {} are not in mirrored hierarchies".format(joint.Name, joints[mirror[idx]].Name))
+
+	# axis separating the pairs the most in the current pose
+	positions = np.empty((len(joints), 3))
+	vector = FBVector3d()
+	for idx, joint in enumerate(joints):
+		joint.GetVector(vector, FBModelTransformationType.kModelTranslation, True)
+		positions[idx] = list(vector)
+	_trace_count(len(joints), len(joints))
+	left = [idx for idx in range(len(joints)) if mirror[idx] > idx]
+	separation = np.abs(positions[left] - positions[[mirror[idx] for idx in left]]).sum(axis = 0) if left else np.array([1.0, 0.0, 0.0])
+
+	mapping = {
+		"names": [joint.Name for joint in joints],
+		"mirror": mirror,
+		"parents": parents,
+		"pairs": pairs,
+		"center": center,
+		"unpaired": unpaired,
+		"axis": int(np.argmax(separation)),
+	}
+	_mirror_cache[key] = mapping
+
+	if log:
+		print("{} pairs, {} center and {} unpaired joints, mirror axis {}".format(len(pairs), len(center), len(unpaired), "XYZ"[mapping["axis"]]))
+		for name in unpaired:
+			print("No counterpart found for {}".format(name))
+
+	return mapping
+
+def _local_matrices(values):
+	# local transforms (..., 9) translation, rotation, scaling to (..., 4, 4) rigid matrices (scaling left out)
+	matrices = np.zeros(values.shape[:-1] + (4, 4))
+	matrices[..., :3, :3] = euler_to_matrices(values[..., 3:6])
+	matrices[..., :3, 3] = values[..., 0:3]
+	matrices[..., 3, 3] = 1.0
+	return matrices
+
+def mirror_local_transforms(values, mapping, axis = None, origin = 0.0, parent_matrix = None):
+	''' Mirror local transforms (frames, joints, 9) of the joints of a mapping across a world plane, returns the mirrored array '''
+
+	# the plane is normal to axis (the mapping axis by default) and passes through origin along it
+	# each mirrored global transform is S * G(counterpart) * S, with S the reflection on that axis; in local
+	# space this is S * L * S for joints under a joint of the list and inv(P) * Sw * P * L * S for the others,
+	# P being the global matrix of their parent (identity if none, assumed static over the frames)
+	# joints without pre/post rotation, rotation order XYZ (checked by get_mirror_mapping)
+	_require_numpy()
+	axis = mapping["axis"] if axis is None else _AXES.get(axis, axis)
+	values = np.asarray(values, dtype = np.float64)
+	local = _local_matrices(values[:, mapping["mirror"]])
+
+	reflect = np.eye(4)
+	reflect[axis, axis] = -1.0
+	world = reflect.copy()
+	world[axis, 3] = 2.0 * origin
+	if parent_matrix is not None:
+		world = np.linalg.solve(parent_matrix, world.dot(parent_matrix))
+
+	roots = np.array(mapping["parents"]) < 0
+	mirrored = np.matmul(local, reflect)
+	mirrored[:, ~roots] = np.matmul(reflect, mirrored[:, ~roots])
+	mirrored[:, roots] = np.matmul(world, mirrored[:, roots])
+
+	out = values[:, mapping["mirror"]].copy()
+	out[..., 0:3] = mirrored[..., :3, 3]
+	# keep the euler curves continuous from frame to frame
+	out[..., 3:6] = np.degrees(np.unwrap(np.radians(matrices_to_euler(mirrored)), axis = 0))
+	return out
+
+def _mirror_parent_matrix(joints, mapping):
+	# global matrix (4, 4) of the parent of the root joints, None at the scene root
+	for idx, parent in enumerate(mapping["parents"]):
+		if parent < 0 and joints[idx].Parent is not None:
+			matrix = FBMatrix()
+			joints[idx].Parent.GetMatrix(matrix)
+			_trace_count(1, 1)
+			return fbmatrices_to_array([matrix])[0]
+	return None
+
+@traced
+def mirror_pose(joints = None, axis = None, origin = 0.0, key = False, log = False):
+	''' Mirror the pose of a skeleton (current character by default) at the current frame, optionally keyed '''
+
+	joints = _character_joints(lApp.CurrentCharacter) if joints is None else list(joints)
+	mapping = get_mirror_mapping(joints)
+	values = np.empty((1, len(joints), 9))
+	for jdx, joint in enumerate(joints):
+		values[0, jdx] = list(joint.Translation.Data) + list(joint.Rotation.Data) + list(joint.Scaling.Data)
+	_trace_count(3 * len(joints), len(joints))
+	mirrored = mirror_local_transforms(values, mapping, axis, origin, _mirror_parent_matrix(joints, mapping))[0]
+
+	if key:
+		frame = np.array([lSys.LocalTime.GetFrame()])
+		write_animation(dict((joint, {"translation": (frame, mirrored[jdx:jdx + 1, 0:3]), "rotation": (frame, mirrored[jdx:jdx + 1, 3:6])}) for jdx, joint in enumerate(joints)))
+	else:
+		with scene_batch("mirror_pose") as batch:
+			for jdx, joint in enumerate(joints):
+				batch.set(joint, "Translation", FBVector3d(*mirrored[jdx, 0:3].tolist()))
+				batch.set(joint, "Rotation", FBVector3d(*mirrored[jdx, 3:6].tolist()))
+
+	if log:
+		print("Pose of {} joints mirrored".format(len(joints)))
+
+@traced
+def mirror_animation(joints = None, start = None, end = None, axis = None, origin = 0.0, layer = None, log = False):
+	''' Mirror the animation of a skeleton (current character by default) over a frame range of the current take, returns the keys written '''
+
+	# every frame of the range is read from the FCurves, mirrored in one pass and keyed back in bulk
+	joints = _character_joints(lApp.CurrentCharacter) if joints is None else list(joints)
+	mapping = get_mirror_mapping(joints)
+	span = lSys.CurrentTake.LocalTimeSpan
+	start = span.GetStart().GetFrame() if start is None else start
+	end = span.GetStop().GetFrame() if end is None else end
+	frames = np.arange(start, end + 1)
+
+	values = _sample_local_transforms(joints, frames)
+	mirrored = mirror_local_transforms(values, mapping, axis, origin, _mirror_parent_matrix(joints, mapping))
+	count = write_animation(dict((joint, {"translation": (frames, mirrored[:, jdx, 0:3]), "rotation": (frames, mirrored[:, jdx, 3:6])}) for jdx, joint in enumerate(joints)), layer = layer)
+
+	if log:
+		print("{} joints mirrored over frames {} to {} ({} keys)".format(len(joints), start, end, count))
+
+	return count
+
+
+########## ROTATION FILTERS ##########
+
+def euler_to_quaternions(rotations):
+	''' Array of XYZ euler rotations in degrees (..., 3) to unit quaternions (..., 4) as w, x, y, z '''
+
+	_require_numpy()
+	half = np.radians(np.asarray(rotations, dtype = np.float64)) * 0.5
+	cx, cy, cz = np.cos(half[..., 0]), np.cos(half[..., 1]), np.cos(half[..., 2])
+	sx, sy, sz = np.sin(half[..., 0]), np.sin(half[..., 1]), np.sin(half[..., 2])
+	# qz * qy * qx, same order as euler_to_matrices
+	return np.stack([
+		cx * cy * cz + sx * sy * sz,
+		sx * cy * cz - cx * sy * sz,
+		cx * sy * cz + sx * cy * sz,
+		cx * cy * sz - sx * sy * cz,
+	], axis = -1)
+
+def quaternions_to_euler(quaternions):
+	''' Quaternions (..., 4) as w, x, y, z to XYZ euler rotations in degrees (..., 3) '''
+
+	_require_numpy()
+	q = np.asarray(quaternions, dtype = np.float64)
+	q = q / np.linalg.norm(q, axis = -1, keepdims = True)
+	w, x, y, z = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+	m = np.empty(q.shape[:-1] + (3, 3))
+	m[..., 0, 0] = 1.0 - 2.0 * (y * y + z * z)
+	m[..., 0, 1] = 2.0 * (x * y - w * z)
+	m[..., 0, 2] = 2.0 * (x * z + w * y)
+	m[..., 1, 0] = 2.0 * (x * y + w * z)
+	m[..., 1, 1] = 1.0 - 2.0 * (x * x + z * z)
+	m[..., 1, 2] = 2.0 * (y * z - w * x)
+	m[..., 2, 0] = 2.0 * (x * z - w * y)
+	m[..., 2, 1] = 2.0 * (y * z + w * x)
+	m[..., 2, 2] = 1.0 - 2.0 * (x * x + y * y)
+	return matrices_to_euler(m)
+
+def quaternion_continuity(quaternions, axis = 0):
+	''' Flip the sign of quaternions (..., 4) along a time axis so that each one is in the hemisphere of the previous '''
+
+	# q and -q are the same rotation, the flips accumulate from the first frame on
+	_require_numpy()
+	q = np.moveaxis(np.array(quaternions, dtype = np.float64), axis, 0)
+	if len(q) > 1:
+		signs = np.where(np.einsum('...i,...i->...', q[1:], q[:-1]) < 0.0, -1.0, 1.0)
+		q[1:] *= np.cumprod(signs, axis = 0)[..., None]
+	return np.moveaxis(q, 0, axis)
+
+def unroll_euler(rotations, axis = 0):
+	''' Add or remove turns to euler rotations in degrees (..., 3) along a time axis so that no axis jumps by more than 180 degrees '''
+
+	_require_numpy()
+	return np.degrees(np.unwrap(np.radians(np.asarray(rotations, dtype = np.float64)), axis = axis))
+
+def _wrapped_distance(a, b):
+	# summed angle between euler triples, ignoring whole turns
+	return np.abs((a - b + 180.0) % 360.0 - 180.0).sum(axis = -1)
+
+def repair_gimbal_flips(rotations, axis = 0):
+	''' Pick on each frame the euler solution (x, y, z) or (x + 180, 180 - y, z + 180) closest to the previous frame, then unroll '''
+
+	# the two solutions give the same XYZ rotation, extractions near y = +-90 switch between them and make x and z
+	# jump by 180 degrees; the choice runs frame after frame, vectorized over the other axes (all joints at once)
+	_require_numpy()
+	rotations = np.moveaxis(np.asarray(rotations, dtype = np.float64), axis, 0)
+	if not len(rotations):
+		return np.moveaxis(rotations.copy(), 0, axis)
+	other = rotations + np.array([180.0, 0.0, 180.0])
+	other[..., 1] = 180.0 - rotations[..., 1]
+
+	chosen = np.empty_like(rotations)
+	previous = rotations[0]
+	for frame in range(len(rotations)):
+		flip = _wrapped_distance(other[frame], previous) < _wrapped_distance(rotations[frame], previous)
+		previous = chosen[frame] = np.where(flip[..., None], other[frame], rotations[frame])
+
+	# turns are counted from the first frame values
+	chosen = unroll_euler(chosen)
+	chosen += np.round((rotations[0] - chosen[0]) / 360.0) * 360.0
+	return np.moveaxis(chosen, 0, axis)
+
+_ROTATION_FILTERS = ("unroll", "gimbal", "reextract")
+
+def filter_euler(rotations, rotation_filter = "gimbal", axis = 0):
+	''' Filter euler rotations in degrees (..., 3) along a time axis: "unroll", "gimbal" (flips then unroll) or "reextract" '''
+
+	# "reextract" rebuilds every rotation from its matrix before the gimbal repair, which brings values drifted
+	# out of the euler ranges by edits or blends back in range; the rotations themselves are unchanged, only
+	# their euler values (a quaternion round trip would give the same result, q and -q extract the same angles)
+	if rotation_filter not in _ROTATION_FILTERS:
+		raise ValueError("rotation_filter must be one of {}".format(", ".join(_ROTATION_FILTERS)))
+	if rotation_filter == "unroll":
+		return unroll_euler(rotations, axis)
+	if rotation_filter == "reextract":
+		rotations = np.asarray(rotations, dtype = np.float64)
+		first = np.take(rotations, [0], axis = axis)
+		rotations = matrices_to_euler(euler_to_matrices(rotations))
+		# keep the first frame solution and turns
+		rotations = np.concatenate([first, np.take(rotations, range(1, rotations.shape[axis]), axis = axis)], axis = axis)
+	return repair_gimbal_flips(rotations, axis)
+
+@traced
+def filter_rotations(models = None, rotation_filter = "gimbal", start = None, end = None, tolerance = 1e-6, layer = None, log = False):
+	''' Run a rotation filter on the rotation keys of models (current character joints by default) of the current take '''
+
+	# curves keyed on the same frames are filtered together in one array, only the models whose values
+	# changed are keyed back (write_animation, auto tangents), start and end limit the filtered keys
+	_require_numpy()
+	models = _character_joints(lApp.CurrentCharacter) if models is None else list(models)
+	groups = {}
+	with _on_layer(layer):
+		for model in models:
+			frames, values = read_keys(model, "rotation")
+			if start is not None or end is not None:
+				inside = (frames >= (-np.inf if start is None else start)) & (frames <= (np.inf if end is None else end))
+				frames, values = frames[inside], values[inside]
+			if len(frames) > 1:
+				groups.setdefault(frames.tobytes(), (frames, [], []))
+				groups[frames.tobytes()][1].append(model)
+				groups[frames.tobytes()][2].append(values)
+
+	animation = {}
+	for frames, group_models, group_values in groups.values():
+		values = np.stack(group_values, axis = 1)
+		filtered = filter_euler(values, rotation_filter)
+		changed = np.abs(filtered - values).max(axis = (0, 2)) > tolerance
+		for idx in np.flatnonzero(changed).tolist():
+			animation[group_models[idx]] = {"rotation": (frames, filtered[:, idx])}
+
+	count = write_animation(animation, layer = layer) if animation else 0
+
+	if log:
+		print("{} filter: {} of {} models changed, {} keys written".format(rotation_filter, len(animation), len(models), count))
+
+	return len(animation)
+
+
 ############ TEST AREA ###############
\ No newline at end of file
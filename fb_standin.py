@@ -0,0 +1,1735 @@
+# Author: Alexandre
+## In-memory stand-in for the parts of pyfbsdk used by fb_library
+## Lets the library run, be benchmarked and regression-tested without a MotionBuilder license
+####################################
+#
+# usage (outside MotionBuilder):
+#	import fb_standin
+#	fb_standin.install()          # registers pyfbsdk, pyfbsdk_additions, modules, file_system_library
+#	fb_standin.build_scene(10000) # synthetic scene of 10k objects
+#	import fb_library
+#
+# Only the behaviour the library relies on is modelled: scene collections, model hierarchy and
+# transforms, takes with per-take FCurves, Story tracks and clips, characters and a few UI
+# helpers. Each edit done outside FBBeginChangeAllModels/FBEndChangeAllModels re-evaluates the
+# animated models, the same way MotionBuilder refreshes the scene after every change.
+
+import os
+import sys
+import math
+import json
+import types
+import bisect
+import random
+import datetime
+
+__all__ = []
+
+def _public(obj):
+	# register a class or function as part of the pyfbsdk namespace
+	__all__.append(obj.__name__)
+	return obj
+
+def _public_value(name, value):
+	globals()[name] = value
+	__all__.append(name)
+	return value
+
+########## ENUMS ##########
+
+class _EnumValue(int):
+	''' Integer enum value keeping its SDK name '''
+
+	def __new__(cls, name, value):
+		obj = int.__new__(cls, value)
+		obj.name = name
+		return obj
+
+	def __repr__(self):
+		return self.name
+
+def _enum(enum_name, names):
+	# build an enum class exposing each name as attribute
+	attrs = dict((name, _EnumValue(name, idx)) for idx, name in enumerate(names))
+	return _public_value(enum_name, type(enum_name, (object,), attrs))
+
+_enum('FBModelTransformationType', ['kModelTranslation', 'kModelRotation', 'kModelScaling', 'kModelTransformation', 'kModelInverse_Transformation'])
+_enum('FBTimeMode', ['kFBTimeModeDefault', 'kFBTimeMode1000Frames', 'kFBTimeMode120Frames', 'kFBTimeMode100Frames', 'kFBTimeMode96Frames', 'kFBTimeMode72Frames', 'kFBTimeMode60Frames', 'kFBTimeMode5994Frames', 'kFBTimeMode50Frames', 'kFBTimeMode48Frames', 'kFBTimeMode30Frames', 'kFBTimeMode2997Frames', 'kFBTimeMode2997Frames_Drop', 'kFBTimeMode25Frames', 'kFBTimeMode24Frames', 'kFBTimeMode23976Frames', 'kFBTimeModeCustom'])
+_enum('FBStoryTrackType', ['kFBStoryTrackAnimation', 'kFBStoryTrackCamera', 'kFBStoryTrackCharacter', 'kFBStoryTrackConstraint', 'kFBStoryTrackCommand', 'kFBStoryTrackShot', 'kFBStoryTrackAudio', 'kFBStoryTrackVideo'])
+_enum('FBRotationFilter', ['kFBRotationFilterNone', 'kFBRotationFilterGimbleKiller', 'kFBRotationFilterUnroll'])
+_enum('FBCharacterPlotWhere', ['kFBCharacterPlotOnControlRig', 'kFBCharacterPlotOnSkeleton'])
+_enum('FBPopupInputType', ['kFBPopupBool', 'kFBPopupChar', 'kFBPopupString', 'kFBPopupInt', 'kFBPopupFloat', 'kFBPopupDouble', 'kFBPopupPassword'])
+_enum('FBModelRotationOrder', ['kFBEulerXYZ', 'kFBEulerXZY', 'kFBEulerYZX', 'kFBEulerYXZ', 'kFBEulerZXY', 'kFBEulerZYX', 'kFBSphericXYZ'])
+_enum('FBHUDElementHAlignment', ['kFBHUDLeft', 'kFBHUDCenter', 'kFBHUDRight'])
+_enum('FBHUDElementVAlignment', ['kFBHUDTop', 'kFBHUDVCenter', 'kFBHUDBottom'])
+_enum('FBSceneChangeType', ['kFBSceneChangeNone', 'kFBSceneChangeDestroy', 'kFBSceneChangeAttach', 'kFBSceneChangeDetach', 'kFBSceneChangeAddChild', 'kFBSceneChangeRemoveChild', 'kFBSceneChangeSelect', 'kFBSceneChangeUnselect', 'kFBSceneChangeRename', 'kFBSceneChangeRenamed'])
+_enum('FBGlobalEvalCallbackTiming', ['kFBGlobalEvalCallbackBeforeDAG', 'kFBGlobalEvalCallbackAfterDAG', 'kFBGlobalEvalCallbackAfterDeform', 'kFBGlobalEvalCallbackSyn'])
+_enum('FBInterpolation', ['kFBInterpolationConstant', 'kFBInterpolationLinear', 'kFBInterpolationCubic', 'kFBInterpolationCustom'])
+_enum('FBTangentMode', ['kFBTangentModeAuto', 'kFBTangentModeTCB', 'kFBTangentModeUser', 'kFBTangentModeBreak', 'kFBTangentModeClampProgressive'])
+
+# frames per second of each time mode (0 = custom)
+_MODE_FPS = {
+	FBTimeMode.kFBTimeModeDefault: 30.0,
+	FBTimeMode.kFBTimeMode1000Frames: 1000.0,
+	FBTimeMode.kFBTimeMode120Frames: 120.0,
+	FBTimeMode.kFBTimeMode100Frames: 100.0,
+	FBTimeMode.kFBTimeMode96Frames: 96.0,
+	FBTimeMode.kFBTimeMode72Frames: 72.0,
+	FBTimeMode.kFBTimeMode60Frames: 60.0,
+	FBTimeMode.kFBTimeMode5994Frames: 60000.0 / 1001.0,
+	FBTimeMode.kFBTimeMode50Frames: 50.0,
+	FBTimeMode.kFBTimeMode48Frames: 48.0,
+	FBTimeMode.kFBTimeMode30Frames: 30.0,
+	FBTimeMode.kFBTimeMode2997Frames: 30000.0 / 1001.0,
+	FBTimeMode.kFBTimeMode2997Frames_Drop: 30000.0 / 1001.0,
+	FBTimeMode.kFBTimeMode25Frames: 25.0,
+	FBTimeMode.kFBTimeMode24Frames: 24.0,
+	FBTimeMode.kFBTimeMode23976Frames: 24000.0 / 1001.0,
+	FBTimeMode.kFBTimeModeCustom: 0.0,
+}
+
+# current transport mode and fps, shared by FBTime and FBPlayerControl
+_transport = [FBTimeMode.kFBTimeMode30Frames, 30.0]
+
+########## TIME ##########
+
+TICKS_PER_SECOND = 46186158000
+
+@_public
+class FBTime(object):
+	''' Time stored in MotionBuilder ticks, frames use the transport fps '''
+
+	__slots__ = ('_ticks',)
+
+	def __init__(self, *args):
+		if len(args) == 1:
+			self._ticks = int(args[0])
+		elif len(args) == 0:
+			self._ticks = 0
+		else:
+			hours, minutes, seconds = args[0], args[1], args[2]
+			frame = args[3] if len(args) > 3 else 0
+			seconds = hours * 3600 + minutes * 60 + seconds
+			self._ticks = int(round((seconds + frame / _transport[1]) * TICKS_PER_SECOND))
+
+	def Get(self):
+		return self._ticks
+
+	def Set(self, ticks):
+		self._ticks = int(ticks)
+
+	def GetFrame(self, timemode = None):
+		fps = _MODE_FPS.get(timemode) or _transport[1]
+		return int(math.floor(self._ticks * fps / TICKS_PER_SECOND + 1e-6))
+
+	def GetSecondDouble(self):
+		return self._ticks / float(TICKS_PER_SECOND)
+
+	def SetSecondDouble(self, seconds):
+		self._ticks = int(round(seconds * TICKS_PER_SECOND))
+
+	def SetFrame(self, frame):
+		self._ticks = int(round(frame / _transport[1] * TICKS_PER_SECOND))
+
+	def __eq__(self, other):
+		return isinstance(other, FBTime) and self._ticks == other._ticks
+
+	def __ne__(self, other):
+		return not self == other
+
+	def __lt__(self, other):
+		return self._ticks < other._ticks
+
+	def __le__(self, other):
+		return self._ticks <= other._ticks
+
+	def __gt__(self, other):
+		return self._ticks > other._ticks
+
+	def __ge__(self, other):
+		return self._ticks >= other._ticks
+
+	def __hash__(self):
+		return hash(self._ticks)
+
+	def __add__(self, other):
+		return FBTime(self._ticks + other._ticks)
+
+	def __sub__(self, other):
+		return FBTime(self._ticks - other._ticks)
+
+	def __repr__(self):
+		return "FBTime({})".format(self.GetFrame())
+
+FBTime.Infinity = FBTime(2 ** 62)
+FBTime.MinusInfinity = FBTime(-2 ** 62)
+
+@_public
+class FBTimeSpan(object):
+	''' Start/stop time pair '''
+
+	def __init__(self, start = None, stop = None):
+		self._start = FBTime(start.Get()) if start is not None else FBTime(0)
+		self._stop = FBTime(stop.Get()) if stop is not None else FBTime(0)
+
+	def GetStart(self):
+		return self._start
+
+	def GetStop(self):
+		return self._stop
+
+	def GetDuration(self):
+		return self._stop - self._start
+
+	def Set(self, start, stop):
+		self._start = FBTime(start.Get())
+		self._stop = FBTime(stop.Get())
+
+	def __repr__(self):
+		return "FBTimeSpan({}, {})".format(self._start.GetFrame(), self._stop.GetFrame())
+
+########## MATH ##########
+
+@_public
+class FBVector3d(list):
+	''' 3 doubles vector '''
+
+	def __init__(self, x = 0.0, y = 0.0, z = 0.0):
+		if isinstance(x, (list, tuple)):
+			x, y, z = x
+		list.__init__(self, (float(x), float(y), float(z)))
+
+@_public
+class FBMatrix(list):
+	''' 4x4 column major matrix (translation in 12, 13, 14) '''
+
+	def __init__(self, values = None):
+		list.__init__(self, values if values is not None else _IDENTITY)
+
+_IDENTITY = (1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0)
+
+def _compose(t, r, s):
+	# column major T * Rz * Ry * Rx * S (MotionBuilder default XYZ rotation order)
+	rx, ry, rz = math.radians(r[0]), math.radians(r[1]), math.radians(r[2])
+	cx, sx = math.cos(rx), math.sin(rx)
+	cy, sy = math.cos(ry), math.sin(ry)
+	cz, sz = math.cos(rz), math.sin(rz)
+	return [
+		cz * cy * s[0], sz * cy * s[0], -sy * s[0], 0.0,
+		(cz * sy * sx - sz * cx) * s[1], (sz * sy * sx + cz * cx) * s[1], cy * sx * s[1], 0.0,
+		(cz * sy * cx + sz * sx) * s[2], (sz * sy * cx - cz * sx) * s[2], cy * cx * s[2], 0.0,
+		t[0], t[1], t[2], 1.0,
+	]
+
+def _mul(a, b):
+	# column major a * b
+	out = [0.0] * 16
+	for c in range(4):
+		b0, b1, b2, b3 = b[c * 4], b[c * 4 + 1], b[c * 4 + 2], b[c * 4 + 3]
+		for r in range(4):
+			out[c * 4 + r] = a[r] * b0 + a[4 + r] * b1 + a[8 + r] * b2 + a[12 + r] * b3
+	return out
+
+def _decompose(m):
+	# translation, XYZ euler rotation (degrees) and scale of a column major matrix
+	sx = math.sqrt(m[0] ** 2 + m[1] ** 2 + m[2] ** 2) or 1.0
+	sy = math.sqrt(m[4] ** 2 + m[5] ** 2 + m[6] ** 2) or 1.0
+	sz = math.sqrt(m[8] ** 2 + m[9] ** 2 + m[10] ** 2) or 1.0
+	r20 = max(-1.0, min(1.0, m[2] / sx))
+	ry = math.asin(-r20)
+	if abs(r20) < 0.9999999:
+		rx = math.atan2(m[6] / sy, m[10] / sz)
+		rz = math.atan2(m[1] / sx, m[0] / sx)
+	else:
+		rx = math.atan2(-m[9] / sz, m[5] / sy)
+		rz = 0.0
+	return (m[12], m[13], m[14]), (math.degrees(rx), math.degrees(ry), math.degrees(rz)), (sx, sy, sz)
+
+########## EVENTS ##########
+
+class _Event(object):
+	''' Callback list with the FBEvent Add/Remove interface '''
+
+	def __init__(self):
+		self._callbacks = []
+
+	def Add(self, callback):
+		self._callbacks.append(callback)
+
+	def Remove(self, callback):
+		if callback in self._callbacks:
+			self._callbacks.remove(callback)
+
+	def RemoveAll(self):
+		del self._callbacks[:]
+
+	def fire(self, control = None, event = None):
+		for callback in list(self._callbacks):
+			callback(control, event)
+
+@_public
+class FBEventSceneChange(object):
+	''' Scene change event: type and component '''
+
+	def __init__(self, event_type, component = None):
+		self.Type = event_type
+		self.Component = component
+		self.ChildComponent = component
+
+########## COMPONENTS ##########
+
+class FBPropertyListComponent(list):
+	''' Scene collection '''
+
+@_public
+class FBProperty(object):
+	''' Generic named property, list-like when used as a character slot '''
+
+	def __init__(self, name, data = None):
+		self.Name = name
+		self.Data = data
+		self._items = []
+
+	def append(self, comp):
+		self._items.append(comp)
+
+	def __len__(self):
+		return len(self._items)
+
+	def __getitem__(self, idx):
+		return self._items[idx]
+
+	def __iter__(self):
+		return iter(self._items)
+
+class FBPropertyManager(object):
+	''' Property lookup of a component '''
+
+	def __init__(self):
+		self._props = {}
+
+	def Find(self, name):
+		return self._props.get(name)
+
+	def add(self, name, data = None):
+		prop = self._props[name] = FBProperty(name, data)
+		return prop
+
+	def __iter__(self):
+		return iter(self._props.values())
+
+	def __len__(self):
+		return len(self._props)
+
+@_public
+class FBComponent(object):
+	''' Base of all scene objects '''
+
+	# scene collections the component type belongs to, besides Components
+	_collections = ()
+
+	def __init__(self, name = ''):
+		namespace, _, short_name = name.rpartition(':')
+		self._name = short_name
+		self._namespace = namespace
+		self.Selected = False
+		self._props = None
+		self._src = []
+		self._dst = []
+		self._deleted = False
+		_scene._register(self)
+
+	def _get_name(self):
+		return self._name
+
+	def _set_name(self, name):
+		old = self.LongName
+		self._name = name
+		_scene._renamed(self, old)
+
+	Name = property(_get_name, _set_name)
+
+	@property
+	def LongName(self):
+		if self._namespace:
+			return self._namespace + ':' + self._name
+		return self._name
+
+	@property
+	def PropertyList(self):
+		if self._props is None:
+			self._props = FBPropertyManager()
+		return self._props
+
+	def ConnectSrc(self, comp):
+		self._src.append(comp)
+		comp._dst.append(self)
+		return True
+
+	def GetSrcCount(self):
+		return len(self._src)
+
+	def GetSrc(self, idx):
+		return self._src[idx]
+
+	def GetDstCount(self):
+		return len(self._dst)
+
+	def GetDst(self, idx):
+		return self._dst[idx]
+
+	def FBDelete(self):
+		_scene._unregister(self)
+		for comp in self._src:
+			comp._dst.remove(self)
+		for comp in self._dst:
+			comp._src.remove(self)
+		self._src = []
+		self._dst = []
+		self._deleted = True
+
+	def __repr__(self):
+		return "{}({!r})".format(type(self).__name__, self.LongName)
+
+########## ANIMATION ##########
+
+@_public
+class FBFCurveKey(object):
+	''' View on one key of an FCurve '''
+
+	__slots__ = ('_curve', '_idx')
+
+	def __init__(self, curve, idx):
+		self._curve = curve
+		self._idx = idx
+
+	@property
+	def Time(self):
+		return FBTime(self._curve._t[self._idx])
+
+	@property
+	def Value(self):
+		return self._curve._v[self._idx]
+
+	@Value.setter
+	def Value(self, value):
+		self._curve._v[self._idx] = float(value)
+
+	@property
+	def Interpolation(self):
+		return self._curve._i[self._idx]
+
+	@property
+	def TangentMode(self):
+		return self._curve._m[self._idx]
+
+class _KeyList(object):
+	''' Read-only list of keys of an FCurve '''
+
+	__slots__ = ('_curve',)
+
+	def __init__(self, curve):
+		self._curve = curve
+
+	def __len__(self):
+		return len(self._curve._t)
+
+	def __getitem__(self, idx):
+		if idx < 0:
+			idx += len(self._curve._t)
+		if not 0 <= idx < len(self._curve._t):
+			raise IndexError(idx)
+		return FBFCurveKey(self._curve, idx)
+
+	def __iter__(self):
+		for idx in range(len(self._curve._t)):
+			yield FBFCurveKey(self._curve, idx)
+
+@_public
+class FBFCurve(object):
+	''' Keys stored as parallel lists of ticks, values, interpolations and tangent modes '''
+
+	def __init__(self):
+		self._t = []
+		self._v = []
+		self._i = []
+		self._m = []
+
+	@property
+	def Keys(self):
+		return _KeyList(self)
+
+	def KeyAdd(self, time, value, interpolation = FBInterpolation.kFBInterpolationCubic, tangent = FBTangentMode.kFBTangentModeAuto):
+		ticks = time.Get()
+		idx = bisect.bisect_left(self._t, ticks)
+		if idx < len(self._t) and self._t[idx] == ticks:
+			self._v[idx] = float(value)
+			self._i[idx] = interpolation
+			self._m[idx] = tangent
+		else:
+			self._t.insert(idx, ticks)
+			self._v.insert(idx, float(value))
+			self._i.insert(idx, interpolation)
+			self._m.insert(idx, tangent)
+		return idx
+
+	def KeyDeleteByTimeRange(self, start = None, stop = None, inclusive = True):
+		lo = 0 if start is None else (bisect.bisect_left if inclusive else bisect.bisect_right)(self._t, start.Get())
+		hi = len(self._t) if stop is None else (bisect.bisect_right if inclusive else bisect.bisect_left)(self._t, stop.Get())
+		if lo < hi:
+			self.KeyDeleteByIndexRange(lo, hi - 1)
+		return True
+
+	def KeyDeleteByIndexRange(self, start, stop):
+		del self._t[start:stop + 1]
+		del self._v[start:stop + 1]
+		del self._i[start:stop + 1]
+		del self._m[start:stop + 1]
+		return True
+
+	def EditBegin(self, count = -1):
+		return True
+
+	def EditEnd(self, count = -1):
+		return True
+
+	def EditClear(self):
+		self._t = []
+		self._v = []
+		self._i = []
+		self._m = []
+
+	def Evaluate(self, time):
+		# linear interpolation, constant outside the keyed range
+		t = self._t
+		if not t:
+			return 0.0
+		ticks = time.Get()
+		idx = bisect.bisect_right(t, ticks)
+		if idx == 0:
+			return self._v[0]
+		if idx == len(t):
+			return self._v[-1]
+		t0, t1 = t[idx - 1], t[idx]
+		v0, v1 = self._v[idx - 1], self._v[idx]
+		if self._i[idx - 1] == FBInterpolation.kFBInterpolationConstant:
+			return v0
+		return v0 + (v1 - v0) * (ticks - t0) / float(t1 - t0)
+
+	def _copy(self):
+		curve = FBFCurve()
+		curve._t = list(self._t)
+		curve._v = list(self._v)
+		curve._i = list(self._i)
+		curve._m = list(self._m)
+		return curve
+
+@_public
+class FBAnimationNode(object):
+	''' Animation node tree, leaf nodes hold one FCurve per take '''
+
+	def __init__(self, name, parent = None):
+		self.Name = name
+		self.Parent = parent
+		self.Nodes = []
+		self._curves = None
+		# take of the FCurve, the current one when None (see FBPropertyAnimatable.GetAnimationNode)
+		self._take = None
+
+	@property
+	def FCurve(self):
+		if self._curves is None:
+			return None
+		take = self._take or _system.CurrentTake
+		# base layer curves are keyed by take, the other layers by (take, layer index)
+		key = take if not take._layer else (take, take._layer)
+		curve = self._curves.get(key)
+		if curve is None:
+			curve = self._curves[key] = FBFCurve()
+		return curve
+
+	def _leaf(self):
+		self._curves = {}
+		return self
+
+	def _for_take(self, take, parent = None):
+		# view of the node tree sharing the curves, its FCurve is the one of the take
+		node = FBAnimationNode(self.Name, parent or self.Parent)
+		node._curves = self._curves
+		node._take = take
+		node.Nodes = [child._for_take(take, node) for child in self.Nodes]
+		return node
+
+# property name, component index of the model local transform, animation node name
+_CHANNELS = (('Translation', 0, 'Lcl Translation'), ('Rotation', 1, 'Lcl Rotation'), ('Scaling', 2, 'Lcl Scaling'))
+
+@_public
+class FBPropertyAnimatableVector3d(FBVector3d):
+	''' Snapshot of a model transform property that can be animated '''
+
+	def __init__(self, model, channel):
+		FBVector3d.__init__(self, model._local[channel])
+		self._model = model
+		self._channel = channel
+		self.Name = _CHANNELS[channel][2]
+
+	@property
+	def Data(self):
+		return FBVector3d(self._model._local[self._channel])
+
+	@Data.setter
+	def Data(self, value):
+		self._model._set_local(self._channel, value)
+
+	def SetAnimated(self, animated):
+		if animated:
+			self._model._animation_node(self._channel)
+		return True
+
+	def IsAnimated(self):
+		return self._model._anim is not None and self._model._anim[self._channel] is not None
+
+	def GetAnimationNode(self, take = None):
+		if not self.IsAnimated():
+			return None
+		node = self._model._anim[self._channel]
+		return node if take is None else node._for_take(take)
+
+########## MODELS ##########
+
+@_public
+class FBModel(FBComponent):
+	''' Scene model with a local transform, a parent and children '''
+
+	def __init__(self, name = ''):
+		self._parent = None
+		self.Children = []
+		self._local = [[0.0, 0.0, 0.0], [0.0, 0.0, 0.0], [1.0, 1.0, 1.0]]
+		self._anim = None
+		self._root_node = None
+		self._global = None
+		self._stamp = -1
+		self.Visibility = True
+		self.Show = True
+		# rotation options, only used when RotationActive is set (the stand-in evaluates plain XYZ rotations)
+		self.RotationActive = False
+		self.RotationOrder = FBModelRotationOrder.kFBEulerXYZ
+		self.PreRotation = FBVector3d()
+		self.PostRotation = FBVector3d()
+		FBComponent.__init__(self, name)
+
+	def _get_parent(self):
+		return self._parent
+
+	def _set_parent(self, parent):
+		if self._parent is not None:
+			self._parent.Children.remove(self)
+		self._parent = parent
+		if parent is not None:
+			parent.Children.append(self)
+		_scene._edited()
+
+	Parent = property(_get_parent, _set_parent)
+
+	def _set_local(self, channel, value):
+		self._local[channel] = [float(value[0]), float(value[1]), float(value[2])]
+		_scene._edited()
+
+	def _transform_property(channel):
+		def getter(self):
+			return FBPropertyAnimatableVector3d(self, channel)
+		def setter(self, value):
+			self._set_local(channel, value)
+		return property(getter, setter)
+
+	Translation = _transform_property(0)
+	Rotation = _transform_property(1)
+	Scaling = _transform_property(2)
+	del _transform_property
+
+	@property
+	def AnimationNode(self):
+		if self._root_node is None:
+			self._root_node = FBAnimationNode(self.Name)
+		return self._root_node
+
+	def _animation_node(self, channel):
+		# create the animation node of a transform channel (3 leaf nodes X, Y, Z)
+		if self._anim is None:
+			self._anim = [None, None, None]
+		node = self._anim[channel]
+		if node is None:
+			node = self._anim[channel] = FBAnimationNode(_CHANNELS[channel][2], self.AnimationNode)
+			for axis in 'XYZ':
+				node.Nodes.append(FBAnimationNode(axis, node)._leaf())
+			self.AnimationNode.Nodes.append(node)
+			_scene._animated.add(self)
+		return node
+
+	def _evaluate(self, time):
+		# set the local transform from the current take curves
+		for channel in range(3):
+			node = self._anim[channel]
+			if node is None:
+				continue
+			values = self._local[channel]
+			for axis, leaf in enumerate(node.Nodes):
+				curve = leaf._curves.get(_system.CurrentTake)
+				if curve is not None and curve._t:
+					values[axis] = curve.Evaluate(time)
+
+	def _global_matrix(self):
+		if self._stamp != _scene._stamp:
+			local = _compose(*self._local)
+			if self._parent is not None:
+				self._global = _mul(self._parent._global_matrix(), local)
+			else:
+				self._global = local
+			self._stamp = _scene._stamp
+		return self._global
+
+	def GetVector(self, vector, transform_type = FBModelTransformationType.kModelTranslation, is_global = True):
+		if is_global:
+			values = _decompose(self._global_matrix())[int(transform_type)]
+		else:
+			values = self._local[int(transform_type)]
+		vector[0], vector[1], vector[2] = values
+
+	def SetVector(self, vector, transform_type = FBModelTransformationType.kModelTranslation, is_global = True):
+		channel = int(transform_type)
+		if is_global and self._parent is not None and channel == 0:
+			# world translation back to parent space
+			inverse = _invert(self._parent._global_matrix())
+			x, y, z = vector
+			vector = [inverse[0] * x + inverse[4] * y + inverse[8] * z + inverse[12], inverse[1] * x + inverse[5] * y + inverse[9] * z + inverse[13], inverse[2] * x + inverse[6] * y + inverse[10] * z + inverse[14]]
+		self._set_local(channel, vector)
+
+	def GetMatrix(self, matrix, transform_type = FBModelTransformationType.kModelTransformation, is_global = True):
+		if is_global:
+			values = self._global_matrix()
+		else:
+			values = _compose(*self._local)
+		matrix[:] = values
+
+	def FBDelete(self):
+		if self._parent is not None:
+			self._parent.Children.remove(self)
+			self._parent = None
+		for child in list(self.Children):
+			child._parent = None
+		self.Children = []
+		_scene._animated.discard(self)
+		FBComponent.FBDelete(self)
+		_scene._edited()
+
+def _invert(m):
+	# inverse of an affine column major matrix
+	a, b, c = m[0], m[4], m[8]
+	d, e, f = m[1], m[5], m[9]
+	g, h, i = m[2], m[6], m[10]
+	det = a * (e * i - f * h) - b * (d * i - f * g) + c * (d * h - e * g)
+	if not det:
+		return list(_IDENTITY)
+	inv = [
+		(e * i - f * h) / det, -(d * i - f * g) / det, (d * h - e * g) / det, 0.0,
+		-(b * i - c * h) / det, (a * i - c * g) / det, -(a * h - b * g) / det, 0.0,
+		(b * f - c * e) / det, -(a * f - c * d) / det, (a * e - b * d) / det, 0.0,
+		0.0, 0.0, 0.0, 1.0,
+	]
+	tx, ty, tz = m[12], m[13], m[14]
+	inv[12] = -(inv[0] * tx + inv[4] * ty + inv[8] * tz)
+	inv[13] = -(inv[1] * tx + inv[5] * ty + inv[9] * tz)
+	inv[14] = -(inv[2] * tx + inv[6] * ty + inv[10] * tz)
+	return inv
+
+@_public
+class FBModelNull(FBModel):
+	''' Null model '''
+
+	def __init__(self, name = ''):
+		FBModel.__init__(self, name)
+		self.Size = 100.0
+
+@_public
+class FBModelSkeleton(FBModel):
+	''' Skeleton joint '''
+
+@_public
+class FBModelRoot(FBModel):
+	''' Skeleton root '''
+
+@_public
+class FBModelCube(FBModel):
+	''' Geometry stand-in '''
+
+@_public
+class FBCamera(FBModel):
+	''' Camera '''
+
+@_public
+class FBModelList(list):
+	''' List of models '''
+
+@_public
+def FBGetSelectedModels(model_list, parent = None, selected = True, sort_by_select_order = False):
+	for comp in _scene.Components:
+		if isinstance(comp, FBModel) and comp.Selected == selected:
+			model_list.append(comp)
+
+@_public
+def FBFindModelByLabelName(name):
+	comp = _scene._by_name.get(name)
+	if isinstance(comp, FBModel):
+		return comp
+	return None
+
+########## OTHER COMPONENTS ##########
+
+@_public
+class FBMaterial(FBComponent):
+	_collections = ('Materials',)
+
+@_public
+class FBShader(FBComponent):
+	_collections = ('Shaders',)
+
+@_public
+class FBTexture(FBComponent):
+	_collections = ('Textures',)
+
+@_public
+class FBFolder(FBComponent):
+	_collections = ('Folders',)
+
+@_public
+class FBNote(FBComponent):
+	_collections = ('Notes',)
+
+@_public
+class FBHandle(FBComponent):
+	_collections = ('Handles',)
+
+@_public
+class FBControlSet(FBComponent):
+	_collections = ('ControlSets',)
+
+@_public
+class FBCharacterExtension(FBComponent):
+	_collections = ('CharacterExtensions',)
+
+@_public
+class FBCharacterPose(FBComponent):
+	_collections = ('CharacterPoses',)
+
+@_public
+class FBObjectPose(FBComponent):
+	_collections = ('ObjectPoses',)
+
+@_public
+class FBKeyingGroup(FBComponent):
+	_collections = ('KeyingGroups',)
+
+@_public
+class FBVideoClip(FBComponent):
+	_collections = ('VideoClips',)
+
+@_public
+class FBUserObject(FBComponent):
+	_collections = ('UserObjects',)
+
+@_public
+class FBConstraint(FBComponent):
+	''' Constraint with reference groups (0 = constrained, 1 = source) '''
+
+	_collections = ('Constraints',)
+
+	def __init__(self, name = '', type_name = ''):
+		FBComponent.__init__(self, name)
+		self._refs = [[], []]
+		self.Weight = 100.0
+		self.Active = False
+		self.TypeName = type_name
+
+	def ReferenceAdd(self, group, model):
+		self._refs[group].append(model)
+		return True
+
+	def ReferenceGroupGetCount(self):
+		return len(self._refs)
+
+	def ReferenceGetCount(self, group):
+		return len(self._refs[group])
+
+	def ReferenceGet(self, group, idx = 0):
+		return self._refs[group][idx]
+
+	def Snap(self):
+		return True
+
+_CONSTRAINT_TYPES = ['Aim', 'Expression', 'Multi Referential', 'Parent/Child', 'Path', 'Position', 'Range', 'Relation', 'Rigid Body', '3 Points', 'Rotation', 'Scale', 'Mapping', 'Chain IK', 'Spline IK']
+
+@_public
+class FBConstraintManager(object):
+	''' Constraint factory '''
+
+	def TypeGetCount(self):
+		return len(_CONSTRAINT_TYPES)
+
+	def TypeGetName(self, idx):
+		return _CONSTRAINT_TYPES[idx]
+
+	def TypeCreateConstraint(self, idx):
+		return FBConstraint(_CONSTRAINT_TYPES[idx], _CONSTRAINT_TYPES[idx])
+
+########## CHARACTERS ##########
+
+# HIK slot names, each exposed as "<name>Link" on a character
+HIK_JOINTS = ['Hips', 'Spine', 'Spine1', 'Spine2', 'Neck', 'Head',
+	'LeftShoulder', 'LeftArm', 'LeftForeArm', 'LeftHand',
+	'RightShoulder', 'RightArm', 'RightForeArm', 'RightHand',
+	'LeftUpLeg', 'LeftLeg', 'LeftFoot', 'LeftToeBase',
+	'RightUpLeg', 'RightLeg', 'RightFoot', 'RightToeBase']
+
+# parent of each HIK joint (None for the hips)
+HIK_PARENTS = {'Hips': None, 'Spine': 'Hips', 'Spine1': 'Spine', 'Spine2': 'Spine1', 'Neck': 'Spine2', 'Head': 'Neck',
+	'LeftShoulder': 'Spine2', 'LeftArm': 'LeftShoulder', 'LeftForeArm': 'LeftArm', 'LeftHand': 'LeftForeArm',
+	'RightShoulder': 'Spine2', 'RightArm': 'RightShoulder', 'RightForeArm': 'RightArm', 'RightHand': 'RightForeArm',
+	'LeftUpLeg': 'Hips', 'LeftLeg': 'LeftUpLeg', 'LeftFoot': 'LeftLeg', 'LeftToeBase': 'LeftFoot',
+	'RightUpLeg': 'Hips', 'RightLeg': 'RightUpLeg', 'RightFoot': 'RightLeg', 'RightToeBase': 'RightFoot'}
+
+@_public
+class FBCharacter(FBComponent):
+	''' Character with one "<joint>Link" slot per HIK joint '''
+
+	_collections = ('Characters',)
+
+	def __init__(self, name = ''):
+		FBComponent.__init__(self, name)
+		for joint in HIK_JOINTS:
+			self.PropertyList.add(joint + 'Link')
+		self._characterized = False
+
+	def SetCharacterizeOn(self, on):
+		self._characterized = bool(on)
+		return True
+
+	def GetCharacterize(self):
+		return self._characterized
+
+	def _linked_models(self):
+		return [prop[0] for prop in self.PropertyList if prop.Name.endswith('Link') and len(prop)]
+
+	def PlotAnimation(self, where, options):
+		# bake every frame of the current take on the linked joints
+		models = self._linked_models()
+		span = _system.CurrentTake.LocalTimeSpan
+		fps = _transport[1]
+		start, stop = span.GetStart().GetFrame(), span.GetStop().GetFrame()
+		for frame in range(start, stop + 1):
+			time = FBTime(int(round(frame / fps * TICKS_PER_SECOND)))
+			_scene._evaluate(time)
+			if where == FBCharacterPlotWhere.kFBCharacterPlotOnSkeleton:
+				for model in models:
+					_key_model(model, time)
+		return True
+
+@_public
+class FBPlotOptions(object):
+	''' Plot settings '''
+
+	def __init__(self):
+		self.ConstantKeyReducerKeepOneKey = False
+		self.PlotAllTakes = False
+		self.PlotOnFrame = True
+		self.PlotPeriod = FBTime(0, 0, 0, 1)
+		self.PlotTranslationOnRootOnly = False
+		self.PreciseTimeDiscontinuities = False
+		self.RotationFilterToApply = FBRotationFilter.kFBRotationFilterNone
+		self.UseConstantKeyReducer = False
+
+@_public
+class FBFbxOptions(object):
+	''' File save/load settings '''
+
+	def __init__(self, load, path = None):
+		self.SaveCharacter = True
+		self.SaveControlSet = True
+		self.SaveCharacterExtention = True
+		self.ShowFileDialog = False
+		self.ShowOptionslDialog = False
+
+########## TAKES ##########
+
+@_public
+class FBAnimationLayer(FBComponent):
+	''' Animation layer of a take, its curves are stored by the animation nodes '''
+
+@_public
+class FBTake(FBComponent):
+	''' Take holding its own time span, FCurves live in the animation nodes keyed by take '''
+
+	def __init__(self, name = ''):
+		FBComponent.__init__(self, name)
+		self.LocalTimeSpan = FBTimeSpan(FBTime(0, 0, 0, 0), FBTime(0, 0, 0, 100))
+		self.ReferenceTimeSpan = FBTimeSpan(FBTime(0, 0, 0, 0), FBTime(0, 0, 0, 100))
+		self.Comments = ''
+		self._layers = [FBAnimationLayer('BaseAnimation')]
+		self._layer = 0
+
+	def GetLayerCount(self):
+		return len(self._layers)
+
+	def GetLayer(self, idx):
+		return self._layers[idx]
+
+	def GetCurrentLayer(self):
+		return self._layer
+
+	def SetCurrentLayer(self, idx):
+		if not 0 <= idx < len(self._layers):
+			raise IndexError(idx)
+		self._layer = idx
+
+	def CreateNewLayer(self):
+		self._layers.append(FBAnimationLayer('AnimLayer{}'.format(len(self._layers))))
+
+	def CopyTake(self, name):
+		take = FBTake(name)
+		take.LocalTimeSpan = FBTimeSpan(self.LocalTimeSpan.GetStart(), self.LocalTimeSpan.GetStop())
+		take.ReferenceTimeSpan = FBTimeSpan(self.ReferenceTimeSpan.GetStart(), self.ReferenceTimeSpan.GetStop())
+		for model in _scene._animated:
+			for node in model._anim:
+				if node is None:
+					continue
+				for leaf in node.Nodes:
+					curve = leaf._curves.get(self)
+					if curve is not None:
+						leaf._curves[take] = curve._copy()
+		_scene.Takes.append(take)
+		return take
+
+	def PlotTakeOnSelected(self, options):
+		models = [comp for comp in _scene.Components if isinstance(comp, FBModel) and comp.Selected]
+		start, stop = self.LocalTimeSpan.GetStart().GetFrame(), self.LocalTimeSpan.GetStop().GetFrame()
+		for frame in range(start, stop + 1):
+			time = FBTime(0, 0, 0, frame)
+			_scene._evaluate(time)
+			for model in models:
+				_key_model(model, time)
+
+	def FBDelete(self):
+		for model in _scene._animated:
+			for node in model._anim:
+				if node is not None:
+					for leaf in node.Nodes:
+						leaf._curves.pop(self, None)
+		if self in _scene.Takes:
+			_scene.Takes.remove(self)
+		if _system._current_take is self:
+			_system._current_take = _scene.Takes[0] if len(_scene.Takes) else None
+		FBComponent.FBDelete(self)
+
+def _key_model(model, time):
+	# key translation, rotation and scaling of a model on the current take
+	for channel in range(3):
+		node = model._animation_node(channel)
+		values = model._local[channel]
+		for axis, leaf in enumerate(node.Nodes):
+			leaf.FCurve.KeyAdd(time, values[axis])
+
+########## SCENE ##########
+
+_COLLECTIONS = ['Components', 'Constraints', 'Handles', 'UserObjects', 'ControlSets', 'CharacterExtensions',
+	'Characters', 'Materials', 'Shaders', 'Textures', 'Folders', 'ObjectPoses', 'CharacterPoses', 'KeyingGroups',
+	'Notes', 'VideoClips', 'Takes', 'Cameras']
+
+@_public
+class FBScene(object):
+	''' Scene holding every collection and a LongName lookup table '''
+
+	def __init__(self):
+		for name in _COLLECTIONS:
+			setattr(self, name, FBPropertyListComponent())
+		self._by_name = {}
+		self._animated = set()
+		self._stamp = 0
+		self._change_depth = 0
+		self._evaluations = 0
+		self._src = []
+		self.OnChange = _Event()
+
+	def _reset(self):
+		for name in _COLLECTIONS:
+			del getattr(self, name)[:]
+		self._by_name.clear()
+		self._animated.clear()
+		del self._src[:]
+		self._stamp += 1
+		self._evaluations = 0
+		self._changed(FBSceneChangeType.kFBSceneChangeDestroy)
+
+	def _register(self, comp):
+		self.Components.append(comp)
+		for name in comp._collections:
+			getattr(self, name).append(comp)
+		if isinstance(comp, FBCamera):
+			self.Cameras.append(comp)
+		self._by_name[comp.LongName] = comp
+		self._changed(FBSceneChangeType.kFBSceneChangeAttach, comp)
+
+	def _unregister(self, comp):
+		if comp in self.Components:
+			self.Components.remove(comp)
+		for name in comp._collections:
+			collection = getattr(self, name)
+			if comp in collection:
+				collection.remove(comp)
+		if isinstance(comp, FBCamera) and comp in self.Cameras:
+			self.Cameras.remove(comp)
+		if self._by_name.get(comp.LongName) is comp:
+			del self._by_name[comp.LongName]
+		self._changed(FBSceneChangeType.kFBSceneChangeDetach, comp)
+
+	def _renamed(self, comp, old):
+		if self._by_name.get(old) is comp:
+			del self._by_name[old]
+		self._by_name[comp.LongName] = comp
+		self._changed(FBSceneChangeType.kFBSceneChangeRenamed, comp)
+
+	def _changed(self, event_type, comp = None):
+		# OnChange is only fired when someone listens, scene building stays cheap
+		if self.OnChange._callbacks:
+			self.OnChange.fire(self, FBEventSceneChange(event_type, comp))
+
+	def _edited(self):
+		# transforms changed: global matrices are stale and the scene is re-evaluated
+		self._stamp += 1
+		if not self._change_depth:
+			self._evaluate(_system.LocalTime)
+
+	def _evaluate(self, time):
+		self._stale = False
+		self._evaluations += 1
+		pipeline = _evaluate_manager.OnEvaluationPipelineEvent
+		if pipeline._callbacks:
+			pipeline.fire(_evaluate_manager, FBEventEvalGlobalCallback(FBGlobalEvalCallbackTiming.kFBGlobalEvalCallbackBeforeDAG))
+		for model in self._animated:
+			model._evaluate(time)
+		self._stamp += 1
+		if pipeline._callbacks:
+			pipeline.fire(_evaluate_manager, FBEventEvalGlobalCallback(FBGlobalEvalCallbackTiming.kFBGlobalEvalCallbackAfterDAG))
+
+	def Evaluate(self):
+		self._evaluate(_system.LocalTime)
+
+	def ConnectSrc(self, comp):
+		self._src.append(comp)
+		return True
+
+@_public
+class FBSystem(object):
+	''' System singleton: scene, current take and local time '''
+
+	_instance = None
+
+	def __new__(cls):
+		if cls._instance is None:
+			cls._instance = object.__new__(cls)
+			cls._instance.Scene = _scene
+			cls._instance._current_take = None
+			cls._instance.LocalTime = FBTime(0)
+			cls._instance.OnUIIdle = _Event()
+		return cls._instance
+
+	def _get_current_take(self):
+		return self._current_take
+
+	def _set_current_take(self, take):
+		# switching take re-evaluates the scene with the new take curves
+		self._current_take = take
+		_scene._evaluate(self.LocalTime)
+
+	CurrentTake = property(_get_current_take, _set_current_take)
+
+@_public
+class FBApplication(object):
+	''' Application singleton '''
+
+	_instance = None
+
+	def __new__(cls):
+		if cls._instance is None:
+			cls._instance = object.__new__(cls)
+			cls._instance.CurrentCharacter = None
+			cls._instance.FBXFileName = ''
+		return cls._instance
+
+	def FileNew(self):
+		new_scene()
+		return True
+
+	def FileOpen(self, path, show_ui = False, options = None):
+		# stand-in scene files hold the build_scene() arguments as json, anything else opens an empty scene
+		with open(path) as f:
+			content = f.read()
+		try:
+			spec = json.loads(content)
+		except ValueError:
+			spec = None
+		if isinstance(spec, dict):
+			build_scene(**spec)
+		else:
+			new_scene()
+		self.FBXFileName = path
+		return True
+
+	def SaveCharacterRigAndAnimation(self, path, character, options):
+		# binary FBX of the linked joints and their curves on the current take (see write_fbx)
+		take = _system.CurrentTake
+		span = take.LocalTimeSpan
+		curves = {}
+		for model in character._linked_models():
+			channels = curves[model.LongName] = {}
+			for node in model._anim or ():
+				if node is not None:
+					channels[node.Name] = dict((leaf.Name, (leaf.FCurve._t, leaf.FCurve._v)) for leaf in node.Nodes)
+		write_fbx(path, takes = [{'name': take.Name, 'start': span.GetStart().GetFrame(), 'stop': span.GetStop().GetFrame()}], fps = _transport[1],
+			characters = 0, namespaces = 0, geometry = 0, curves = curves)
+		return True
+
+@_public
+class FBPlayerControl(object):
+	''' Transport: goto, key and fps '''
+
+	def Goto(self, time):
+		# like MotionBuilder the scene is not evaluated here: transforms read before the next
+		# FBScene.Evaluate() (or UI idle) are still those of the previous time
+		_system.LocalTime = FBTime(time.Get())
+		_scene._stale = True
+		return True
+
+	def Key(self):
+		for comp in _scene.Components:
+			if isinstance(comp, FBModel) and comp.Selected:
+				_key_model(comp, _system.LocalTime)
+		return True
+
+	def SetTransportFps(self, mode, custom_fps = None):
+		_transport[0] = mode
+		_transport[1] = float(custom_fps) if mode == FBTimeMode.kFBTimeModeCustom else _MODE_FPS[mode]
+
+	def GetTransportFps(self):
+		return _transport[0]
+
+	def GetTransportFpsValue(self):
+		return _transport[1]
+
+########## STORY ##########
+
+@_public
+class FBStoryClip(FBComponent):
+	''' Clip of a Story track, moving Start moves the whole clip '''
+
+	def __init__(self, name, track, take, span, offset):
+		FBComponent.__init__(self, name)
+		self.Track = track
+		self.Take = take
+		self._start = FBTime(offset.Get())
+		self._length = span.GetDuration().Get()
+
+	def _get_start(self):
+		return self._start
+
+	def _set_start(self, time):
+		self._start = FBTime(time.Get())
+
+	Start = property(_get_start, _set_start)
+
+	@property
+	def Stop(self):
+		return FBTime(self._start.Get() + self._length)
+
+	def FBDelete(self):
+		if self in self.Track.Clips:
+			self.Track.Clips.remove(self)
+		FBComponent.FBDelete(self)
+
+@_public
+class FBStoryTrack(FBComponent):
+	''' Story track, created inside a folder '''
+
+	def __init__(self, track_type, folder = None):
+		FBComponent.__init__(self, 'Track')
+		self.Type = track_type
+		self.Details = []
+		self.Clips = []
+		self.Mute = False
+		(folder or _story.RootFolder).Tracks.append(self)
+
+	def CopyTakeIntoTrack(self, span, take, offset = None):
+		start = offset if offset is not None and offset != FBTime.Infinity else span.GetStart()
+		clip = FBStoryClip(take.Name, self, take, span, start)
+		self.Clips.append(clip)
+		return clip
+
+@_public
+class FBStoryFolder(object):
+	''' Story folder '''
+
+	def __init__(self):
+		self.Tracks = []
+		self.Childs = []
+
+@_public
+class FBStory(object):
+	''' Story singleton '''
+
+	_instance = None
+
+	def __new__(cls):
+		if cls._instance is None:
+			cls._instance = object.__new__(cls)
+			cls._instance.Mute = True
+			cls._instance.RootFolder = FBStoryFolder()
+		return cls._instance
+
+########## UI ##########
+
+@_public
+class FBHUD(FBComponent):
+	''' Heads up display '''
+
+@_public
+class FBHUDTextElement(FBComponent):
+	''' Text element of a HUD '''
+
+	def __init__(self, name = ''):
+		FBComponent.__init__(self, name)
+		self.Content = ''
+		self.Font = ''
+		self.Height = 5.0
+		self.Justification = FBHUDElementHAlignment.kFBHUDLeft
+		self.HorizontalDock = FBHUDElementHAlignment.kFBHUDLeft
+		self.VerticalDock = FBHUDElementVAlignment.kFBHUDTop
+
+# answer returned by FBMessageBoxGetUserValue (button, value)
+message_box_answer = [1, '']
+
+@_public
+def FBMessageBoxGetUserValue(title, message, value, input_type, *buttons):
+	return tuple(message_box_answer)
+
+@_public
+def FBMessageBox(title, message, *buttons):
+	return 1
+
+########## CHANGES ##########
+
+@_public
+def FBBeginChangeAllModels():
+	# edits done until FBEndChangeAllModels are evaluated once
+	_scene._change_depth += 1
+
+@_public
+def FBEndChangeAllModels():
+	_scene._change_depth = max(0, _scene._change_depth - 1)
+	if not _scene._change_depth:
+		_scene._evaluate(_system.LocalTime)
+
+@_public
+class FBEventEvalGlobalCallback(object):
+	''' Evaluation pipeline event '''
+
+	def __init__(self, timing):
+		self._timing = timing
+
+	def GetTiming(self):
+		return self._timing
+
+@_public
+class FBEvaluateManager(object):
+	''' Evaluation manager singleton, OnEvaluationPipelineEvent fires around each scene evaluation '''
+
+	_instance = None
+
+	def __new__(cls):
+		if cls._instance is None:
+			cls._instance = object.__new__(cls)
+			cls._instance.OnEvaluationPipelineEvent = _Event()
+		return cls._instance
+
+@_public
+class FBUndoManager(object):
+	''' Undo stack, only the open transactions are tracked '''
+
+	_transactions = []
+
+	def TransactionBegin(self, name):
+		self._transactions.append(name)
+		return True
+
+	def TransactionEnd(self):
+		if self._transactions:
+			self._transactions.pop()
+		return True
+
+	def TransactionIsOpen(self):
+		return bool(self._transactions)
+
+########## SINGLETONS ##########
+
+_scene = FBScene()
+_system = FBSystem()
+_story = FBStory()
+_evaluate_manager = FBEvaluateManager()
+
+def new_scene():
+	''' Empty the scene (keeping the same scene object) with a single "Take 001" '''
+
+	# evaluation callbacks of the previous scene (HUDs) are dropped
+	_scene._reset()
+	_evaluate_manager.OnEvaluationPipelineEvent.RemoveAll()
+	del _story.RootFolder.Tracks[:]
+	_story.Mute = True
+	FBApplication().CurrentCharacter = None
+	take = FBTake('Take 001')
+	_scene.Takes.append(take)
+	_system._current_take = take
+	_system.LocalTime = FBTime(0)
+	FBCamera('Perspective')
+
+new_scene()
+
+def idle(count = 1):
+	''' Fire the UI idle callbacks, as MotionBuilder does between user interactions '''
+
+	for _ in range(count):
+		# the scene is evaluated between interactions when the time moved
+		if getattr(_scene, '_stale', False):
+			_scene._evaluate(_system.LocalTime)
+		_system.OnUIIdle.fire(_system, None)
+
+########## GENERATOR ##########
+
+def build_scene(size = 1000, takes = 8, characters = 2, namespaces = 4, frames = 120, tracks = 2, seed = 0):
+	''' Build a synthetic scene of about size components: keyed characters, takes, Story clips, props and materials '''
+
+	rng = random.Random(seed)
+	new_scene()
+
+	# takes, the first one already exists
+	take_list = [_scene.Takes[0]]
+	take_list[0].Name = 'Take_000'
+	for idx in range(1, takes):
+		take = FBTake('Take_{:03d}'.format(idx))
+		_scene.Takes.append(take)
+		take_list.append(take)
+	for take in take_list:
+		length = frames + rng.randint(0, frames // 2)
+		take.LocalTimeSpan = FBTimeSpan(FBTime(0, 0, 0, 0), FBTime(0, 0, 0, length))
+
+	# characterised skeletons, keyed on every take
+	char_list = []
+	for idx in range(characters):
+		prefix = 'Actor{:02d}_'.format(idx)
+		joints = {}
+		for name in HIK_JOINTS:
+			joint = FBModelSkeleton(prefix + name)
+			parent = HIK_PARENTS[name]
+			if parent:
+				joint._parent = joints[prefix + parent]
+				joint._parent.Children.append(joint)
+				joint._local[0] = [rng.uniform(-5, 5), rng.uniform(5, 20), rng.uniform(-5, 5)]
+			else:
+				joint._local[0] = [0.0, 100.0, 0.0]
+			joints[prefix + name] = joint
+		character = FBCharacter('Actor{:02d}'.format(idx))
+		for name in HIK_JOINTS:
+			character.PropertyList.Find(name + 'Link').append(joints[prefix + name])
+		character.SetCharacterizeOn(True)
+		char_list.append(character)
+
+		for joint in joints.values():
+			phase = rng.uniform(0, math.pi)
+			for channel in (0, 1):
+				node = joint._animation_node(channel)
+				base = joint._local[channel]
+				for take in take_list:
+					length = take.LocalTimeSpan.GetStop().GetFrame()
+					for axis, leaf in enumerate(node.Nodes):
+						curve = leaf._curves[take] = FBFCurve()
+						amplitude = 2.0 if channel == 0 else 30.0
+						curve._t = [int(round(frame / _transport[1] * TICKS_PER_SECOND)) for frame in range(length + 1)]
+						curve._v = [base[axis] + amplitude * math.sin(phase + axis + frame * 0.05) for frame in range(length + 1)]
+						curve._i = [FBInterpolation.kFBInterpolationCubic] * (length + 1)
+						curve._m = [FBTangentMode.kFBTangentModeAuto] * (length + 1)
+	if char_list:
+		FBApplication().CurrentCharacter = char_list[0]
+
+	# Story tracks with one clip per take
+	for idx in range(tracks):
+		track = FBStoryTrack(FBStoryTrackType.kFBStoryTrackCharacter)
+		track.Name = 'Track_{:02d}'.format(idx)
+		offset = 0
+		for take in take_list:
+			track.CopyTakeIntoTrack(take.LocalTimeSpan, take, FBTime(0, 0, 0, offset))
+			offset += take.LocalTimeSpan.GetStop().GetFrame() + 10
+
+	# materials and constraints, some of them orphaned
+	materials = [FBMaterial('Mat_{:03d}'.format(idx)) for idx in range(max(4, size // 200))]
+	constraints = []
+	for idx in range(max(2, size // 500)):
+		constraint = FBConstraint('Const_{:03d}'.format(idx), 'Parent/Child')
+		constraints.append(constraint)
+
+	# props hierarchies filling up the scene, spread over namespaces
+	models = []
+	remaining = size - len(_scene.Components)
+	for idx in range(max(0, remaining)):
+		namespace = 'NS{:02d}'.format(idx % namespaces) if namespaces else ''
+		cls = FBModelCube if idx % 3 else FBModelNull
+		name = 'prop_{:06d}'.format(idx)
+		model = cls(namespace + ':' + name if namespace else name)
+		model._local[0] = [rng.uniform(-500, 500), rng.uniform(0, 200), rng.uniform(-500, 500)]
+		if models and idx % 8:
+			parent = models[rng.randrange(max(0, len(models) - 64), len(models))]
+			model._parent = parent
+			parent.Children.append(model)
+		models.append(model)
+		# only the first half of the materials is used
+		if idx % 7 == 0:
+			model.ConnectSrc(materials[(idx // 7) % (len(materials) // 2)])
+	for idx, constraint in enumerate(constraints):
+		if idx % 2 == 0 and models:
+			constraint.ReferenceAdd(0, models[rng.randrange(len(models))])
+			constraint.ReferenceAdd(1, models[rng.randrange(len(models))])
+
+	_system._current_take = take_list[0]
+	_scene._stamp += 1
+	return {'components': len(_scene.Components), 'takes': len(take_list), 'characters': len(char_list), 'props': len(models)}
+
+########## FBX FILES ##########
+
+# GlobalSettings TimeMode of the common rates, others are written as custom (14)
+_FBX_TIME_MODES = {120.0: 1, 100.0: 2, 60.0: 3, 50.0: 4, 48.0: 5, 30.0: 6, 25.0: 10, 24.0: 11}
+
+# array property type -> struct format
+_FBX_ARRAYS = {'f': 'f', 'd': 'd', 'l': 'q', 'i': 'i'}
+
+def _fbx_property(value):
+	# typed property bytes: ('L', int) for explicit types, str -> S, bytes -> R, float -> D, int -> I, list -> d array
+	# ('f', list) for typed arrays, deflated past 128 bytes as the FBX SDK writes them
+	import struct
+	if isinstance(value, tuple) and value[0] in _FBX_ARRAYS:
+		import zlib
+		code, value = value
+		data = struct.pack('<{}{}'.format(len(value), _FBX_ARRAYS[code]), *value)
+		encoding = 0
+		if len(data) > 128:
+			data = zlib.compress(data)
+			encoding = 1
+		return code.encode() + struct.pack('<III', len(value), encoding, len(data)) + data
+	if isinstance(value, tuple):
+		code, value = value
+		return code.encode() + struct.pack('<' + {'L': 'q', 'I': 'i', 'D': 'd', 'Y': 'h', 'C': '?', 'F': 'f'}[code], value)
+	if isinstance(value, str):
+		raw = value.encode('utf-8')
+		return b'S' + struct.pack('<I', len(raw)) + raw
+	if isinstance(value, bytes):
+		return b'R' + struct.pack('<I', len(value)) + value
+	if isinstance(value, bool):
+		return b'C' + struct.pack('<?', value)
+	if isinstance(value, float):
+		return b'D' + struct.pack('<d', value)
+	if isinstance(value, int):
+		return b'I' + struct.pack('<i', value)
+	data = struct.pack('<{}d'.format(len(value)), *value)
+	return b'd' + struct.pack('<III', len(value), 0, len(data)) + data
+
+def _fbx_record(out, name, props = (), children = (), version = 7400):
+	# append a record and its children to the bytearray, end offsets are absolute
+	import struct
+	fmt = '<QQQB' if version >= 7500 else '<IIIB'
+	null = b'\x00' * (struct.calcsize(fmt) - 1)
+	start = len(out)
+	data = b''.join(_fbx_property(value) for value in props)
+	name = name.encode('utf-8')
+	out += struct.pack(fmt, 0, len(props), len(data), len(name)) + name + data
+	for child in children:
+		_fbx_record(out, *child, version = version)
+	if children:
+		out += null
+	struct.pack_into(fmt, out, start, len(out), len(props), len(data), len(name))
+
+def _fbx_curve_objects(curves, take, new_id):
+	# AnimationStack, layer, curve nodes and curves of {model long name: {property: {axis: (ticks, values)}}},
+	# returns the object and connection records
+	objects = []
+	connections = []
+	stack = new_id()
+	layer = new_id()
+	objects.append(('AnimationStack', [stack, take + '\x00\x01AnimStack', '']))
+	objects.append(('AnimationLayer', [layer, 'BaseLayer\x00\x01AnimLayer', '']))
+	connections.append(('C', ['OO', layer, stack]))
+	for name in sorted(curves):
+		model = new_id()
+		objects.append(('Model', [model, name + '\x00\x01Model', 'LimbNode'], [('Version', [232])]))
+		for prop, axes in sorted(curves[name].items()):
+			node = new_id()
+			objects.append(('AnimationCurveNode', [node, prop.split()[-1][0] + '\x00\x01AnimCurveNode', ''], [('Properties70', (), [
+				('P', ['d|' + axis, 'Number', '', 'A', float(values[0]) if len(values) else 0.0]) for axis, (ticks, values) in sorted(axes.items())])]))
+			connections.append(('C', ['OO', node, layer]))
+			connections.append(('C', ['OP', node, model, prop]))
+			for axis, (ticks, values) in sorted(axes.items()):
+				curve = new_id()
+				objects.append(('AnimationCurve', [curve, '\x00\x01AnimCurve', ''], [
+					('Default', [0.0]),
+					('KeyVer', [4009]),
+					('KeyTime', [('l', [int(tick) for tick in ticks])]),
+					('KeyValueFloat', [('f', [float(value) for value in values])]),
+					('KeyAttrFlags', [('i', [24840])]),
+					('KeyAttrDataFloat', [('f', [0.0, 0.0, 0.0, 0.0])]),
+					('KeyAttrRefCount', [('i', [len(ticks)])]),
+				]))
+				connections.append(('C', ['OP', curve, node, 'd|' + axis]))
+	return objects, connections
+
+def write_fbx(path, takes = 8, frames = 120, fps = 30.0, characters = 2, namespaces = 4, geometry = 10000, version = 7400, seed = 0, curves = None):
+	''' Write a synthetic binary FBX file: settings, characters and namespaced joints, meshes of geometry vertices and takes '''
+
+	# the records follow the layout MotionBuilder writes; returns what fb_fbx_reader should find
+	# takes: a count of synthetic takes or a list of {'name', 'start', 'stop'} spans (frames)
+	# curves: {model long name: {property: {axis: (ticks, values)}}} written as the animation of the first take
+	# (LimbNode models, AnimationCurveNode and AnimationCurve records with deflated KeyTime/KeyValueFloat arrays)
+	rng = random.Random(seed)
+	mode = _FBX_TIME_MODES.get(float(fps), 14)
+	settings = ('GlobalSettings', (), [
+		('Version', [1000]),
+		('Properties70', (), [
+			('P', ['UpAxis', 'int', 'Integer', '', 1]),
+			('P', ['TimeMode', 'enum', '', '', mode]),
+			('P', ['CustomFrameRate', 'double', 'Number', '', float(fps)]),
+		]),
+	])
+
+	objects = []
+	uid = [1000]
+	def new_id():
+		uid[0] += 1
+		return ('L', uid[0])
+	char_names = []
+	namespace_names = ['ns{:02d}'.format(idx) for idx in range(namespaces)]
+	for idx in range(characters):
+		namespace = namespace_names[idx % namespaces] + ':' if namespaces else ''
+		char_names.append(namespace + 'Actor{:02d}'.format(idx))
+		objects.append(('Character', [new_id(), char_names[-1] + '\x00\x01Character', '']))
+		for joint in HIK_JOINTS:
+			objects.append(('Model', [new_id(), namespace + joint + '\x00\x01Model', 'LimbNode'], [('Version', [232])]))
+	for idx in range(max(1, geometry // 1000) if geometry else 0):
+		vertices = [rng.uniform(-100, 100) for _ in range(3 * min(geometry, 1000))]
+		objects.append(('Geometry', [new_id(), 'mesh_{:03d}\x00\x01Geometry'.format(idx), 'Mesh'], [('Vertices', [vertices])]))
+		objects.append(('Model', [new_id(), 'mesh_{:03d}\x00\x01Model'.format(idx), 'Mesh'], [('Version', [232])]))
+
+	take_list = []
+	spans = []
+	if isinstance(takes, int):
+		for idx in range(takes):
+			name = 'Take_{:03d}'.format(idx)
+			spans.append({'name': name, 'start': 0, 'stop': frames + rng.randint(0, frames // 2), 'file': name + '.tak'})
+	else:
+		spans = [{'name': span['name'], 'start': span['start'], 'stop': span['stop'], 'file': span['name'] + '.tak'} for span in takes]
+	for span in spans:
+		ticks = [('L', int(round(span[key] * TICKS_PER_SECOND / fps))) for key in ('start', 'stop')]
+		take_list.append(('Take', [span['name']], [('FileName', [span['file']]), ('LocalTime', ticks), ('ReferenceTime', ticks)]))
+
+	connections = []
+	if curves:
+		curve_objects, connections = _fbx_curve_objects(curves, spans[0]['name'] if spans else 'Take 001', new_id)
+		objects += curve_objects
+
+	out = bytearray(b'Kaydara FBX Binary  \x00\x1a\x00')
+	import struct
+	out += struct.pack('<I', version)
+	records = [('FBXHeaderExtension', (), [('FBXVersion', [version]), ('Creator', ['fb_standin'])]), settings, ('Objects', (), objects)]
+	if connections:
+		records.append(('Connections', (), connections))
+	records.append(('Takes', (), [('Current', [take_list[0][1][0] if take_list else ''])] + take_list))
+	for record in records:
+		_fbx_record(out, *record, version = version)
+	out += b'\x00' * (struct.calcsize('<QQQB' if version >= 7500 else '<IIIB') - 1)
+	# footer
+	out += b'\xfa\xbc\xab\x09\xd0\xc8\xd4\x66\xb1\x76\xfb\x83\x1c\xf7\x26\x7e' + b'\x00' * 4 + struct.pack('<I', version) + b'\x00' * 120
+	with open(path, 'wb') as f:
+		f.write(out)
+
+	return {'fps': float(fps), 'takes': spans, 'characters': char_names, 'namespaces': sorted(set(name.rsplit(':', 1)[0] for name in char_names if ':' in name))}
+
+########## INSTALL ##########
+
+def install():
+	''' Register the stand-in as pyfbsdk (plus the modules fb_library imports) in sys.modules '''
+
+	pyfbsdk = types.ModuleType('pyfbsdk')
+	for name in __all__:
+		setattr(pyfbsdk, name, globals()[name])
+	pyfbsdk.__all__ = list(__all__)
+	sys.modules['pyfbsdk'] = pyfbsdk
+
+	additions = types.ModuleType('pyfbsdk_additions')
+	additions.__all__ = []
+	sys.modules['pyfbsdk_additions'] = additions
+
+	# clipboard kept in memory
+	pyperclip = types.ModuleType('modules.pyperclip')
+	clipboard = ['']
+	def copy(text):
+		clipboard[0] = text if text is not None else ''
+	def paste():
+		return clipboard[0]
+	pyperclip.copy = copy
+	pyperclip.paste = paste
+
+	modules = types.ModuleType('modules')
+	modules.__path__ = []
+	modules.pyperclip = pyperclip
+	modules.datetime = datetime
+	sys.modules['modules'] = modules
+	sys.modules['modules.pyperclip'] = pyperclip
+	sys.modules['modules.datetime'] = datetime
+
+	flib = types.ModuleType('file_system_library')
+	def ensure_dir(path):
+		if path and not os.path.isdir(path):
+			os.makedirs(path)
+	flib.ensure_dir = ensure_dir
+	sys.modules['file_system_library'] = flib
+
+########## COMMAND SERVER ##########
+
+def serve(port = 8765, size = 1000, seed = 0, token = None):
+	''' Run the fb_library command server on a synthetic scene, idling like MotionBuilder until interrupted '''
+
+	import time
+	install()
+	build_scene(size, seed = seed)
+	import fb_library
+	port = fb_library.start_command_server(port, token)
+	print('Serving fb_library on port {} with token {} ({} components), Ctrl+C to stop'.format(port, fb_library.command_server[0].token, len(_scene.Components)))
+	try:
+		while True:
+			idle()
+			time.sleep(0.001)
+	except KeyboardInterrupt:
+		pass
+	finally:
+		fb_library.stop_command_server()
+
+if __name__ == '__main__':
+	import argparse
+	parser = argparse.ArgumentParser(description = 'fb_library command server on a synthetic stand-in scene')
+	parser.add_argument('--port', type = int, default = 8765)
+	parser.add_argument('--size', type = int, default = 1000)
+	parser.add_argument('--seed', type = int, default = 0)
+	parser.add_argument('--token', help = 'shared token of the clients, random if not given')
+	args = parser.parse_args()
+	serve(args.port, args.size, args.seed, args.token)
@@ -0,0 +1,22 @@
+# Author: Alexandre
+## pytest setup: fb_library runs on the fb_standin stand-in of pyfbsdk
+####################################
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fb_standin
+fb_standin.install()
+
+@pytest.fixture
+def lib():
+	''' fb_library on a small synthetic scene, rebuilt for each test '''
+
+	fb_standin.build_scene(size = 300, takes = 3, characters = 1, frames = 40)
+	import fb_library
+	fb_library.invalidate_take_cache()
+	return fb_library
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_mban_round_trip(lib, tmp_path, compress):
+	joints = lib._character_joints(lib.lApp.CurrentCharacter)
+	path = str(tmp_path / "anim.mban")
+	lib.export_animation_binary(path, joints = joints, chunk = 16, compress = compress)
+	data = lib.read_animation_binary(path)
+
+	span = lib.lSys.CurrentTake.LocalTimeSpan
+	frames = np.arange(span.GetStart().GetFrame(), span.GetStop().GetFrame() + 1)
+	assert data["names"] == [joint.LongName for joint in joints]
+	assert np.array_equal(data["frames"], frames)
+	index = dict((joint.LongName, idx) for idx, joint in enumerate(joints))
+	assert data["parents"] == [index.get(joint.Parent.LongName, -1) if joint.Parent is not None else -1 for joint in joints]
+
+	# 16 bit quantization over the range of each channel
+	expected = lib._sample_local_transforms(joints, frames)
+	step = (expected.max(axis = 0) - expected.min(axis = 0)) / 65535.0
+	assert data["values"].shape == expected.shape
+	assert np.all(np.abs(data["values"] - expected) <= step + 1e-4)
@@ -0,0 +1,18 @@
+def test_all_takes_counts_each_take_without_switching(lib, monkeypatch):
+	takes = list(lib.lScene.Takes)
+	before = lib.get_scene_census(all_takes = True)["takes"]
+	assert sorted(before) == sorted(take.Name for take in takes)
+
+	# one more key in the last take only
+	curve = lib.get_comp_by_name("Actor00_Hips").Translation.GetAnimationNode(takes[2]).Nodes[0].FCurve
+	curve.KeyAdd(lib.frame_to_time(500), 1.0)
+
+	system = type(lib.lSys)
+	def set_take(self, take):
+		raise AssertionError("current take switched")
+	monkeypatch.setattr(system, "CurrentTake", property(system.CurrentTake.fget, set_take))
+	after = lib.get_scene_census(all_takes = True)["takes"]
+
+	assert after[takes[2].Name]["keys"] == before[takes[2].Name]["keys"] + 1
+	for take in takes[:2]:
+		assert after[take.Name] == before[take.Name]
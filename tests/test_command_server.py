@@ -0,0 +1,106 @@
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+import fb_command_client
+import fb_standin
+
+@pytest.fixture
+def server(lib):
+	server = lib.CommandServer(token = "secret")
+	server.start()
+	yield server
+	server.stop()
+
+def _serve(server, work, timeout = 5.0):
+	# run the client on a thread while the main thread pumps the idle callback
+	result = {}
+	def target():
+		try:
+			result["value"] = work()
+		except Exception as e:
+			result["error"] = e
+	thread = threading.Thread(target = target)
+	thread.daemon = True
+	thread.start()
+	deadline = time.time() + timeout
+	while thread.is_alive() and time.time() < deadline:
+		fb_standin.idle()
+		time.sleep(0.001)
+	assert not thread.is_alive()
+	return result
+
+def _raw(server, line):
+	# first line sent as is, returns what the server answers before closing
+	sock = socket.create_connection(("127.0.0.1", server.port), 5.0)
+	try:
+		sock.sendall(line)
+		data = b""
+		while True:
+			chunk = sock.recv(4096)
+			if not chunk:
+				return data
+			data += chunk
+	finally:
+		sock.close()
+
+def test_call(server):
+	def work():
+		with fb_command_client.CommandClient(server.port, token = "secret") as client:
+			return client.call("get_take_list")
+	assert _serve(server, work)["value"] == ["Take_000", "Take_001", "Take_002"]
+
+def test_wrong_token_closes_the_connection(server):
+	request = json.dumps({"id": 1, "token": "wrong", "call": "get_take_list"}).encode("utf-8") + b"\n"
+	result = _serve(server, lambda: _raw(server, request))
+	message = json.loads(result["value"].decode("utf-8"))
+	assert not message["ok"] and "invalid token" in message["error"]
+	assert server.stats["requests"] == 0
+
+def test_function_outside_the_allowlist(server):
+	def work():
+		with fb_command_client.CommandClient(server.port, token = "secret") as client:
+			with pytest.raises(fb_command_client.CommandError) as error:
+				client.call("delete_all_takes")
+			# the connection stays usable
+			return str(error.value), client.call("get_current_take_name")
+	message, take = _serve(server, work)["value"]
+	assert "not a served library function" in message
+	assert take == "Take_000"
+
+def test_first_line_not_json_closes_the_connection(server):
+	result = _serve(server, lambda: _raw(server, b"POST / HTTP/1.1\r\nHost: localhost\r\n\r\n"))
+	assert result["value"] == b""
+	assert server.stats["requests"] == 0
+
+def test_client_not_reading_does_not_block_the_main_thread(lib, monkeypatch):
+	# about 20 MB of responses, well past the socket buffers and the send limit
+	fb_standin.build_scene(size = 5000, takes = 1, characters = 1, frames = 10)
+	monkeypatch.setattr(lib, "_COMMAND_SEND_LIMIT", 1 << 20)
+	server = lib.CommandServer(token = "secret")
+	server.start()
+	sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+	sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+	try:
+		sock.settimeout(5.0)
+		sock.connect(("127.0.0.1", server.port))
+		request = {"token": "secret", "call": "get_all_scene_components", "stream": True}
+		sock.sendall(b"".join(json.dumps(dict(request, id = idx)).encode("utf-8") + b"\n" for idx in range(200)))
+		start = time.time()
+		while server.stats["requests"] < 200 and time.time() - start < 10.0:
+			fb_standin.idle()
+		# every request answered on the main thread, the unread responses dropped the connection
+		assert server.stats["requests"] == 200
+		received = 0
+		while True:
+			chunk = sock.recv(1 << 16)
+			if not chunk:
+				break
+			received += len(chunk)
+		assert received < 10 << 20
+	finally:
+		sock.close()
+		server.stop()
@@ -0,0 +1,24 @@
+def _joints(lib):
+	return lib.get_children(lib.get_comp_by_name("Actor00_Hips"), includeParent = True)
+
+def test_batch_keys_sampled_motion_by_take(lib):
+	joints = _joints(lib)
+	takes = [take.Name for take in lib.lScene.Takes]
+	motion = lib.sample_take_motion(takes[0], joints)
+	# the synthetic takes share their motion, move the hips on the second one
+	curve = joints[0].Translation.GetAnimationNode(lib.lScene.Takes[1]).Nodes[0].FCurve
+	curve.Keys[5].Value += 10.0
+	results, failed = lib.compare_motion_batch([(motion, takes[0]), (takes[0], takes[1])], joints)
+	assert sorted(results) == sorted([(takes[0], takes[0]), (takes[0], takes[1])])
+	assert results[(takes[0], takes[0])]["position_max"] == 0.0
+	assert failed == [(takes[0], takes[1])]
+
+def test_batch_records_missing_sources_and_goes_on(lib, tmp_path):
+	joints = _joints(lib)
+	takes = [take.Name for take in lib.lScene.Takes]
+	bake = str(tmp_path / "missing.npz")
+	pairs = [(takes[0], "No Take"), (bake, takes[1]), (takes[1], takes[1])]
+	results, failed = lib.compare_motion_batch(pairs, joints)
+	assert failed == [(takes[0], "No Take"), (bake, takes[1])]
+	assert "error" in results[(takes[0], "No Take")] and "error" in results[(bake, takes[1])]
+	assert results[(takes[1], takes[1])]["rotation_max"] < 1e-3
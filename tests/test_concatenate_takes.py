@@ -0,0 +1,64 @@
+import pytest
+
+def _curve(lib, take):
+	return lib.get_comp_by_name("Actor00_Hips").Translation.GetAnimationNode(take).Nodes[0].FCurve
+
+def _keys(curve):
+	return dict((key.Time.GetFrame(), key.Value) for key in curve.Keys)
+
+def _offset_take(lib, take, offset):
+	# the synthetic takes share their motion, move the hips of one of them
+	for key in _curve(lib, take).Keys:
+		key.Value += offset
+
+def test_takes_end_to_end(lib):
+	takes = list(lib.lScene.Takes)[:2]
+	_offset_take(lib, takes[1], 100.0)
+	current = lib.lSys.CurrentTake.Name
+	new_take = lib.concatenate_takes(takes, "Review", start_frame = 10)
+
+	spans = [(take.LocalTimeSpan.GetStart().GetFrame(), take.LocalTimeSpan.GetStop().GetFrame()) for take in takes]
+	seam = 10 + spans[0][1] - spans[0][0]
+	end = seam + spans[1][1] - spans[1][0]
+	assert (new_take.LocalTimeSpan.GetStart().GetFrame(), new_take.LocalTimeSpan.GetStop().GetFrame()) == (10, end)
+	assert lib.lSys.CurrentTake.Name == current
+
+	keys = _keys(_curve(lib, new_take))
+	first = _keys(_curve(lib, takes[0]))
+	second = _keys(_curve(lib, takes[1]))
+	# the first frame of the second take wins over the last key of the first one at the seam
+	for frame, value in first.items():
+		if spans[0][0] <= frame < spans[0][1]:
+			assert keys[10 + frame - spans[0][0]] == pytest.approx(value)
+	for frame, value in second.items():
+		if spans[1][0] <= frame <= spans[1][1]:
+			assert keys[seam + frame - spans[1][0]] == pytest.approx(value)
+	assert max(keys) <= end
+
+def test_blend_cross_fades_the_overlap(lib):
+	takes = list(lib.lScene.Takes)[:2]
+	_offset_take(lib, takes[1], 100.0)
+	blend = 6
+	new_take = lib.concatenate_takes(takes, "Review", blend_frames = blend)
+
+	spans = [(take.LocalTimeSpan.GetStart().GetFrame(), take.LocalTimeSpan.GetStop().GetFrame()) for take in takes]
+	seam = spans[0][1] - spans[0][0] - blend
+	assert new_take.LocalTimeSpan.GetStop().GetFrame() == seam + spans[1][1] - spans[1][0]
+
+	keys = _keys(_curve(lib, new_take))
+	first = _curve(lib, takes[0])
+	second = _curve(lib, takes[1])
+	for frame in range(blend + 1):
+		weight = frame / float(blend)
+		weight = weight * weight * (3.0 - 2.0 * weight)
+		tail = first.Evaluate(lib.frame_to_time(spans[0][1] - blend + frame))
+		head = second.Evaluate(lib.frame_to_time(spans[1][0] + frame))
+		assert keys[seam + frame] == pytest.approx(tail * (1.0 - weight) + head * weight)
+	# ends of the overlap are the takes themselves
+	assert keys[seam] == pytest.approx(first.Evaluate(lib.frame_to_time(spans[0][1] - blend)))
+	assert keys[seam + blend] == pytest.approx(second.Evaluate(lib.frame_to_time(spans[1][0] + blend)))
+
+def test_blend_longer_than_a_take(lib):
+	takes = list(lib.lScene.Takes)[:2]
+	with pytest.raises(ValueError):
+		lib.concatenate_takes(takes, "Review", blend_frames = 10000)
@@ -0,0 +1,60 @@
+def _copy(lib, name, offset = 0.0, key = None):
+	# copy of the first take, with an offset on the hips X keys (all of them, or only the key at index key)
+	take = lib.lScene.Takes[0].CopyTake(name)
+	keys = lib.get_comp_by_name("Actor00_Hips").Translation.GetAnimationNode(take).Nodes[0].FCurve.Keys
+	for idx, lKey in enumerate(keys):
+		if key is None or idx == key:
+			lKey.Value += offset
+	return take
+
+def test_exact_and_near_groups(lib):
+	_copy(lib, "Exact")
+	_copy(lib, "Near", 0.005)
+	result = lib.dedupe_takes(tolerance = 0.01, precision = 1e-4)
+	assert result["exact"] == [["Take_000", "Exact"]]
+	assert result["near"] == [["Take_000", "Exact", "Near"]]
+	assert result["removed"] == []
+	assert len(lib.lScene.Takes) == 5
+
+def test_near_groups_do_not_chain(lib):
+	_copy(lib, "B", 0.008)
+	_copy(lib, "C", 0.016)
+	result = lib.dedupe_takes(tolerance = 0.01)
+	assert result["exact"] == []
+	# C is within tolerance of B only, groups are measured from their first take
+	assert result["near"] == [["Take_000", "B"]]
+
+def test_stamp_rehash(lib):
+	take = _copy(lib, "Copy")
+	fingerprints = lib.get_take_fingerprints()
+	assert fingerprints["Copy"]["exact"] == fingerprints["Take_000"]["exact"]
+	curve = lib.get_comp_by_name("Actor00_Hips").Translation.GetAnimationNode(take).Nodes[0].FCurve
+
+	# first key edited without the library: the stamp changes and the take is hashed again
+	curve.Keys[0].Value += 1.0
+	assert lib.get_take_fingerprints()["Copy"]["exact"] != fingerprints["Take_000"]["exact"]
+	curve.Keys[0].Value -= 1.0
+	assert lib.get_take_fingerprints()["Copy"]["exact"] == fingerprints["Take_000"]["exact"]
+
+	# a middle key keeps the stamp, only seen with rehash
+	curve.Keys[5].Value += 1.0
+	assert lib.get_take_fingerprints()["Copy"]["exact"] == fingerprints["Take_000"]["exact"]
+	assert lib.get_take_fingerprints(rehash = True)["Copy"]["exact"] != fingerprints["Take_000"]["exact"]
+
+def test_delete_removes_exact_duplicates_only(lib):
+	_copy(lib, "Exact")
+	_copy(lib, "Near", 0.005)
+	# a middle key edit the cache cannot see: delete rehashes before deciding
+	lib.get_take_fingerprints()
+	edited = _copy(lib, "Edited")
+	lib.get_take_fingerprints()
+	lib.get_comp_by_name("Actor00_Hips").Translation.GetAnimationNode(edited).Nodes[0].FCurve.Keys[5].Value += 0.005
+	result = lib.dedupe_takes(action = "delete")
+	assert result["removed"] == ["Exact"]
+	assert [take.Name for take in lib.lScene.Takes] == ["Take_000", "Take_001", "Take_002", "Near", "Edited"]
+
+def test_merge_lists_aliases(lib):
+	_copy(lib, "Exact")
+	result = lib.dedupe_takes(action = "merge")
+	assert result["removed"] == ["Exact"]
+	assert lib.lScene.Takes[0].Comments.endswith("aliases: Exact")
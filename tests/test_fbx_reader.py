@@ -0,0 +1,87 @@
+import os
+
+import pytest
+
+import fb_standin
+import fb_fbx_reader
+
+@pytest.mark.parametrize("version", [7400, 7500])
+def test_read_fbx_info(tmp_path, version):
+	path = str(tmp_path / "shot.fbx")
+	expected = fb_standin.write_fbx(path, takes = 3, fps = 24.0, characters = 2, namespaces = 2, geometry = 2000, version = version)
+	info = fb_fbx_reader.read_fbx_info(path)
+
+	assert info["version"] == version
+	assert info["fps"] == expected["fps"]
+	assert info["takes"] == expected["takes"]
+	assert info["current_take"] == expected["takes"][0]["name"]
+	assert info["characters"] == expected["characters"]
+	assert info["namespaces"] == expected["namespaces"]
+
+def test_custom_fps(tmp_path):
+	path = str(tmp_path / "shot.fbx")
+	fb_standin.write_fbx(path, takes = 1, fps = 29.0, geometry = 0)
+	assert fb_fbx_reader.read_fbx_info(path)["fps"] == 29.0
+
+def test_scan_reports_bad_files(tmp_path):
+	for idx in range(3):
+		fb_standin.write_fbx(str(tmp_path / "shot_{}.fbx".format(idx)), takes = 2, geometry = 1000, seed = idx)
+	with open(str(tmp_path / "broken.fbx"), "wb") as f:
+		f.write(b"not an fbx file")
+	manifest = fb_fbx_reader.scan_fbx_files(str(tmp_path), workers = 1)
+
+	assert sorted(os.path.basename(path) for path in manifest["files"]) == ["shot_0.fbx", "shot_1.fbx", "shot_2.fbx"]
+	assert [os.path.basename(path) for path, _ in manifest["failed"]] == ["broken.fbx"]
+
+def _scene_curves(lib, character):
+	# {(model, property, axis): (ticks, values)} of the linked joints on the current take
+	curves = {}
+	for prop in character.PropertyList:
+		if prop.Name.endswith("Link") and len(prop):
+			model = prop[0]
+			for name in ("Translation", "Rotation", "Scaling"):
+				node = getattr(model, name).GetAnimationNode()
+				for leaf in node.Nodes if node is not None else ():
+					keys = leaf.FCurve.Keys
+					curves[(model.LongName, node.Name, leaf.Name)] = ([key.Time.Get() for key in keys], [key.Value for key in keys])
+	return curves
+
+def test_exported_fbx_holds_the_curve_arrays(lib, tmp_path):
+	path = str(tmp_path / "anim.fbx")
+	character = lib.lApp.CurrentCharacter
+	lib.export_character_animation(path, character.Name)
+	expected = _scene_curves(lib, character)
+
+	with fb_fbx_reader.FbxBinaryReader(path) as reader:
+		objects = reader.find("Objects")
+		names = {}
+		curves = {}
+		for record in reader.children(objects):
+			uid, name = reader.properties(record, 2)
+			names[uid] = fb_fbx_reader._object_name(name)
+			if record[0] == "AnimationCurve":
+				curves[uid] = (reader.array(reader.find("KeyTime", record)), reader.array(reader.find("KeyValueFloat", record)))
+		# curve -> (curve node, "d|X"), curve node -> (model, property)
+		connections = [reader.properties(record) for record in reader.children(reader.find("Connections"))]
+		links = dict((props[1], props[2:]) for props in connections if props[0] == "OP")
+
+	read = {}
+	for uid, (ticks, values) in curves.items():
+		node, axis = links[uid]
+		model, prop = links[node]
+		read[(names[model], prop, axis[2:])] = (list(ticks), list(values))
+	assert sorted(read) == sorted(expected)
+	for key, (ticks, values) in expected.items():
+		assert read[key][0] == ticks
+		assert read[key][1] == pytest.approx(values, rel = 1e-6, abs = 1e-4)
+
+	info = fb_fbx_reader.read_fbx_info(path)
+	assert [take["name"] for take in info["takes"]] == [lib.lSys.CurrentTake.Name]
+
+def test_animation_binary_smaller_than_fbx(lib, tmp_path):
+	character = lib.lApp.CurrentCharacter
+	fbx = str(tmp_path / "anim.fbx")
+	mban = str(tmp_path / "anim.mban")
+	lib.export_character_animation(fbx, character.Name)
+	lib.export_animation_binary(mban)
+	assert os.path.getsize(mban) < os.path.getsize(fbx)
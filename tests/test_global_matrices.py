@@ -0,0 +1,27 @@
+import numpy as np
+
+def _evaluated_matrices(lib, joints, frames):
+	# global matrices read after an explicit evaluation of each frame
+	matrix = lib.FBMatrix()
+	out = []
+	for frame in frames:
+		lib.FBPlayerControl().Goto(lib.frame_to_time(frame))
+		lib.lScene.Evaluate()
+		rows = []
+		for joint in joints:
+			joint.GetMatrix(matrix)
+			rows.append(np.array(list(matrix)).reshape(4, 4).T)
+		out.append(rows)
+	return np.array(out)
+
+def test_sampled_matrices_are_those_of_each_frame(lib):
+	joints = lib.get_children(lib.get_comp_by_name("Actor00_Hips"), includeParent = True)
+	frames, matrices = lib.sample_global_matrices(joints, 0, 12, chunk = 5)
+	assert frames.tolist() == list(range(13))
+	assert np.allclose(matrices, _evaluated_matrices(lib, joints, range(13)))
+
+def test_time_is_restored(lib):
+	lib.go_to_frame(7)
+	joints = [lib.get_comp_by_name("Actor00_Hips")]
+	lib.sample_global_matrices(joints, 0, 3)
+	assert lib.get_current_frame() == 7
@@ -0,0 +1,35 @@
+import time
+
+import numpy as np
+
+def test_flush_writes_into_the_recording_take(lib, monkeypatch):
+	takes = list(lib.lScene.Takes)
+	joints = lib.get_children(lib.get_comp_by_name("Actor00_Hips"), includeParent = True)[:3]
+	lib.lSys.CurrentTake = takes[1]
+	recorder = lib.LiveCaptureRecorder(joints, protocol = "tcp")
+	recorder.start()
+	lib.lSys.CurrentTake = takes[0]
+	curves = [joints[0].Translation.GetAnimationNode(take).Nodes[0].FCurve for take in takes[:2]]
+	before = [[(key.Time.Get(), key.Value) for key in curve.Keys] for curve in curves]
+
+	# record the take switches made by the flush
+	switches = []
+	system = type(lib.lSys)
+	prop = system.CurrentTake
+	def set_take(self, take):
+		switches.append(take.Name)
+		prop.fset(self, take)
+	monkeypatch.setattr(system, "CurrentTake", property(prop.fget, set_take))
+
+	sent = lib.replay_capture(np.zeros((20, len(joints), 6)), recorder.port, rate = 1000, protocol = "tcp")
+	deadline = time.time() + 2.0
+	while recorder.stats["received"] < sent and time.time() < deadline:
+		time.sleep(0.01)
+	recorder.stop()
+
+	assert recorder.stats["flushed"] == sent == 20
+	assert switches == [takes[1].Name, takes[0].Name]
+	assert lib.lSys.CurrentTake.Name == takes[0].Name
+	after = [[(key.Time.Get(), key.Value) for key in curve.Keys] for curve in curves]
+	assert after[0] == before[0]
+	assert after[1] != before[1]
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+def _joints(lib):
+	return lib._character_joints(lib.lApp.CurrentCharacter)
+
+def _global_positions(lib, joints):
+	vector = lib.FBVector3d()
+	positions = []
+	for joint in joints:
+		joint.GetVector(vector, lib.FBModelTransformationType.kModelTranslation, True)
+		positions.append(list(vector))
+	return np.array(positions)
+
+def test_mapping_pairs_left_and_right(lib):
+	mapping = lib.get_mirror_mapping(rebuild = True)
+	names = mapping["names"]
+	for left, right in mapping["pairs"]:
+		assert names[mapping["mirror"][names.index(left)]] == right
+	assert not mapping["unpaired"]
+
+def test_mirror_twice_is_identity(lib):
+	joints = _joints(lib)
+	mapping = lib.get_mirror_mapping(joints)
+	values = lib._sample_local_transforms(joints, np.arange(0, 20))
+	twice = lib.mirror_local_transforms(lib.mirror_local_transforms(values, mapping), mapping)
+	assert np.allclose(twice[..., 0:3], values[..., 0:3], atol = 1e-6)
+	assert np.allclose(lib.euler_to_matrices(twice[..., 3:6]), lib.euler_to_matrices(values[..., 3:6]), atol = 1e-6)
+
+def test_mirror_pose_reflects_counterparts(lib):
+	joints = _joints(lib)
+	mapping = lib.get_mirror_mapping(joints)
+	lib.go_to_frame(10)
+	lib.lScene.Evaluate()
+	before = _global_positions(lib, joints)
+	# keyed, an evaluation would replace plain transform values by the animation
+	lib.mirror_pose(joints, key = True)
+	lib.lScene.Evaluate()
+	after = _global_positions(lib, joints)
+	expected = before[mapping["mirror"]]
+	expected[:, mapping["axis"]] *= -1.0
+	assert np.allclose(after, expected, atol = 1e-4)
+
+def test_subset_under_a_joint_outside_the_list(lib):
+	# the roots hang under the hips, which are not mirrored
+	hips = lib.get_comp_by_name("Actor00_Hips")
+	joints = [joint for joint in _joints(lib) if joint.LongName != hips.LongName]
+	mapping = lib.get_mirror_mapping(joints, rebuild = True)
+	assert -1 in mapping["parents"]
+
+def test_rotation_options_are_refused(lib):
+	joint = lib.get_comp_by_name("Actor00_LeftArm")
+	joint.RotationActive = True
+	joint.PreRotation = lib.FBVector3d(0, 0, 10)
+	with pytest.raises(ValueError):
+		lib.get_mirror_mapping(rebuild = True)
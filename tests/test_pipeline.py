@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+@pytest.fixture
+def scene_files(lib, tmp_path):
+	# stand-in scene files: build_scene() arguments as json
+	paths = []
+	for idx in range(3):
+		path = str(tmp_path / "shot_{}.fbx".format(idx))
+		with open(path, "w") as f:
+			json.dump({"size": 200, "takes": 2, "characters": 1, "frames": 20, "seed": idx}, f)
+		paths.append(path)
+	return paths
+
+def test_rerun_skips_processed_files(lib, tmp_path, scene_files):
+	checkpoint = str(tmp_path / "checkpoint.jsonl")
+	first = lib.run_pipeline(scene_files, ["get_take_list"], checkpoint)
+	assert (first["files"], first["skipped"], first["failed"]) == (3, 0, [])
+	second = lib.run_pipeline(scene_files, ["get_take_list"], checkpoint)
+	assert (second["files"], second["skipped"]) == (0, 3)
+
+def test_other_stages_process_files_again(lib, tmp_path, scene_files):
+	checkpoint = str(tmp_path / "checkpoint.jsonl")
+	lib.run_pipeline(scene_files, ["get_take_list"], checkpoint)
+	result = lib.run_pipeline(scene_files, ["get_take_list", ("get_take_spans", {"key_extent": True})], checkpoint)
+	assert (result["files"], result["skipped"]) == (3, 0)
+
+def test_interrupted_file_restarts(lib, tmp_path, scene_files):
+	checkpoint = str(tmp_path / "checkpoint.jsonl")
+	lib.run_pipeline(scene_files, ["get_take_list"], checkpoint)
+	# drop the end of the journal of the last file, as if the run had stopped during it
+	with open(checkpoint) as f:
+		lines = f.readlines()
+	kept = [line for line in lines if not (json.loads(line)["file"] == scene_files[-1] and json.loads(line)["stage"] != "open")]
+	with open(checkpoint, "w") as f:
+		f.writelines(kept)
+		f.write('{"file": "' + scene_files[-1])
+
+	done = lib.read_pipeline_checkpoint(checkpoint)
+	assert done[scene_files[-1]] == ["open"]
+	result = lib.run_pipeline(scene_files, ["get_take_list"], checkpoint)
+	assert (result["files"], result["skipped"]) == (1, 2)
+
+def test_failed_stage_is_retried(lib, tmp_path, scene_files):
+	checkpoint = str(tmp_path / "checkpoint.jsonl")
+	stages = [("get_take_length", {"takeName": "Missing"})]
+	first = lib.run_pipeline(scene_files, stages, checkpoint)
+	assert len(first["failed"]) == 3
+	second = lib.run_pipeline(scene_files, stages, checkpoint)
+	assert (second["files"], second["skipped"]) == (3, 0)
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+def _path(lib, frames = 200):
+	# smooth rotations through y = 90, extracted back from their matrices (flips on x and z)
+	t = np.linspace(0.0, 1.0, frames)
+	smooth = np.stack([30.0 * np.sin(6.0 * t), 60.0 + 50.0 * t, 170.0 + 40.0 * t], axis = -1)
+	return smooth, lib.matrices_to_euler(lib.euler_to_matrices(smooth))
+
+@pytest.mark.parametrize("mode", ["unroll", "gimbal", "reextract"])
+def test_filters_keep_the_rotations(lib, mode):
+	rotations = np.random.RandomState(0).uniform(-400.0, 400.0, (100, 5, 3))
+	filtered = lib.filter_euler(rotations, mode)
+	assert filtered.shape == rotations.shape
+	assert np.allclose(lib.euler_to_matrices(filtered), lib.euler_to_matrices(rotations), atol = 1e-9)
+
+@pytest.mark.parametrize("mode", ["gimbal", "reextract"])
+def test_gimbal_flips_are_repaired(lib, mode):
+	smooth, extracted = _path(lib)
+	assert np.abs(np.diff(extracted, axis = 0)).max() > 90.0
+	filtered = lib.filter_euler(extracted, mode)
+	assert np.abs(np.diff(filtered, axis = 0)).max() < 5.0
+	assert np.allclose(lib.euler_to_matrices(filtered), lib.euler_to_matrices(smooth), atol = 1e-9)
+
+def test_time_axis(lib):
+	_, extracted = _path(lib)
+	joints = np.stack([extracted, extracted[::-1]], axis = 0)
+	filtered = lib.filter_euler(joints, "gimbal", axis = 1)
+	assert np.allclose(filtered[0], lib.filter_euler(extracted, "gimbal"))
+
+def test_unroll_keeps_the_first_frame(lib):
+	rotations = np.array([[350.0, 0.0, -10.0], [-5.0, 0.0, 10.0], [10.0, 0.0, 365.0]])
+	filtered = lib.filter_euler(rotations, "unroll")
+	assert np.allclose(filtered, [[350.0, 0.0, -10.0], [355.0, 0.0, 10.0], [370.0, 0.0, 5.0]])
+
+def test_filter_rotations_keys_back_changed_models_only(lib):
+	joints = lib.get_children(lib.get_comp_by_name("Actor00_Hips"), includeParent = True)
+	# one extra turn on a key of the hips
+	curve = joints[0].Rotation.GetAnimationNode().Nodes[0].FCurve
+	curve.Keys[5].Value += 360.0
+	frames, before = lib.read_keys(joints[0], "rotation")
+	assert lib.filter_rotations(joints, "unroll") == 1
+	frames_after, after = lib.read_keys(joints[0], "rotation")
+	assert np.array_equal(frames, frames_after)
+	assert np.allclose(lib.euler_to_matrices(after), lib.euler_to_matrices(before), atol = 1e-9)
+	assert np.abs(np.diff(after, axis = 0)).max() < 180.0
@@ -0,0 +1,84 @@
+import pytest
+
+class _Item(object):
+	# attribute holder whose "broken" attribute cannot be set
+	def __init__(self):
+		self.value = 0
+
+	@property
+	def broken(self):
+		return None
+
+	@broken.setter
+	def broken(self, value):
+		raise RuntimeError("cannot set")
+
+def test_failed_block_applies_nothing(lib):
+	item = _Item()
+	with pytest.raises(KeyError):
+		with lib.scene_batch("test") as batch:
+			batch.set(item, "value", 1)
+			raise KeyError("stop")
+	assert item.value == 0
+
+def test_failed_edit_restores_previous_values(lib):
+	first, second = _Item(), _Item()
+	with pytest.raises(RuntimeError):
+		with lib.scene_batch("test") as batch:
+			batch.set(first, "value", 1)
+			batch.set(second, "value", 2)
+			batch.set(second, "broken", 3)
+	assert (first.value, second.value) == (0, 0)
+
+def test_nested_block_applies_on_exit(lib):
+	first, second = _Item(), _Item()
+	with lib.scene_batch("outer") as outer:
+		outer.set(first, "value", 1)
+		with lib.scene_batch("inner") as inner:
+			# the edits queued before the inner block are applied when it opens
+			assert first.value == 1
+			inner.set(second, "value", 2)
+		assert second.value == 2
+
+def test_failed_nested_block_drops_only_its_edits(lib):
+	kept, dropped = _Item(), _Item()
+	take = lib.lScene.Takes[1]
+	with lib.scene_batch("outer") as outer:
+		with pytest.raises(KeyError):
+			with lib.scene_batch("inner") as inner:
+				inner.set(dropped, "value", 2)
+				inner.delete(take)
+				raise KeyError("stop")
+		outer.set(kept, "value", 1)
+	assert (kept.value, dropped.value) == (1, 0)
+	assert take in list(lib.lScene.Takes)
+
+def _characterised_keys(lib, outer_batch):
+	# rotation keys of the skeleton after characterise_skeleton, run with a joint selected
+	import fb_standin
+	fb_standin.build_scene(size = 300, takes = 2, characters = 1, frames = 20)
+	lib.get_comp_by_name("Actor00_LeftArm").Selected = True
+	if outer_batch:
+		with lib.scene_batch("outer"):
+			lib.characterise_skeleton("Actor00")
+	else:
+		lib.characterise_skeleton("Actor00")
+	joints = lib.get_children(lib.get_comp_by_name("Actor00_Hips"), includeParent = True)
+	return [lib.read_keys(joint, "rotation")[1].tolist() for joint in joints]
+
+def test_library_bulk_operation_inside_outer_batch(lib):
+	# characterise_skeleton unselects, zeroes the rotations in its own batch then reads the selection and keys
+	assert _characterised_keys(lib, True) == _characterised_keys(lib, False)
+
+def test_one_undo_transaction_for_nested_blocks(lib, monkeypatch):
+	calls = []
+	monkeypatch.setattr(lib.FBUndoManager, "TransactionBegin", lambda self, name: calls.append(("begin", name)), raising = False)
+	monkeypatch.setattr(lib.FBUndoManager, "TransactionEnd", lambda self: calls.append(("end",)), raising = False)
+	item = _Item()
+	with lib.scene_batch("outer", batched = True) as outer:
+		outer.set(item, "value", 1)
+		with lib.scene_batch("inner") as inner:
+			inner.set(item, "value", 2)
+		outer.set(item, "value", 3)
+	assert item.value == 3
+	assert calls == [("begin", "outer"), ("end",)]
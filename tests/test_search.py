@@ -0,0 +1,45 @@
+def _scan(lib, substring):
+	# reference result: every component with the substring in its name
+	return sorted(comp.LongName for comp in lib.lScene.Components if substring in comp.Name.lower())
+
+def _names(comps):
+	return sorted(comp.LongName for comp in comps)
+
+def test_table_has_each_component_once(lib):
+	# the typed collections (Takes, Characters...) are also in Components
+	assert len(lib._get_name_table()[0]) == len(lib.lScene.Components)
+
+def test_typed_query_narrows_previous_results(lib):
+	query = "actor00_left"
+	for idx in range(1, len(query) + 1):
+		result = lib.search_components(query[:idx])
+		assert _names(result) == _scan(lib, query[:idx])
+	# a longer query only rescans the results of the shorter one
+	assert lib._is_narrowing("actor00_left", "actor00_lefta", "auto")
+	assert not lib._is_narrowing("actor -hand", "actor -handx", "auto")
+	assert not lib._is_narrowing("actor", "actor*", "auto")
+
+def test_excluded_terms(lib):
+	result = lib.search_components("actor00_left -hand")
+	assert result and all("hand" not in comp.Name.lower() for comp in result)
+	assert _names(result) == sorted(name for name in _scan(lib, "actor00_left") if "hand" not in name.lower())
+
+def test_scene_changes_invalidate_the_table(lib):
+	assert _names(lib.search_components("actor00_hips")) == _scan(lib, "actor00_hips")
+	table = lib._get_name_table()
+
+	# selection keeps the table
+	lib.get_comp_by_name("Actor00_Hips").Selected = True
+	lib.search_components("actor00_hips", select = True)
+	assert lib._get_name_table() is table
+
+	hips = lib.get_comp_by_name("Actor00_Hips")
+	hips.Name = "Actor00_Pelvis"
+	assert lib.search_components("actor00_hips") == []
+	assert _names(lib.search_components("actor00_pelvis")) == ["Actor00_Pelvis"]
+
+	lib.FBModelNull("Actor00_PelvisHelper")
+	assert _names(lib.search_components("actor00_pelvis")) == ["Actor00_Pelvis", "Actor00_PelvisHelper"]
+
+	hips.FBDelete()
+	assert _names(lib.search_components("actor00_pelvis")) == ["Actor00_PelvisHelper"]
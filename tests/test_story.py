@@ -0,0 +1,18 @@
+def _track(lib, name, take, frame):
+	track = lib.FBStoryTrack(lib.FBStoryTrackType.kFBStoryTrackCharacter, lib.Story.RootFolder)
+	track.Name = name
+	if take is not None:
+		track.CopyTakeIntoTrack(take.LocalTimeSpan, take, lib.frame_to_time(frame))
+	return track
+
+def test_aligned_uses_clips_of_other_tracks_only(lib):
+	takes = list(lib.lScene.Takes)
+	# only the tracks of this test
+	del lib.Story.RootFolder.Tracks[:]
+	_track(lib, "Reference", takes[0], 20)
+	target = _track(lib, "Target", takes[1], 100)
+	clips = lib.insert_takes_in_story(takes[:2], track = "Target", placement = "aligned")
+	# takes[0] lines up with the reference track, takes[1] does not reuse its own clip
+	assert clips[0].Start.GetFrame() == 20
+	assert clips[1].Start.GetFrame() == max(clip.Stop.GetFrame() for clip in target.Clips[:1])
+	assert all(clip.Track.Name == "Target" for clip in clips)
@@ -0,0 +1,17 @@
+def test_span_set_by_hand_is_seen(lib):
+	take = lib.lScene.Takes[1]
+	lib.get_take_spans()
+	take.LocalTimeSpan = lib.FBTimeSpan(lib.frame_to_time(5), lib.frame_to_time(77))
+	assert lib.get_take_spans()[take.Name] == {"start": 5, "stop": 77, "length": 72}
+
+def test_key_extent_follows_key_edits(lib):
+	take = lib.lScene.Takes[1]
+	current = lib.lSys.CurrentTake
+	before = lib.get_take_spans(key_extent = True)[take.Name]
+	# move the last key of one curve past the end, without the library
+	curve = lib.get_comp_by_name("Actor00_Hips").Translation.GetAnimationNode(take).Nodes[0].FCurve
+	curve.KeyAdd(lib.frame_to_time(before["key_stop"] + 10), 1.0)
+	after = lib.get_take_spans(key_extent = True)[take.Name]
+	assert after["key_stop"] == before["key_stop"] + 10
+	assert after["key_start"] == before["key_start"]
+	assert lib.lSys.CurrentTake is current
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+import fb_library
+
+def test_drop_frame_2997_minute_boundaries():
+	# frames ;00 and ;01 are skipped every minute but every tenth
+	frames = [0, 1799, 1800, 17981, 17982, 107892]
+	expected = ["00:00:00;00", "00:00:59;29", "00:01:00;02", "00:09:59;29", "00:10:00;00", "01:00:00;00"]
+	assert fb_library.frames_to_timecode(frames, 29.97, True) == expected
+	assert fb_library.timecode_to_frames(expected, 29.97).tolist() == frames
+
+def test_drop_frame_5994_drops_four_frames():
+	assert fb_library.frames_to_timecode([3599, 3600], 59.94, True) == ["00:00:59;59", "00:01:00;04"]
+
+def test_drop_frame_round_trip():
+	frames = np.arange(0, 30 * 3600 * 2, 7)
+	for fps in (29.97, 59.94):
+		timecodes = fb_library.frames_to_timecode(frames, fps, True)
+		assert all(";" in timecode for timecode in timecodes[:3])
+		assert np.array_equal(fb_library.timecode_to_frames(timecodes, fps), frames)
+
+def test_non_drop_frame():
+	assert fb_library.frames_to_timecode([1800, 29], 30.0, False) == ["00:01:00:00", "00:00:00:29"]
+	assert fb_library.timecode_to_frames(["00:01:00:00"], 30.0).tolist() == [1800]
+
+def test_drop_frame_needs_ntsc_rate():
+	with pytest.raises(ValueError):
+		fb_library.frames_to_timecode([0], 25.0, True)